@@ -1,5 +1,7 @@
 import mysql.connector as my_sql
 
+from storage import TICKET_SUMMARY_FILL, ROLLUP_FILLS
+
 def create_database():
     try:
         connection = my_sql.connect(
@@ -16,6 +18,27 @@ def create_database():
         cursor.close()
         connection.close()
 
+def add_index(cursor, table, index_name, columns):
+    try:
+        cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns});")
+    except my_sql.Error as err:
+        if err.errno != 1061: # ER_DUP_KEYNAME: index already exists
+            raise
+
+def add_column(cursor, table, column, definition):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition};")
+    except my_sql.Error as err:
+        if err.errno != 1060: # ER_DUP_FIELDNAME: column already exists
+            raise
+
+def add_trigger(cursor, statement):
+    try:
+        cursor.execute(statement)
+    except my_sql.Error as err:
+        if err.errno != 1359: # ER_TRG_ALREADY_EXISTS
+            raise
+
 def setup_tables_and_data():
     try:
         connection = my_sql.connect(
@@ -58,7 +81,8 @@ def setup_tables_and_data():
                 economy_price DECIMAL(10, 2) NOT NULL,
                 business_seats_total INT DEFAULT 20,
                 business_seats_booked INT DEFAULT 0,
-                business_price DECIMAL(10, 2) NOT NULL
+                business_price DECIMAL(10, 2) NOT NULL,
+                updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
             );""",
 
             # Bookings
@@ -69,6 +93,7 @@ def setup_tables_and_data():
                 booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 total_amount DECIMAL(10, 2) NOT NULL,
                 status VARCHAR(20) DEFAULT 'Confirmed',
+                updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
                 FOREIGN KEY (user_id) REFERENCES users(user_id),
                 FOREIGN KEY (flight_id) REFERENCES flights(flight_id)
             );""",
@@ -82,10 +107,78 @@ def setup_tables_and_data():
                 gender ENUM('Male', 'Female', 'Other') NOT NULL,
                 seat_class ENUM('Economy', 'Business') NOT NULL,
                 food_preference_id INT,
+                updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
                 FOREIGN KEY (booking_id) REFERENCES bookings(booking_id) ON DELETE CASCADE,
                 FOREIGN KEY (food_preference_id) REFERENCES food_items(food_id)
             );""",
 
+            # My Tickets list, one row per passenger, kept up to date by the booking engine
+            """CREATE TABLE IF NOT EXISTS ticket_summaries (
+                passenger_id INT PRIMARY KEY,
+                booking_id INT NOT NULL,
+                user_id INT NOT NULL,
+                flight_id INT NOT NULL,
+                flight_number VARCHAR(20) NOT NULL,
+                origin VARCHAR(100) NOT NULL,
+                destination VARCHAR(100) NOT NULL,
+                departure_time DATETIME NOT NULL,
+                passenger_name VARCHAR(100) NOT NULL,
+                age INT NOT NULL,
+                seat_class ENUM('Economy', 'Business') NOT NULL,
+                food_preference VARCHAR(100) NOT NULL,
+                status VARCHAR(20),
+                total_amount DECIMAL(10, 2) NOT NULL,
+                updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX idx_ticket_summaries_user (user_id, departure_time DESC, booking_id, passenger_id),
+                INDEX idx_ticket_summaries_user_updated (user_id, updated_at),
+                INDEX idx_ticket_summaries_booking (booking_id),
+                INDEX idx_ticket_summaries_flight (flight_id),
+                FOREIGN KEY (passenger_id) REFERENCES passengers(passenger_id) ON DELETE CASCADE
+            );""",
+
+            # Analytics rollups, kept up to date by the booking engine (see database.py)
+            """CREATE TABLE IF NOT EXISTS sales_daily (
+                sale_date DATE NOT NULL,
+                origin VARCHAR(100) NOT NULL,
+                destination VARCHAR(100) NOT NULL,
+                seat_class ENUM('Economy', 'Business') NOT NULL,
+                passengers INT NOT NULL DEFAULT 0,
+                revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+                cancelled_passengers INT NOT NULL DEFAULT 0,
+                refunded DECIMAL(14, 2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (sale_date, origin, destination, seat_class)
+            );""",
+            """CREATE TABLE IF NOT EXISTS meal_demand (
+                flight_id INT NOT NULL,
+                food_id INT NOT NULL,
+                passengers INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (flight_id, food_id),
+                FOREIGN KEY (flight_id) REFERENCES flights(flight_id) ON DELETE CASCADE,
+                FOREIGN KEY (food_id) REFERENCES food_items(food_id)
+            );""",
+
+            # Seat assignment: one bitmap per flight and class, bit i set = seat i taken (see database.py)
+            """CREATE TABLE IF NOT EXISTS seat_maps (
+                flight_id INT NOT NULL,
+                seat_class ENUM('Economy', 'Business') NOT NULL,
+                taken VARBINARY(1024) NOT NULL,
+                PRIMARY KEY (flight_id, seat_class),
+                FOREIGN KEY (flight_id) REFERENCES flights(flight_id) ON DELETE CASCADE
+            );""",
+
+            # Affected bookings of flights cancelled by an admin, queued for notifying the customer
+            """CREATE TABLE IF NOT EXISTS cancellation_notices (
+                notice_id INT AUTO_INCREMENT PRIMARY KEY,
+                booking_id INT NOT NULL,
+                user_id INT NOT NULL,
+                flight_id INT NOT NULL,
+                reason VARCHAR(255),
+                created_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+                notified_at TIMESTAMP(6) NULL,
+                INDEX idx_cancellation_notices_pending (notified_at, notice_id),
+                FOREIGN KEY (booking_id) REFERENCES bookings(booking_id) ON DELETE CASCADE
+            );""",
+
             # Insert Admin
             """INSERT IGNORE INTO users (username, password, phone_number, role)
                VALUES ('admin', 'admin123', '0000000000', 'admin');""",
@@ -116,6 +209,51 @@ def setup_tables_and_data():
         for stmt in statements:
             cursor.execute(stmt)
 
+        # Row versions for incremental list refresh (also added to databases created before they existed)
+        row_version = "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"
+        for table in ("flights", "bookings", "passengers"):
+            add_column(cursor, table, "updated_at", row_version)
+
+        # Flight row version for the seat availability cache and optimistic booking checks:
+        # every write to a flight bumps it, whichever statement or tool made the write
+        add_column(cursor, "flights", "version", "INT NOT NULL DEFAULT 0")
+        # Fare each passenger paid, for exact refunds in the analytics rollups
+        add_column(cursor, "passengers", "price", "DECIMAL(10, 2)")
+        # 'Cancelled' once an admin scrubs the flight: hidden from search, no new bookings
+        add_column(cursor, "flights", "status", "VARCHAR(20) NOT NULL DEFAULT 'Scheduled'")
+        # Assigned seat (index into the class's seat map, and its label such as 12C);
+        # passengers booked before seat maps get one the next time their flight is booked
+        add_column(cursor, "passengers", "seat_index", "SMALLINT")
+        add_column(cursor, "passengers", "seat_number", "VARCHAR(5)")
+        add_column(cursor, "ticket_summaries", "seat_number", "VARCHAR(5)")
+        add_trigger(cursor, """CREATE TRIGGER trg_flights_version BEFORE UPDATE ON flights
+                                FOR EACH ROW SET NEW.version = OLD.version + 1;""")
+
+        # Secondary indexes (also added to databases created before they existed)
+        indexes = [
+            # Route search: exact/prefix origin + destination, then departure time range
+            ("flights", "idx_flights_route_departure", "origin, destination, departure_time"),
+            # Date-range search and "upcoming flights" ordered by departure time
+            ("flights", "idx_flights_departure", "departure_time"),
+            # Delta refresh: flights changed since the last load
+            ("flights", "idx_flights_updated", "updated_at"),
+            # Bookings export filtered by booking date
+            ("bookings", "idx_bookings_date", "booking_date"),
+            # A user's bookings (ownership checks, per-user lookups)
+            ("bookings", "idx_bookings_user", "user_id")
+        ]
+        for table, index_name, columns in indexes:
+            add_index(cursor, table, index_name, columns)
+
+        # Fill the ticket summaries of a database that had bookings before the table existed
+        cursor.execute("SELECT COUNT(*) FROM ticket_summaries")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(TICKET_SUMMARY_FILL)
+        for table, fill in ROLLUP_FILLS.items(): # Likewise the analytics rollups
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute(fill)
+
         connection.commit()
         print(" Tables created and sample data inserted successfully.")
 
@@ -0,0 +1,491 @@
+# Local HTTP/JSON API over the booking service (service.py), so one backend can
+# serve many terminals. asyncio handles the connections (HTTP/1.1 keep-alive);
+# service calls run on a thread pool the size of the DB connection pool.
+#
+#   python api.py --port 8080                          # MySQL from DB_CONFIG
+#   python api.py --engine sqlite --sqlite-path :memory:
+#
+# Clients log in with POST /login and send "Authorization: Bearer <token>" after
+# that; each request looks its session up from the token. ApiClient below speaks
+# this protocol with the same methods as AirportService (the Tk app uses it when
+# AIRPORT_API_URL is set).
+#
+#   GET  /health                     GET  /food         GET  /time
+#   POST /login  {phone, password}   POST /logout       POST /users {username, password, phone}
+#   GET  /flights?origin=&destination=&date_from=&date_to=&after=&backward=&limit=&changed_since=
+#   GET  /flights/upcoming?after=&backward=&limit=&changed_since=
+#   GET  /flights/<id>               GET  /flights/<id>/seats   GET  /tickets?...  GET  /bookings/<id>
+#   GET  /itineraries?origin=&destination=&date_from=&date_to=&seats=&seat_class=&k=&max_legs=&min_connection=&order_by=
+#   POST /bookings {flight_id, passengers: [{passenger_name, age, gender, seat_class, food_id, seat}, ...],
+#                   expected_version}   (409 StaleFlightError with the current 'flight' if it changed)
+#   POST /bookings/<id>/cancel       PUT  /passengers/<id>/meal {food_id}
+#   GET  /stats (admin)              GET  /stats/queries?top=&order_by= (admin)
+#   POST /flights/cancel {flight_ids: [...], reason} (admin)
+#   GET  /analytics?date_from=&date_to=&group_by=route,day,class&top= (admin)
+
+import argparse
+import asyncio
+import http.client
+import json
+import re
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import database
+from database import ReferenceCache, BookingError, SoldOutError, SeatTakenError, StaleFlightError, DB_ERRORS
+from itineraries import DEFAULT_ITINERARIES, MAX_LEGS, MIN_CONNECTION_MINUTES
+from service import (AirportService, Session, ServiceError, ValidationError, AuthError, PermissionDenied,
+                     NotFound)
+
+
+MAX_BODY = 64 * 1024    # Largest request body accepted (bytes)
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle connection is kept open
+
+# Response fields that are datetimes or money; the client turns them back into
+# datetime/Decimal so rows look the same as when read from the database directly
+DATETIME_FIELDS = {'departure_time', 'arrival_time', 'booking_date', 'updated_at', 'now'}
+DATE_FIELDS = {'sale_date'}
+DECIMAL_FIELDS = {'price', 'economy_price', 'business_price', 'total_price', 'total_amount', 'revenue', 'refunded', 'net_revenue'}
+
+# Exceptions that travel over the wire by name (raised again by ApiClient)
+ERROR_TYPES = {cls.__name__: cls for cls in (ServiceError, ValidationError, AuthError, PermissionDenied, NotFound,
+                                             BookingError, SoldOutError, SeatTakenError, StaleFlightError)}
+
+
+def to_json(value):
+    def default(obj):
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        if isinstance(obj, Decimal):
+            return str(obj) # Exact money, no float rounding
+        raise TypeError(f"Not JSON serializable: {type(obj).__name__}")
+    return json.dumps(value, default=default).encode()
+
+def decode_row(row):
+    for key in DATETIME_FIELDS & row.keys():
+        if isinstance(row[key], str):
+            row[key] = datetime.fromisoformat(row[key])
+    for key in DATE_FIELDS & row.keys():
+        if isinstance(row[key], str):
+            row[key] = date.fromisoformat(row[key])
+    for key in DECIMAL_FIELDS & row.keys():
+        if row[key] is not None:
+            row[key] = Decimal(row[key])
+    for value in row.values(): # Nested rows, e.g. a booking's passengers or a report's sections
+        if isinstance(value, dict):
+            decode_row(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    decode_row(item)
+    return row
+
+def parse_value(text):
+    # Keyset cursors and watermarks arrive as JSON; datetimes inside them as ISO strings
+    if isinstance(text, str):
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            return text
+    return text
+
+def parse_cursor(text):
+    return [parse_value(value) for value in json.loads(text)] if text else None
+
+def parse_date(text):
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').date() if text else None
+    except ValueError:
+        raise ValidationError("Invalid date. Use the format YYYY-MM-DD.")
+
+
+# - Server -
+class ApiServer:
+    # (method, path pattern, handler, login required)
+    ROUTES = [
+        ("GET", r"/health", "health", False),
+        ("POST", r"/login", "login", False),
+        ("POST", r"/logout", "logout", True),
+        ("POST", r"/users", "register", False),
+        ("GET", r"/food", "food", False),
+        ("GET", r"/time", "db_time", False),
+        ("GET", r"/flights", "search_flights", False),
+        ("GET", r"/flights/upcoming", "upcoming_flights", False),
+        ("GET", r"/flights/(\d+)", "flight", False),
+        ("GET", r"/flights/(\d+)/seats", "seat_map", False),
+        ("GET", r"/itineraries", "search_itineraries", False),
+        ("POST", r"/flights/cancel", "cancel_flights", True),
+        ("GET", r"/tickets", "my_tickets", True),
+        ("POST", r"/bookings", "book", True),
+        ("GET", r"/bookings/(\d+)", "booking_details", True),
+        ("POST", r"/bookings/(\d+)/cancel", "cancel", True),
+        ("PUT", r"/passengers/(\d+)/meal", "update_meal", True),
+        ("GET", r"/stats", "stats", True),
+        ("GET", r"/stats/queries", "query_stats", True),
+        ("GET", r"/analytics", "analytics", True)
+    ]
+
+    def __init__(self, service=None, host="127.0.0.1", port=8080, max_workers=None):
+        self.service = service or AirportService()
+        self.host = host
+        self.port = port
+        # One worker per pooled connection: more would only queue inside the pool
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or database.DB_POOL_CONFIG['pool_size'],
+                                           thread_name_prefix="api-worker")
+        self.routes = [(method, re.compile(pattern + "$"), getattr(self, "do_" + name), auth)
+                       for method, pattern, name, auth in self.ROUTES]
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        # Spawn the password hashing processes before the first login needs them
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.service.hasher.start)
+        # and load the route graph before the first itinerary search does
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.service.route_graph.refresh)
+        print(f"API listening on http://{self.host}:{self.port} ({database.DB_ENGINE})")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': "PayloadTooLarge", 'message': "Request body too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method, target, headers, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = to_json(payload)
+        head = (f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        path_matched = False
+        for route_method, pattern, handler, auth in self.routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method != method:
+                continue
+
+            # Per-request session state: looked up from the token on every call
+            token = headers.get("authorization", "").removeprefix("Bearer ").strip()
+            session = self.service.sessions.get(token)
+            if auth and session is None:
+                return 401, {'error': "AuthError", 'message': "Please log in."}
+            try:
+                data = json.loads(body) if body else {}
+                query = dict(parse_qsl(url.query))
+                call = partial(handler, session, query, data, *match.groups())
+                result = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+                return 200, result
+            except ServiceError as err:
+                return err.status, {'error': type(err).__name__, 'message': str(err)}
+            except BookingError as err: # Sold out, cancelled twice, flight changed, ...
+                payload = {'error': type(err).__name__, 'message': str(err)}
+                if getattr(err, 'flight', None):
+                    payload['flight'] = err.flight
+                return 409, payload
+            except DB_ERRORS as err:
+                return 503, {'error': "DatabaseError", 'message': str(err)}
+            except (json.JSONDecodeError, TypeError, ValueError) as err:
+                return 400, {'error': "ValidationError", 'message': f"Bad request: {err}"}
+            except Exception as err:
+                traceback.print_exc()
+                return 500, {'error': "InternalError", 'message': str(err)}
+        if path_matched:
+            return 405, {'error': "MethodNotAllowed", 'message': f"{method} not allowed on {url.path}"}
+        return 404, {'error': "NotFound", 'message': f"No such endpoint: {url.path}"}
+
+    # Handlers run on the worker threads: (session, query string, JSON body, path groups...)
+    def do_health(self, session, query, data):
+        return {'ok': True}
+
+    def do_login(self, session, query, data):
+        return self.service.login(data.get('phone'), data.get('password')).to_dict()
+
+    def do_logout(self, session, query, data):
+        self.service.logout(session)
+        return {'ok': True}
+
+    def do_register(self, session, query, data):
+        return {'user_id': self.service.register(data.get('username'), data.get('password'), data.get('phone'))}
+
+    def do_food(self, session, query, data):
+        return self.service.food_menu()
+
+    def do_db_time(self, session, query, data):
+        return {'now': self.service.db_time()}
+
+    def do_search_flights(self, session, query, data):
+        return self.service.search_flights(
+            query.get('origin', ""), query.get('destination', ""),
+            parse_date(query.get('date_from')), parse_date(query.get('date_to')), **self.page_args(query))
+
+    def do_upcoming_flights(self, session, query, data):
+        return self.service.upcoming_flights(**self.page_args(query))
+
+    def do_flight(self, session, query, data, flight_id):
+        return self.service.flight(int(flight_id))
+
+    def do_seat_map(self, session, query, data, flight_id):
+        return self.service.seat_map(int(flight_id))
+
+    def do_search_itineraries(self, session, query, data):
+        return self.service.search_itineraries(
+            query.get('origin', ""), query.get('destination', ""),
+            parse_date(query.get('date_from')), parse_date(query.get('date_to')), query.get('seats') or 1,
+            query.get('seat_class') or "Economy", query.get('k') or DEFAULT_ITINERARIES,
+            query.get('max_legs') or MAX_LEGS, query.get('min_connection') or MIN_CONNECTION_MINUTES,
+            query.get('order_by') or "duration")
+
+    def do_cancel_flights(self, session, query, data):
+        flight_ids = data.get('flight_ids')
+        if not isinstance(flight_ids, list):
+            raise ValueError("'flight_ids' must be a list")
+        return self.service.cancel_flights(session, flight_ids, data.get('reason'))
+
+    def do_my_tickets(self, session, query, data):
+        return self.service.my_tickets(session, **self.page_args(query))
+
+    def do_book(self, session, query, data):
+        passengers = data.get('passengers')
+        if passengers is None: # Single passenger fields at the top level
+            passengers = [{key: data.get(key) for key in ('passenger_name', 'age', 'gender', 'seat_class', 'food_id', 'seat')}]
+        if not isinstance(passengers, list) or not all(isinstance(p, dict) for p in passengers):
+            raise ValueError("'passengers' must be a list of objects")
+        try:
+            flight_id = int(data['flight_id'])
+            expected_version = data.get('expected_version')
+            expected_version = int(expected_version) if expected_version is not None else None
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError("'flight_id' (and 'expected_version', if given) must be whole numbers.")
+        return self.service.book(session, flight_id, passengers, expected_version)
+
+    def do_booking_details(self, session, query, data, booking_id):
+        return self.service.booking_details(session, int(booking_id))
+
+    def do_cancel(self, session, query, data, booking_id):
+        self.service.cancel(session, int(booking_id))
+        return {'ok': True}
+
+    def do_update_meal(self, session, query, data, passenger_id):
+        self.service.update_meal(session, int(passenger_id), data.get('food_id'))
+        return {'ok': True}
+
+    def do_stats(self, session, query, data):
+        return self.service.stats(session)
+
+    def do_query_stats(self, session, query, data):
+        return self.service.query_stats(session, int(query.get('top') or 20), query.get('order_by') or "total_ms")
+
+    def do_analytics(self, session, query, data):
+        group_by = [group for group in (query.get('group_by') or "").split(",") if group]
+        return self.service.analytics(session, parse_date(query.get('date_from')), parse_date(query.get('date_to')),
+                                      group_by, int(query.get('top') or 20))
+
+    def page_args(self, query):
+        return {
+            'after': parse_cursor(query.get('after')),
+            'backward': query.get('backward') == "1",
+            'limit': int(query.get('limit') or database.PAGE_SIZE),
+            'changed_since': parse_value(query['changed_since']) if query.get('changed_since') else None
+        }
+
+
+# - Client -
+class ApiClient:
+    # Same methods as AirportService, over HTTP. One keep-alive connection per thread.
+    def __init__(self, base_url, timeout=30):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+        self.food_cache = ReferenceCache(
+            "food_items", lambda: self._request("GET", "/food"), "food_id",
+            lambda food: f"{food['item_name']} ({food['type']})"
+        )
+
+    def health(self):
+        return self._request("GET", "/health")['ok']
+
+    def login(self, phone, password):
+        user = self._request("POST", "/login", body={'phone': phone, 'password': password})
+        return Session(user['user_id'], user['username'], user['role'], token=user['token'])
+
+    def logout(self, session):
+        self._request("POST", "/logout", session=session)
+
+    def register(self, username, password, phone):
+        return self._request("POST", "/users", body={'username': username, 'password': password, 'phone': phone})['user_id']
+
+    def food_options(self):
+        return self.food_cache.options()
+
+    def food_menu(self):
+        return self.food_cache.rows()
+
+    def db_time(self):
+        return self._request("GET", "/time")['now']
+
+    def search_flights(self, origin="", destination="", date_from=None, date_to=None, after=None, backward=False,
+                       limit=database.PAGE_SIZE, changed_since=None):
+        params = {'origin': origin, 'destination': destination,
+                  'date_from': date_from.isoformat() if date_from else "",
+                  'date_to': date_to.isoformat() if date_to else ""}
+        return self._request("GET", "/flights", self._page_params(params, after, backward, limit, changed_since))
+
+    def upcoming_flights(self, after=None, backward=False, limit=database.PAGE_SIZE, changed_since=None):
+        return self._request("GET", "/flights/upcoming", self._page_params({}, after, backward, limit, changed_since))
+
+    def flight(self, flight_id):
+        return self._request("GET", f"/flights/{flight_id}")
+
+    def seat_map(self, flight_id):
+        return self._request("GET", f"/flights/{flight_id}/seats")
+
+    def search_itineraries(self, origin, destination, date_from=None, date_to=None, seats=1, seat_class="Economy",
+                           k=DEFAULT_ITINERARIES, max_legs=MAX_LEGS, min_connection=MIN_CONNECTION_MINUTES,
+                           order_by="duration"):
+        params = {'origin': origin, 'destination': destination,
+                  'date_from': date_from.isoformat() if date_from else "",
+                  'date_to': date_to.isoformat() if date_to else "",
+                  'seats': seats, 'seat_class': seat_class, 'k': k, 'max_legs': max_legs,
+                  'min_connection': min_connection, 'order_by': order_by}
+        return self._request("GET", "/itineraries", params)
+
+    def cancel_flights(self, session, flight_ids, reason=None):
+        return self._request("POST", "/flights/cancel", body={'flight_ids': list(flight_ids), 'reason': reason},
+                             session=session)
+
+    def my_tickets(self, session, after=None, backward=False, limit=database.PAGE_SIZE, changed_since=None):
+        return self._request("GET", "/tickets", self._page_params({}, after, backward, limit, changed_since), session=session)
+
+    def booking_details(self, session, booking_id):
+        return self._request("GET", f"/bookings/{booking_id}", session=session)
+
+    def book(self, session, flight_id, passengers, expected_version=None):
+        body = {'flight_id': flight_id, 'passengers': passengers, 'expected_version': expected_version}
+        return self._request("POST", "/bookings", body=body, session=session)
+
+    def cancel(self, session, booking_id):
+        self._request("POST", f"/bookings/{booking_id}/cancel", session=session)
+
+    def update_meal(self, session, passenger_id, food_id=None):
+        self._request("PUT", f"/passengers/{passenger_id}/meal", body={'food_id': food_id}, session=session)
+
+    def stats(self, session):
+        return self._request("GET", "/stats", session=session)
+
+    def query_stats(self, session, top=20, order_by="total_ms"):
+        return self._request("GET", "/stats/queries", {'top': top, 'order_by': order_by}, session=session)
+
+    def analytics(self, session, date_from=None, date_to=None, group_by=("route",), top=20):
+        params = {'date_from': date_from.isoformat() if date_from else "",
+                  'date_to': date_to.isoformat() if date_to else "",
+                  'group_by': ",".join(group_by), 'top': top}
+        return self._request("GET", "/analytics", params, session=session)
+
+    def _page_params(self, params, after, backward, limit, changed_since):
+        if after is not None:
+            params['after'] = to_json(list(after)).decode()
+        if backward:
+            params['backward'] = "1"
+        params['limit'] = limit
+        if changed_since is not None:
+            params['changed_since'] = changed_since.isoformat()
+        return params
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _request(self, method, path, params=None, body=None, session=None):
+        if params:
+            path += "?" + urlencode(params)
+        headers = {'Content-Type': "application/json"}
+        if session is not None:
+            headers['Authorization'] = f"Bearer {session.token}"
+        payload = to_json(body) if body is not None else None
+        for attempt in (1, 2): # Once more on a fresh connection if the server closed an idle one
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = json.loads(response.read() or b"null")
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                self._local.conn = None
+                if attempt == 2 or method != "GET":
+                    raise
+        if response.status >= 400:
+            error = ERROR_TYPES.get(data.get('error'), ServiceError)(data.get('message', f"HTTP {response.status}"))
+            if isinstance(data.get('flight'), dict):
+                error.flight = decode_row(data['flight'])
+            raise error
+        if isinstance(data, list):
+            return [decode_row(row) if isinstance(row, dict) else row for row in data]
+        return decode_row(data) if isinstance(data, dict) else data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the booking service over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--engine", choices=["mysql", "sqlite"], help="storage engine (default: database.DB_ENGINE)")
+    parser.add_argument("--sqlite-path", help="SQLite database file, or :memory:")
+    parser.add_argument("--pool-size", type=int, help="database connections (and API worker threads)")
+    args = parser.parse_args()
+
+    if args.engine:
+        database.DB_ENGINE = args.engine
+    if args.sqlite_path:
+        database.SQLITE_PATH = args.sqlite_path
+    if args.pool_size:
+        database.DB_POOL_CONFIG['pool_size'] = args.pool_size
+    try:
+        asyncio.run(ApiServer(host=args.host, port=args.port).serve_forever())
+    except KeyboardInterrupt:
+        sys.exit(0)
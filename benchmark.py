@@ -0,0 +1,292 @@
+# Benchmark suite for the data-access layer and the booking hot path.
+# Runs each case against the configured database (DB_CONFIG in database.py),
+# reports p50/p95/p99 latency and throughput, and saves the results as JSON so
+# runs from different commits can be compared.
+#
+#   python benchmark.py --load-scale small            # seed with bulk_loader first
+#   python benchmark.py --iterations 2000 --concurrency 8
+#   python benchmark.py --compare bench_results/<older>.json
+#   python benchmark.py --engine sqlite --sqlite-path :memory:   # no server needed
+#
+# Cases: fetch_all, fetch_one, execute_query, search_flights (indexed route search),
+# my_tickets (first page from the ticket_summaries table), login (phone number lookup),
+# fetch_one_prepared / login_prepared (the same lookups as cached prepared
+# statements), flight_cached (flight by id from the seat availability cache),
+# analytics_revenue (revenue by route from the sales rollup), seat_map (both
+# cabins' seat bitmaps of a flight, as loaded by the seat picker), itineraries
+# (best five direct or connecting itineraries for a day from the in-memory route graph),
+# service_login (AirportService.login with scrypt verification, cost set by
+# --scrypt-n; see also python credentials.py --bench) and book_cancel (book_flight
+# followed by cancel_booking on a dedicated flight).
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import database
+from credentials import PASSWORD_HASHER
+from database import (fetch_all, fetch_one, execute_query, query_one, book_flight, cancel_booking, FLIGHT_CACHE,
+                        build_flight_search_query, build_my_tickets_query, build_revenue_query, fetch_seat_maps,
+                        get_pool_stats, get_query_stats)
+from service import AirportService
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkFixture:
+    # Samples ids from the loaded data and owns a throwaway user/flight for write cases
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.flight_ids = self.sample("flights", "flight_id", "flight_id")
+        self.phones = self.sample("users", "user_id", "phone_number")
+        self.ticket_users = self.sample("bookings", "booking_id", "user_id")
+        self.routes = [(row['origin'], row['destination']) for row in fetch_all(
+            "SELECT DISTINCT origin, destination FROM flights LIMIT 500")]
+        first = fetch_one("SELECT departure_time FROM flights ORDER BY departure_time LIMIT 1")
+        last = fetch_one("SELECT departure_time FROM flights ORDER BY departure_time DESC LIMIT 1")
+        self.first_departure = first['departure_time'] if first else None
+        self.last_departure = last['departure_time'] if last else None
+        if not self.flight_ids:
+            sys.exit("No flights found. Seed the database first (python bulk_loader.py or --load-scale).")
+
+        self.phone = f"8{os.getpid():09d}"[:15]
+        ok, self.user_id = execute_query(
+            "INSERT INTO users (username, password, phone_number) VALUES ('bench_user', %s, %s)",
+            (PASSWORD_HASHER.hash("bench"), self.phone))
+        departure = datetime.now() + timedelta(days=365)
+        # A real cabin size: book_cancel frees its seat every cycle, so it never fills
+        ok, self.flight_id = execute_query(
+            """INSERT INTO flights (flight_number, origin, destination, departure_time, arrival_time, aircraft_name,
+                                   economy_seats_total, economy_price, business_seats_total, business_price)
+               VALUES (%s, 'BenchOrigin', 'BenchDest', %s, %s, 'Benchmark', 300, 100.00, 0, 200.00)""",
+            (f"BENCH{os.getpid()}", departure, departure + timedelta(hours=2))
+        )
+        if not ok:
+            sys.exit("Could not create the benchmark user/flight.")
+
+    def sample(self, table, id_column, column, n=1000):
+        # Random primary keys instead of ORDER BY RAND(), which sorts the whole table
+        bounds = fetch_one(f"SELECT MIN({id_column}) AS lo, MAX({id_column}) AS hi FROM {table}")
+        if not bounds or bounds['lo'] is None:
+            return []
+        ids = [self.rng.randint(bounds['lo'], bounds['hi']) for _ in range(n)]
+        placeholders = ", ".join(["%s"] * len(ids))
+        return [row[column] for row in fetch_all(
+            f"SELECT {column} FROM {table} WHERE {id_column} IN ({placeholders})", tuple(ids))]
+
+    def cleanup(self):
+        execute_query("DELETE FROM bookings WHERE flight_id = %s", (self.flight_id,)) # Passengers cascade
+        execute_query("DELETE FROM flights WHERE flight_id = %s", (self.flight_id,))
+        execute_query("DELETE FROM sales_daily WHERE origin = 'BenchOrigin' AND destination = 'BenchDest'") # Rollup rows of the test route
+        execute_query("DELETE FROM users WHERE user_id = %s", (self.user_id,))
+
+    def random_window(self):
+        # One-week departure window somewhere in the loaded schedule
+        span = (self.last_departure - self.first_departure).days if self.first_departure else 0
+        start = self.first_departure.date() + timedelta(days=self.rng.randrange(max(span, 1)))
+        return start, start + timedelta(days=7)
+
+
+def build_cases(fixture):
+    rng = fixture.rng
+
+    def search():
+        origin, destination = rng.choice(fixture.routes)
+        date_from, date_to = fixture.random_window() if rng.random() < 0.5 else (None, None)
+        return fetch_all(*build_flight_search_query(origin, destination, date_from, date_to))
+
+    service = AirportService()
+
+    def itineraries():
+        (origin, _), (_, destination) = rng.choice(fixture.routes), rng.choice(fixture.routes)
+        day, _ = fixture.random_window()
+        return service.search_itineraries(origin, destination, day, day)
+
+    def service_login():
+        service.logout(service.login(fixture.phone, "bench"))
+
+    def book_cancel():
+        booking = book_flight(fixture.user_id, fixture.flight_id, "Bench Passenger", 30, "Other", "Economy")
+        cancel_booking(booking['booking_id'], fixture.user_id)
+
+    return {
+        'fetch_all': lambda: fetch_all("SELECT food_id, item_name, type FROM food_items ORDER BY type, item_name"),
+        'fetch_one': lambda: fetch_one("SELECT * FROM flights WHERE flight_id = %s", (rng.choice(fixture.flight_ids),)),
+        'execute_query': lambda: execute_query("UPDATE users SET username = username WHERE user_id = %s", (fixture.user_id,)),
+        'search_flights': search,
+        'my_tickets': lambda: fetch_all(*build_my_tickets_query(rng.choice(fixture.ticket_users or [fixture.user_id]))),
+        'login': lambda: fetch_one("SELECT user_id, username, password, role FROM users WHERE phone_number = %s",
+                                   (rng.choice(fixture.phones),)),
+        'fetch_one_prepared': lambda: query_one("SELECT * FROM flights WHERE flight_id = %s",
+                                                (rng.choice(fixture.flight_ids),), prepared=True),
+        'login_prepared': lambda: query_one("SELECT user_id, username, password, role FROM users WHERE phone_number = %s",
+                                            (rng.choice(fixture.phones),), prepared=True),
+        'flight_cached': lambda: FLIGHT_CACHE.get(rng.choice(fixture.flight_ids)),
+        'analytics_revenue': lambda: fetch_all(*build_revenue_query(group_by=("route",))),
+        'seat_map': lambda: fetch_seat_maps(rng.choice(fixture.flight_ids)),
+        'itineraries': itineraries,
+        'service_login': service_login,
+        'book_cancel': book_cancel
+    }
+
+
+def run_case(func, iterations, concurrency, warmup):
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    lock = threading.Lock()
+    per_worker = [iterations // concurrency + (1 if i < iterations % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        local = []
+        for _ in range(count):
+            started = time.perf_counter()
+            func()
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(count,)) for count in per_worker]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        'n': len(ms),
+        'p50_ms': percentile(ms, 0.50),
+        'p95_ms': percentile(ms, 0.95),
+        'p99_ms': percentile(ms, 0.99),
+        'mean_ms': sum(ms) / len(ms) if ms else 0.0,
+        'max_ms': ms[-1] if ms else 0.0,
+        'throughput_ops': len(ms) / wall if wall else 0.0
+    }
+
+
+def dataset_sizes():
+    sizes = {}
+    for table in ("users", "flights", "bookings", "passengers"):
+        row = fetch_one(f"SELECT COUNT(*) AS n FROM {table}")
+        sizes[table] = row['n'] if row else None
+    return sizes
+
+
+def print_results(results, baseline=None):
+    print(f"\n{'case':<20}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/sec':>11}")
+    for name, r in results.items():
+        line = f"{name:<20}{r['n']:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['throughput_ops']:>11.1f}"
+        old = (baseline or {}).get(name)
+        if old:
+            change = lambda key: (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            line += f"   p50 {change('p50_ms'):+.1f}%  p99 {change('p99_ms'):+.1f}%  ops {change('throughput_ops'):+.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data-access layer and booking hot path.")
+    parser.add_argument("--iterations", type=int, default=500, help="timed calls per case")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed calls per case")
+    parser.add_argument("--concurrency", type=int, default=1, help="worker threads per case")
+    parser.add_argument("--cases", nargs="*", help="run only these cases")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--load-scale", choices=["small", "medium", "full"],
+                        help="reload the database with bulk_loader at this scale first")
+    parser.add_argument("--users", type=int, help="override the user count of --load-scale")
+    parser.add_argument("--flights", type=int, help="override the flight count of --load-scale")
+    parser.add_argument("--engine", choices=["mysql", "sqlite"], help="storage engine (default: database.DB_ENGINE)")
+    parser.add_argument("--sqlite-path", help="SQLite database file, or :memory:")
+    parser.add_argument("--output", help="JSON results path (default bench_results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--no-query-stats", action="store_true", help="turn query instrumentation off (measures its overhead)")
+    parser.add_argument("--scrypt-n", type=int, help="password hashing cost for service_login (default: PASSWORD_HASH_CONFIG)")
+    args = parser.parse_args()
+
+    if args.engine:
+        database.DB_ENGINE = args.engine
+    if args.sqlite_path:
+        database.SQLITE_PATH = args.sqlite_path
+    database.QUERY_STATS_CONFIG['enabled'] = not args.no_query_stats
+    if args.scrypt_n:
+        PASSWORD_HASHER.n = args.scrypt_n
+    if args.load_scale:
+        if database.DB_ENGINE != "mysql":
+            sys.exit("--load-scale uses bulk_loader, which needs the mysql engine.")
+        import bulk_loader
+        users, flights = bulk_loader.SCALES[args.load_scale]
+        bulk_loader.load(args.users or users, args.flights or flights, seed=args.seed, clear=True)
+
+    database.DB_POOL_CONFIG['pool_size'] = max(args.concurrency, database.DB_POOL_CONFIG['pool_size'])
+    fixture = BenchmarkFixture(args.seed)
+    cases = build_cases(fixture)
+    selected = args.cases or list(cases)
+    unknown = set(selected) - set(cases)
+    if unknown:
+        fixture.cleanup()
+        sys.exit(f"Unknown cases: {', '.join(sorted(unknown))}. Choose from: {', '.join(cases)}")
+
+    results = {}
+    try:
+        for name in selected:
+            print(f"Running {name}...")
+            results[name] = run_case(cases[name], args.iterations, args.concurrency, args.warmup)
+    finally:
+        fixture.cleanup()
+        PASSWORD_HASHER.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+            'engine': database.DB_ENGINE,
+            'dataset': dataset_sizes(),
+            'pool': get_pool_stats(),
+            'query_stats': get_query_stats(10),
+            'password_hashing': PASSWORD_HASHER.stats()
+        },
+        'results': results
+    }
+    path = args.output or os.path.join("bench_results", f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nSaved results to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Concurrency stress test for the booking engine (database.book_flight).
+# Creates a throwaway flight with a few seats, lets many workers race to book it
+# and checks that the number of bookings never exceeds the seats on offer.
+#
+# Usage: python booking_stress.py --workers 32 --attempts 10 --seats 25
+# Exit code is 0 when there were zero oversells, 1 otherwise.
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import database
+from database import book_flight, fetch_one, execute_query, get_pool, SoldOutError
+
+
+def create_stress_flight(seats):
+    flight_number = f"STRESS{os.getpid()}"
+    departure = datetime.now() + timedelta(days=30)
+    ok, flight_id = execute_query(
+        """INSERT INTO flights (flight_number, origin, destination, departure_time, arrival_time, aircraft_name,
+                               economy_seats_total, economy_price, business_seats_total, business_price)
+           VALUES (%s, 'StressOrigin', 'StressDest', %s, %s, 'Stress Test', %s, 100.00, 0, 200.00)""",
+        (flight_number, departure, departure + timedelta(hours=2), seats)
+    )
+    if not ok:
+        sys.exit("Could not create the stress test flight.")
+    return flight_id
+
+
+def create_stress_user():
+    phone = f"9{os.getpid():09d}"[:15]
+    existing = fetch_one("SELECT user_id FROM users WHERE phone_number = %s", (phone,))
+    if existing:
+        return existing['user_id']
+    ok, user_id = execute_query(
+        "INSERT INTO users (username, password, phone_number) VALUES (%s, %s, %s)",
+        ("stress_user", "stress", phone)
+    )
+    if not ok:
+        sys.exit("Could not create the stress test user.")
+    return user_id
+
+
+def cleanup(flight_id, user_id):
+    execute_query("DELETE FROM bookings WHERE flight_id = %s", (flight_id,)) # Passengers cascade
+    execute_query("DELETE FROM flights WHERE flight_id = %s", (flight_id,))
+    execute_query("DELETE FROM sales_daily WHERE origin = 'StressOrigin' AND destination = 'StressDest'") # Rollup rows of the test route
+    execute_query("DELETE FROM users WHERE user_id = %s", (user_id,))
+
+
+def run(workers, attempts, seats, keep=False):
+    database.DB_POOL_CONFIG['pool_size'] = workers
+    flight_id = create_stress_flight(seats)
+    user_id = create_stress_user()
+
+    counts = {'booked': 0, 'sold_out': 0, 'errors': 0}
+    counts_lock = threading.Lock()
+    start_gate = threading.Barrier(workers)
+
+    def worker(n):
+        start_gate.wait() # Release everyone at once for maximum contention
+        for i in range(attempts):
+            try:
+                book_flight(user_id, flight_id, f"Stress {n}-{i}", 30, "Other", "Economy")
+                key = 'booked'
+            except SoldOutError:
+                key = 'sold_out'
+            except Exception as err:
+                print(f"worker {n}: {err}")
+                key = 'errors'
+            with counts_lock:
+                counts[key] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    flight = fetch_one("SELECT economy_seats_booked, economy_seats_total FROM flights WHERE flight_id = %s", (flight_id,))
+    rows = fetch_one(
+        """SELECT COUNT(*) AS n FROM passengers p JOIN bookings b ON p.booking_id = b.booking_id
+           WHERE b.flight_id = %s""",
+        (flight_id,)
+    )
+
+    print(f"Workers: {workers}  Attempts each: {attempts}  Seats: {seats}  Time: {elapsed:.2f}s")
+    print(f"Booked: {counts['booked']}  Sold out: {counts['sold_out']}  Errors: {counts['errors']}")
+    print(f"Seat counter: {flight['economy_seats_booked']}/{flight['economy_seats_total']}  Passenger rows: {rows['n']}")
+    print(f"Pool: {get_pool().stats()}")
+
+    oversold = rows['n'] > seats or flight['economy_seats_booked'] > seats
+    consistent = rows['n'] == flight['economy_seats_booked'] == counts['booked']
+    expected_full = min(seats, workers * attempts) == counts['booked']
+
+    if not keep:
+        cleanup(flight_id, user_id)
+
+    if oversold or not consistent:
+        print("FAIL: oversold or inconsistent seat inventory")
+        return False
+    if counts['errors'] or not expected_full:
+        # Deadlocks, pool timeouts etc. kept bookings from filling the flight: the engine was not fully loaded
+        print(f"FAIL: {counts['errors']} booking errors; {counts['booked']} of {min(seats, workers * attempts)} seats booked")
+        return False
+    print("PASS: zero oversells")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Race many workers to book the same flight.")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=10, help="booking attempts per worker")
+    parser.add_argument("--seats", type=int, default=25, help="economy seats on the test flight")
+    parser.add_argument("--keep", action="store_true", help="keep the test flight and bookings")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.workers, args.attempts, args.seats, args.keep) else 1)
@@ -0,0 +1,348 @@
+# Bulk synthetic data loader for scale testing and benchmarks.
+# Fills users, flights, bookings and passengers with realistic, reproducible data:
+# hub-weighted routes over a multi-year schedule, aircraft sized to the route,
+# per-flight load factors, group sizes, class mix and meal preferences.
+#
+# Run "airport db.py" first to create the schema, then for example:
+#   python bulk_loader.py --scale full --seed 42
+#   python bulk_loader.py --users 200000 --flights 50000 --method infile --truncate
+#
+# Rows are written in batches (multi-row INSERT via executemany, or LOAD DATA LOCAL
+# INFILE from temporary CSV files) with unique/foreign key checks off. Secondary
+# indexes are dropped before the load and rebuilt once at the end, which is much
+# faster than maintaining them row by row.
+
+import argparse
+import csv
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from database import DB_CONFIG, rebuild_ticket_summaries, rebuild_rollups
+
+
+SCALES = {
+    # users, flights (bookings and passengers follow from seats x load factor)
+    'small': (10_000, 2_000),
+    'medium': (200_000, 20_000),
+    'full': (2_000_000, 150_000)
+}
+
+# City, latitude, longitude, hub weight (share of traffic)
+CITIES = [
+    ("Delhi", 28.56, 77.10, 10), ("Mumbai", 19.09, 72.87, 10), ("Bangalore", 13.20, 77.71, 7),
+    ("Kolkata", 22.65, 88.45, 5), ("Chennai", 12.99, 80.17, 5), ("Hyderabad", 17.24, 78.43, 5),
+    ("Ahmedabad", 23.08, 72.63, 3), ("Pune", 18.58, 73.92, 3), ("Goa", 15.38, 73.83, 2),
+    ("Jaipur", 26.82, 75.81, 2), ("Lucknow", 26.76, 80.89, 2), ("Kochi", 10.15, 76.40, 2),
+    ("Dubai", 25.25, 55.36, 6), ("Singapore", 1.36, 103.99, 4), ("London", 51.47, -0.45, 5),
+    ("Frankfurt", 50.04, 8.56, 3), ("New York", 40.64, -73.78, 3), ("Sydney", -33.94, 151.18, 2),
+    ("Bangkok", 13.69, 100.75, 3), ("Doha", 25.27, 51.61, 3)
+]
+
+# Name, economy seats, business seats, max range (km)
+AIRCRAFT = [
+    ("ATR 72", 70, 0, 1500), ("Airbus A320", 168, 12, 6000), ("Boeing 737", 162, 12, 6000),
+    ("Airbus A321", 200, 12, 7000), ("Boeing 787", 250, 30, 14000), ("Airbus A350", 280, 36, 15000),
+    ("Boeing 777", 320, 42, 15000), ("Airbus A380", 420, 76, 15000)
+]
+
+AIRLINES = ["AI", "6E", "UK", "SJ", "EK", "SQ", "BA", "LH", "QR", "QF", "TG"]
+
+# Departure hour weights: morning and evening banks are busiest
+HOUR_WEIGHTS = [1, 1, 1, 1, 2, 4, 7, 9, 9, 7, 6, 5, 5, 5, 6, 6, 7, 8, 9, 8, 6, 4, 2, 1]
+
+# Passengers per booking: mostly solo travellers, some couples, a few families
+GROUP_SIZES = [1, 2, 3, 4, 5]
+GROUP_WEIGHTS = [70, 18, 6, 4, 2]
+
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Ananya", "Diya", "Ishaan", "Kavya", "Rohan", "Saanvi", "Arjun",
+               "Priya", "Rahul", "Sneha", "Vikram", "Meera", "James", "Emma", "Olivia", "Liam", "Noah",
+               "Fatima", "Omar", "Chen", "Mei", "Sofia", "Lucas", "Amelia", "Hiro", "Yuki", "Zara"]
+LAST_NAMES = ["Sharma", "Verma", "Gupta", "Iyer", "Reddy", "Nair", "Das", "Patel", "Singh", "Khan",
+              "Mehta", "Rao", "Joshi", "Smith", "Brown", "Wilson", "Taylor", "Ali", "Wang", "Garcia"]
+
+TABLES = ["users", "flights", "bookings", "passengers"]
+
+COLUMNS = {
+    'users': ["user_id", "username", "password", "phone_number", "role"],
+    'flights': ["flight_id", "flight_number", "origin", "destination", "departure_time", "arrival_time",
+                "aircraft_name", "economy_seats_total", "economy_seats_booked", "economy_price",
+                "business_seats_total", "business_seats_booked", "business_price"],
+    'bookings': ["booking_id", "user_id", "flight_id", "booking_date", "total_amount", "status"],
+    'passengers': ["passenger_id", "booking_id", "passenger_name", "age", "gender", "seat_class", "food_preference_id"]
+}
+
+
+def distance_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[1], a[2], b[1], b[2]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(h))
+
+
+class BatchWriter:
+    # Buffers rows for one table and writes them in batches with the chosen bulk path
+    def __init__(self, conn, table, batch_size, method):
+        self.conn = conn
+        self.table = table
+        self.columns = COLUMNS[table]
+        self.batch_size = batch_size
+        self.method = method
+        self.rows = []
+        self.count = 0
+        self.seconds = 0.0
+        if method == "infile":
+            handle, self.path = tempfile.mkstemp(prefix=f"{table}_", suffix=".csv")
+            self.file = os.fdopen(handle, "w", newline="", encoding="utf-8")
+            self.writer = csv.writer(self.file)
+
+    def add(self, row):
+        if self.method == "infile":
+            self.writer.writerow(["\\N" if value is None else value for value in row])
+            self.count += 1
+            return
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        started = time.perf_counter()
+        placeholders = ", ".join(["%s"] * len(self.columns))
+        cursor = self.conn.cursor()
+        # mysql.connector rewrites executemany of a plain INSERT into one multi-row statement
+        cursor.executemany(f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({placeholders})", self.rows)
+        cursor.close()
+        self.conn.commit()
+        self.count += len(self.rows)
+        self.rows = []
+        self.seconds += time.perf_counter() - started
+
+    def finish(self):
+        if self.method != "infile":
+            self.flush()
+            return
+        self.file.close()
+        started = time.perf_counter()
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""LOAD DATA LOCAL INFILE %s INTO TABLE {self.table}
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+                LINES TERMINATED BY '\\r\\n' ({', '.join(self.columns)})""",
+            (self.path,)
+        )
+        cursor.close()
+        self.conn.commit()
+        os.remove(self.path)
+        self.seconds += time.perf_counter() - started
+
+
+class SyntheticData:
+    def __init__(self, seed, start_date, days, load_factor, food_ids):
+        self.rng = random.Random(seed)
+        self.start_date = start_date
+        self.days = days
+        self.load_factor = load_factor
+        self.food_ids = food_ids
+        self.city_weights = [city[3] for city in CITIES]
+
+    def user(self, user_id):
+        name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+        phone = f"7{user_id:09d}" # Unique per user_id
+        return (user_id, name, "password", phone, "user")
+
+    def flight(self, flight_id):
+        rng = self.rng
+        origin, destination = rng.choices(CITIES, weights=self.city_weights, k=2)
+        while destination is origin:
+            destination = rng.choices(CITIES, weights=self.city_weights)[0]
+        distance = distance_km(origin, destination)
+
+        aircraft = rng.choice([a for a in AIRCRAFT if a[3] >= distance] or AIRCRAFT[-3:])
+        day = self.start_date + timedelta(days=rng.randrange(self.days))
+        departure = day.replace(hour=rng.choices(range(24), weights=HOUR_WEIGHTS)[0], minute=rng.choice((0, 15, 30, 45)))
+        arrival = departure + timedelta(minutes=int(35 + distance / 800 * 60))
+
+        economy_price = round(1500 + distance * 4.5 * rng.uniform(0.85, 1.25), -1)
+        business_price = round(economy_price * rng.uniform(2.8, 3.6), -1)
+        flight_number = f"{rng.choice(AIRLINES)}{flight_id}"
+        return {
+            'flight_id': flight_id, 'flight_number': flight_number, 'origin': origin[0], 'destination': destination[0],
+            'departure_time': departure, 'arrival_time': arrival, 'aircraft_name': aircraft[0],
+            'economy_seats_total': aircraft[1], 'economy_price': economy_price,
+            'business_seats_total': aircraft[2], 'business_price': business_price
+        }
+
+    def bookings_for(self, flight, first_user, users, next_booking_id, next_passenger_id):
+        # Fills the flight to a sampled load factor. Returns (bookings, passengers, seats booked per class).
+        rng = self.rng
+        bookings = []
+        passengers = []
+        booked = {'Economy': 0, 'Business': 0}
+        # Beta(8, 3) has mean ~0.73; scale so the average matches --load-factor
+        load = min(1.0, rng.betavariate(8, 3) * self.load_factor / 0.727)
+        for seat_class, total, price in (("Economy", flight['economy_seats_total'], flight['economy_price']),
+                                         ("Business", flight['business_seats_total'], flight['business_price'])):
+            target = int(total * load)
+            while booked[seat_class] < target:
+                size = min(rng.choices(GROUP_SIZES, weights=GROUP_WEIGHTS)[0], target - booked[seat_class])
+                user_id = first_user + int(users * rng.random() ** 2) # Skewed: some users fly much more often
+                lead_days = min(int(rng.expovariate(1 / 21)), 330)
+                booking_date = flight['departure_time'] - timedelta(days=lead_days, minutes=rng.randrange(1440))
+                cancelled = rng.random() < 0.04
+                bookings.append((next_booking_id, user_id, flight['flight_id'], booking_date, price * size,
+                                 "Cancelled" if cancelled else "Confirmed"))
+                for _ in range(size):
+                    age = rng.randint(2, 12) if rng.random() < 0.08 else min(90, int(rng.gauss(38, 13)) + 1)
+                    age = max(age, 1)
+                    food_id = rng.choice(self.food_ids) if self.food_ids and rng.random() < 0.7 else None
+                    passengers.append((next_passenger_id, next_booking_id,
+                                       f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", age,
+                                       rng.choices(("Male", "Female", "Other"), weights=(49, 49, 2))[0],
+                                       seat_class, food_id))
+                    next_passenger_id += 1
+                if not cancelled: # Cancelled bookings released their seats
+                    booked[seat_class] += size
+                next_booking_id += 1
+        return bookings, passengers, booked
+
+
+def table_max_id(cursor, table, column):
+    cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def drop_secondary_indexes(cursor):
+    # Drops non-unique secondary indexes on the loaded tables and returns their definitions.
+    # Indexes a foreign key depends on cannot be dropped and are kept.
+    placeholders = ", ".join(["%s"] * len(TABLES))
+    cursor.execute(
+        f"""SELECT TABLE_NAME, INDEX_NAME, GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX) AS cols
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})
+              AND NON_UNIQUE = 1 AND INDEX_NAME <> 'PRIMARY'
+            GROUP BY TABLE_NAME, INDEX_NAME""",
+        tuple(TABLES)
+    )
+    dropped = []
+    for table, index_name, columns in cursor.fetchall():
+        try:
+            cursor.execute(f"ALTER TABLE {table} DROP INDEX {index_name}")
+            dropped.append((table, index_name, columns))
+        except mysql.connector.Error as err:
+            if err.errno != 1553: # ER_DROP_INDEX_FK: needed by a foreign key
+                raise
+    return dropped
+
+
+def rebuild_indexes(cursor, dropped):
+    by_table = {}
+    for table, index_name, columns in dropped:
+        by_table.setdefault(table, []).append(f"ADD INDEX {index_name} ({columns})")
+    for table, clauses in by_table.items():
+        started = time.perf_counter()
+        cursor.execute(f"ALTER TABLE {table} {', '.join(clauses)}") # One sorted build per table
+        print(f"  Rebuilt {len(clauses)} index(es) on {table} in {time.perf_counter() - started:.1f}s")
+
+
+def truncate(cursor):
+    for table in ("ticket_summaries", "sales_daily", "meal_demand", "cancellation_notices", "seat_maps", "passengers",
+                  "bookings", "flights"):
+        cursor.execute(f"TRUNCATE TABLE {table}")
+    cursor.execute("DELETE FROM users WHERE role <> 'admin'")
+
+
+def load(users, flights, seed=42, start_date=None, days=730, load_factor=0.78, batch_size=5000,
+         method="executemany", clear=False):
+    config = dict(DB_CONFIG, allow_local_infile=(method == "infile"))
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION unique_checks = 0")
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    if clear:
+        truncate(cursor)
+
+    cursor.execute("SELECT food_id FROM food_items ORDER BY food_id")
+    food_ids = [row[0] for row in cursor.fetchall()]
+    data = SyntheticData(seed, start_date or datetime(2025, 1, 1), days, load_factor, food_ids)
+
+    print("Dropping secondary indexes for the load...")
+    dropped = drop_secondary_indexes(cursor)
+
+    writers = {table: BatchWriter(conn, table, batch_size, method) for table in TABLES}
+    started = time.perf_counter()
+    try:
+        first_user = table_max_id(cursor, "users", "user_id") + 1
+        for user_id in range(first_user, first_user + users):
+            writers['users'].add(data.user(user_id))
+
+        first_flight = table_max_id(cursor, "flights", "flight_id") + 1
+        first_booking = next_booking_id = table_max_id(cursor, "bookings", "booking_id") + 1
+        next_passenger_id = table_max_id(cursor, "passengers", "passenger_id") + 1
+        for flight_id in range(first_flight, first_flight + flights):
+            flight = data.flight(flight_id)
+            bookings, passengers, booked = data.bookings_for(flight, first_user, users, next_booking_id, next_passenger_id)
+            next_booking_id += len(bookings)
+            next_passenger_id += len(passengers)
+            flight['economy_seats_booked'] = booked['Economy']
+            flight['business_seats_booked'] = booked['Business']
+            writers['flights'].add(tuple(flight[column] for column in COLUMNS['flights']))
+            for booking in bookings:
+                writers['bookings'].add(booking)
+            for passenger in passengers:
+                writers['passengers'].add(passenger)
+            if (flight_id - first_flight + 1) % 10_000 == 0:
+                print(f"  {flight_id - first_flight + 1:,} flights generated ({time.perf_counter() - started:.0f}s)")
+
+        for table in TABLES:
+            writers[table].finish()
+    finally:
+        print("Rebuilding secondary indexes...")
+        rebuild_indexes(cursor, dropped)
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+        cursor.execute("SET SESSION unique_checks = 1")
+        cursor.close()
+
+    try: # The loaded bookings bypassed the booking engine, so derive their My Tickets rows and rollups
+        print("Filling ticket summaries...")
+        summary_started = time.perf_counter()
+        summaries = rebuild_ticket_summaries(conn, first_booking)
+        print(f"  {summaries:,} rows in {time.perf_counter() - summary_started:.1f}s")
+        print("Rebuilding analytics rollups...")
+        rollup_started = time.perf_counter()
+        rebuild_rollups(conn)
+        print(f"  Done in {time.perf_counter() - rollup_started:.1f}s")
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Loaded in {elapsed:.1f}s:")
+    for table in TABLES:
+        writer = writers[table]
+        rate = writer.count / writer.seconds if writer.seconds else 0.0
+        print(f"  {table:<11} {writer.count:>12,} rows  ({rate:,.0f} rows/sec while writing)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load synthetic users, flights, bookings and passengers.")
+    parser.add_argument("--scale", choices=SCALES.keys(), default="small", help="preset sizes (overridden by --users/--flights)")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--flights", type=int)
+    parser.add_argument("--seed", type=int, default=42, help="same seed, same data")
+    parser.add_argument("--start-date", default="2025-01-01", help="first day of the schedule (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=730, help="length of the schedule in days")
+    parser.add_argument("--load-factor", type=float, default=0.78, help="average share of seats sold")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per executemany batch")
+    parser.add_argument("--method", choices=["executemany", "infile"], default="executemany",
+                        help="infile uses LOAD DATA LOCAL INFILE (server needs local_infile=ON)")
+    parser.add_argument("--truncate", action="store_true", help="delete existing flights, bookings and non-admin users first")
+    args = parser.parse_args()
+
+    users, flights = SCALES[args.scale]
+    load(args.users or users, args.flights or flights, args.seed, datetime.strptime(args.start_date, "%Y-%m-%d"),
+         args.days, args.load_factor, args.batch_size, args.method, args.truncate)
@@ -0,0 +1,201 @@
+# Password hashing for login and signup. Passwords are stored as scrypt hashes in
+# a self-describing format ("scrypt$n$r$p$salt$hash", base64), so the cost can be
+# raised later: a login whose hash used other parameters, or a legacy plaintext
+# row, gets rehashed with the current ones. scrypt costs tens of milliseconds of
+# CPU per call, so it runs in a pool of worker processes, not on the thread that
+# serves the request (and never on the Tk main thread).
+#
+#   python credentials.py --bench                   # logins/sec for a few cost settings
+#   python credentials.py --bench --n 16384 65536 --workers 1 4 --concurrency 8
+
+import argparse
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+PASSWORD_HASH_CONFIG = {
+    'n': int(os.environ.get('AIRPORT_SCRYPT_N', 2 ** 14)), # CPU/memory cost, a power of two
+    'r': int(os.environ.get('AIRPORT_SCRYPT_R', 8)),       # Block size
+    'p': int(os.environ.get('AIRPORT_SCRYPT_P', 1)),       # Parallelism
+    # Processes (None: one per CPU, 0: inline)
+    'workers': int(os.environ['AIRPORT_HASH_WORKERS']) if os.environ.get('AIRPORT_HASH_WORKERS') else None
+}
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 64
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+def _scrypt(password, salt, n, r, p):
+    # Runs in a worker process. maxmem leaves room above the 128 * n * r bytes scrypt needs.
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES)
+
+def encode_hash(salt, key, n, r, p):
+    return f"{SCHEME}${n}${r}${p}${_b64(salt)}${_b64(key)}"
+
+def parse_hash(stored):
+    # (salt, key, n, r, p), or None for anything that is not one of our hashes (legacy plaintext)
+    parts = (stored or "").split("$")
+    if len(parts) != 6 or parts[0] != SCHEME:
+        return None
+    try:
+        return base64.b64decode(parts[4]), base64.b64decode(parts[5]), int(parts[1]), int(parts[2]), int(parts[3])
+    except ValueError:
+        return None
+
+def hash_password(password, n, r, p):
+    salt = secrets.token_bytes(SALT_BYTES)
+    return encode_hash(salt, _scrypt(password, salt, n, r, p), n, r, p)
+
+def verify_password(password, stored, n, r, p):
+    # (matches, needs_rehash) against a stored hash or legacy plaintext.
+    # needs_rehash: plaintext, or hashed with parameters other than (n, r, p).
+    parsed = parse_hash(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode("utf-8"), (stored or "").encode("utf-8")), True
+    salt, key, stored_n, stored_r, stored_p = parsed
+    matches = hmac.compare_digest(_scrypt(password, salt, stored_n, stored_r, stored_p), key)
+    return matches, (stored_n, stored_r, stored_p) != (n, r, p)
+
+def _warm_up():
+    return os.getpid()
+
+
+class PasswordHasher:
+    # hash()/verify() block the calling thread (a DB worker or API worker) while a
+    # worker process does the scrypt work, so many logins hash in parallel without
+    # holding the GIL or the Tk loop. The pool starts on first use or start().
+    def __init__(self, n=None, r=None, p=None, workers=-1):
+        self.n = n or PASSWORD_HASH_CONFIG['n']
+        self.r = r or PASSWORD_HASH_CONFIG['r']
+        self.p = p or PASSWORD_HASH_CONFIG['p']
+        self.workers = PASSWORD_HASH_CONFIG['workers'] if workers == -1 else workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {'hashes': 0, 'verifies': 0, 'rehashes': 0, 'hash_time': 0.0}
+
+    def start(self):
+        # Spawn the worker processes now (e.g. while the login screen paints)
+        executor = self._pool()
+        if executor is not None:
+            for future in [executor.submit(_warm_up) for _ in range(self._max_workers())]:
+                future.result()
+
+    def hash(self, password):
+        started = time.perf_counter()
+        result = self._run(hash_password, password, self.n, self.r, self.p)
+        self._count('hashes', started)
+        return result
+
+    def verify(self, password, stored):
+        # (matches, needs_rehash); stored None runs a dummy check and never matches
+        missing = stored is None
+        if missing: # Unknown user: a miss costs as much as a wrong password
+            stored = encode_hash(b"\0" * SALT_BYTES, b"\0" * KEY_BYTES, self.n, self.r, self.p)
+        started = time.perf_counter()
+        matches, needs_rehash = self._run(verify_password, password, stored, self.n, self.r, self.p)
+        self._count('verifies', started)
+        if missing:
+            return False, False
+        return matches, needs_rehash
+
+    def note_rehash(self):
+        with self._lock:
+            self._stats['rehashes'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats['hashes'] + stats['verifies']
+        stats['avg_hash_ms'] = stats['hash_time'] * 1000 / calls if calls else 0.0
+        stats.update(n=self.n, r=self.r, p=self.p, workers=self._max_workers())
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, func, *args):
+        executor = self._pool()
+        if executor is None:
+            return func(*args)
+        return executor.submit(func, *args).result()
+
+    def _pool(self):
+        if self.workers == 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the parent has Tk and DB threads that must not be copied half-way
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers(),
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _max_workers(self):
+        return self.workers if self.workers is not None else (os.cpu_count() or 1)
+
+    def _count(self, key, started):
+        with self._lock:
+            self._stats[key] += 1
+            self._stats['hash_time'] += time.perf_counter() - started
+
+
+PASSWORD_HASHER = PasswordHasher()
+
+
+def bench(costs, worker_counts, concurrency, seconds, r, p):
+    # Logins/sec (one verify per login) for each cost and pool size
+    print(f"{'n':>8}{'workers':>9}{'ms/hash':>10}{'logins/sec':>12}")
+    for n in costs:
+        stored = hash_password("correct horse", n, r, p)
+        for workers in worker_counts:
+            hasher = PasswordHasher(n, r, p, workers)
+            hasher.start()
+            done = 0
+            lock = threading.Lock()
+            deadline = time.perf_counter() + seconds
+
+            def login():
+                nonlocal done
+                while time.perf_counter() < deadline:
+                    hasher.verify("correct horse", stored)
+                    with lock:
+                        done += 1
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as threads:
+                for future in [threads.submit(login) for _ in range(concurrency)]:
+                    future.result()
+            elapsed = time.perf_counter() - started
+            stats = hasher.stats()
+            hasher.shutdown()
+            print(f"{n:>8}{workers:>9}{stats['avg_hash_ms']:>10.1f}{done / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password hashing cost benchmark.")
+    parser.add_argument("--bench", action="store_true", help="measure logins/sec for each cost setting")
+    parser.add_argument("--n", type=int, nargs="*", default=[2 ** 12, 2 ** 14, 2 ** 15], help="scrypt n values")
+    parser.add_argument("--r", type=int, default=PASSWORD_HASH_CONFIG['r'])
+    parser.add_argument("--p", type=int, default=PASSWORD_HASH_CONFIG['p'])
+    parser.add_argument("--workers", type=int, nargs="*", help="pool sizes to try (0 = inline, default 0 and CPU count)")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1, help="simultaneous logins")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each measurement")
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.error("nothing to do (use --bench)")
+    bench(args.n, args.workers if args.workers is not None else [0, os.cpu_count() or 1],
+          args.concurrency, args.seconds, args.r, args.p)
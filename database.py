@@ -0,0 +1,1695 @@
+# Data layer: storage configuration, the connection pool, query helpers, reference
+# data cache, list queries, the bookings export and the booking engine.
+# Has no GUI dependencies, so the Tk app, the local API server (api.py) and the
+# command line tools all share it.
+
+import csv
+import functools
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from storage import (create_backend, DB_ERRORS, PoolError, CircuitOpenError, CommitUnknownError, UNAVAILABLE,
+                     TICKET_SUMMARY_FILL, ROLLUP_FILLS, FARE_SQL)
+from instrumentation import QueryStats, InstrumentedCursor
+
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'database': 'airport_management'
+}
+
+# Storage engine: "mysql" (the server in DB_CONFIG) or "sqlite" (embedded, no server;
+# the database lives in SQLITE_PATH, ":memory:" for a throwaway in-process one)
+DB_ENGINE = os.environ.get('AIRPORT_DB_ENGINE', 'mysql')
+SQLITE_PATH = os.environ.get('AIRPORT_SQLITE_PATH', 'airport.db')
+
+# Connection pool settings (see ConnectionPool below)
+DB_POOL_CONFIG = {
+    'pool_size': 5,          # Max connections open at the same time
+    'acquire_timeout': 10,   # Seconds to wait for a free connection before giving up
+    'idle_recycle': 300,     # Connections idle longer than this (seconds) are reopened
+    'health_check': True,    # Ping a connection before handing it out
+    'statement_cache_size': 32, # Prepared statements kept per connection (least recently used go first)
+    'breaker_threshold': int(os.environ.get('AIRPORT_DB_BREAKER_THRESHOLD', 5)), # Consecutive connection failures that open the circuit breaker (0: no breaker)
+    'breaker_reset_timeout': float(os.environ.get('AIRPORT_DB_BREAKER_RESET', 5)) # Seconds the breaker fails fast before letting one probe through
+}
+
+# Retries of calls that failed on a dropped connection, an unreachable server or a lock
+# conflict (see retrying below)
+DB_RETRY_CONFIG = {
+    'attempts': int(os.environ.get('AIRPORT_DB_RETRIES', 3)), # Tries per call, the first one included
+    'base_delay': 0.05, # Seconds; the backoff cap doubles with every retry
+    'max_delay': 2.0    # Longest single backoff
+}
+
+# Query instrumentation (see instrumentation.py): per-statement timings, histograms,
+# row counts and connection acquire time, plus a rotating log of slow statements
+QUERY_STATS_CONFIG = {
+    'enabled': os.environ.get('AIRPORT_QUERY_STATS', '1') != '0',
+    'slow_query_ms': float(os.environ.get('AIRPORT_SLOW_QUERY_MS', 200)), # 0 disables the slow log
+    'slow_log_path': os.environ.get('AIRPORT_SLOW_QUERY_LOG', 'slow_queries.log'),
+    'slow_log_max_bytes': 5 * 1024 * 1024,
+    'slow_log_backups': 3
+}
+
+
+# - Connection Pool -
+# Per thread: depth of nested retrying calls and whether the current attempt sent COMMIT
+_retry_state = threading.local()
+
+class StatementCache:
+    # Prepared statements of one connection, keyed by SQL text, least recently used
+    # first. Lives as long as the connection; only the thread that has the connection
+    # checked out touches it, so it needs no lock of its own.
+    def __init__(self, pool, raw_conn):
+        self._pool = pool
+        self._raw = raw_conn
+        self._statements = OrderedDict() # query -> prepared cursor
+
+    def get(self, query):
+        cursor = self._statements.get(query)
+        if cursor is not None:
+            self._statements.move_to_end(query)
+            self._pool._bump('statement_hits')
+            return cursor
+        self._pool._bump('statement_misses')
+        if len(self._statements) >= self._pool.statement_cache_size:
+            _, oldest = self._statements.popitem(last=False)
+            self._pool._bump('statement_evictions')
+            try:
+                oldest.close()
+            except Exception:
+                pass
+        cursor = self._pool.backend.prepare(self._raw, query)
+        if self._pool.query_stats is not None:
+            cursor = InstrumentedCursor(cursor, self._pool.query_stats)
+        self._statements[query] = cursor
+        return cursor
+
+    def discard(self, query):
+        cursor = self._statements.pop(query, None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def __len__(self):
+        return len(self._statements)
+
+
+class PooledConnection:
+    # Thin wrapper around a backend connection. close() hands it back to the pool
+    # instead of closing the socket, so existing "conn.close()" code keeps working.
+    def __init__(self, pool, raw_conn, statements):
+        self._pool = pool
+        self._raw = raw_conn
+        self._statements = statements
+        self._broken = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        stats = self._pool.query_stats
+        return InstrumentedCursor(cursor, stats) if stats is not None else cursor
+
+    def prepare(self, query):
+        # Cached prepared cursor for a fixed hot query. Do not close it; execute it
+        # and fetch all rows (rows are tuples, see dict_rows).
+        return self._statements.get(query)
+
+    def discard_statement(self, query):
+        self._statements.discard(query)
+
+    def commit(self):
+        _retry_state.commit_sent = True # From here on a lost connection leaves the outcome unknown
+        self._raw.commit()
+
+    def rollback(self):
+        # Rolling back on a connection that just dropped would raise over the error that
+        # matters. The server has rolled back already; the pool discards the connection.
+        try:
+            self._raw.rollback()
+        except DB_ERRORS:
+            self._broken = True
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw, self._broken)
+
+
+class CircuitBreaker:
+    # Keeps a database outage from turning into a reconnect storm. Closed: everything goes
+    # through and consecutive "unavailable" failures are counted. failure_threshold of them
+    # open it, and acquire() then fails at once with CircuitOpenError instead of every
+    # caller waiting out its own connect timeout. After reset_timeout the next acquire is
+    # let through as a probe (half open): a working connection closes the breaker, another
+    # failure opens it for a further reset_timeout.
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=5):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+
+        self._lock = threading.Lock()
+        self._failures = 0          # Consecutive, while closed
+        self._opened_at = None      # Last time it (re)opened
+        self._outage_started = None # First time it opened since it was last closed
+        self._probing = False
+        self._stats = {'opens': 0, 'rejected': 0, 'failures': 0, 'open_time': 0.0}
+
+    def allow(self):
+        # Raises CircuitOpenError while open; returns True if the caller is the probe
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            since_open = time.monotonic() - self._opened_at
+            if self.state == self.OPEN and since_open >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats['rejected'] += 1
+        raise CircuitOpenError(
+            f"Database unavailable, trying again in {max(1, math.ceil(self.reset_timeout - since_open))}s")
+
+    def record_success(self):
+        if self.state == self.CLOSED and not self._failures:
+            return # Common case, no lock
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._stats['open_time'] += time.monotonic() - self._outage_started
+                self.state = self.CLOSED
+
+    def record_failure(self):
+        # Returns True if this failure opened the breaker
+        with self._lock:
+            self._stats['failures'] += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN: # Probe failed
+                self.state, self._opened_at = self.OPEN, time.monotonic()
+                return False
+            if self.state == self.OPEN:
+                return False
+            self._failures += 1
+            if self._failures < self.failure_threshold:
+                return False
+            self.state = self.OPEN
+            self._opened_at = self._outage_started = time.monotonic()
+            self._stats['opens'] += 1
+            return True
+
+    def abandon_probe(self):
+        # The probe ended without telling us anything (e.g. pool timeout): let another try
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self.state
+            if self.state != self.CLOSED:
+                stats['open_time'] += time.monotonic() - self._outage_started
+        return stats
+
+
+class ConnectionPool:
+    def __init__(self, backend, pool_size=5, acquire_timeout=10, idle_recycle=300, health_check=True,
+                 statement_cache_size=32, query_stats=None, breaker_threshold=5, breaker_reset_timeout=5):
+        self.backend = backend
+        self.pool_size = min(pool_size, backend.max_connections or pool_size)
+        self.acquire_timeout = acquire_timeout
+        self.idle_recycle = idle_recycle
+        self.health_check = health_check
+        self.statement_cache_size = max(1, statement_cache_size)
+        self.query_stats = query_stats # QueryStats, or None for no instrumentation
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset_timeout) if breaker_threshold else None
+
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._open = 0   # Idle + checked out + being opened
+        self._stats = {
+            'checked_out': 0, 'acquired': 0, 'created': 0, 'recycled': 0,
+            'health_check_failures': 0, 'waits': 0, 'wait_time': 0.0,
+            'max_wait_time': 0.0, 'timeouts': 0,
+            'statement_hits': 0, 'statement_misses': 0, 'statement_evictions': 0,
+            'connect_failures': 0, 'connect_time': 0.0, 'max_connect_time': 0.0, # Includes failed attempts
+            'retries': 0, 'retry_wait_time': 0.0, 'retry_recovered': 0, 'retries_exhausted': 0, 'commit_unknown': 0
+        }
+        self._statements = {} # id(raw connection) -> StatementCache
+
+    def acquire(self):
+        started = time.perf_counter()
+        probe = self.breaker.allow() if self.breaker is not None else False # Fails fast while open
+        try:
+            conn = self._acquire(started, probe)
+        except BaseException:
+            if probe:
+                self.breaker.abandon_probe()
+            raise
+        if probe:
+            self.breaker.record_success()
+        return conn
+
+    def _acquire(self, started, probe):
+        deadline = time.monotonic() + self.acquire_timeout
+        wait_started = None
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.pool_size:
+                    if wait_started is None:
+                        wait_started = time.perf_counter()
+                        self._stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        self._record_wait(wait_started)
+                        raise PoolError(
+                            f"No free database connection after {self.acquire_timeout}s (pool size {self.pool_size})")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    raw, last_used = self._idle.pop() # LIFO keeps the warmest connection in use
+                else:
+                    raw, last_used = None, None
+                    self._open += 1 # Reserve the slot before connecting outside the lock
+
+            if raw is None:
+                connect_started = time.perf_counter()
+                try:
+                    raw = self.backend.connect()
+                except Exception as err:
+                    self._record_connect(connect_started, failed=True)
+                    self._forget()
+                    self.report_error(err)
+                    raise
+                self._record_connect(connect_started)
+                with self._cond:
+                    self._statements[id(raw)] = StatementCache(self, raw)
+                self._bump('created')
+                if self.breaker is not None:
+                    self.breaker.record_success()
+            elif self.idle_recycle and time.monotonic() - last_used > self.idle_recycle:
+                self._bump('recycled')
+                self._discard(raw)
+                continue
+            elif (self.health_check or probe) and not self._is_healthy(raw):
+                self._bump('health_check_failures')
+                self._discard(raw)
+                continue
+
+            with self._cond:
+                self._stats['checked_out'] += 1
+                self._stats['acquired'] += 1
+                self._record_wait(wait_started)
+                statements = self._statements[id(raw)]
+            if self.query_stats is not None:
+                self.query_stats.record_acquire(time.perf_counter() - started)
+            return PooledConnection(self, raw, statements)
+
+    def release(self, raw, broken=False):
+        try:
+            if broken:
+                raise PoolError("Connection failed while checked out")
+            # Never hand out a connection with an open transaction (stale snapshot / held locks)
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            with self._cond:
+                self._stats['checked_out'] -= 1
+            self._discard(raw)
+            return
+        with self._cond:
+            self._stats['checked_out'] -= 1
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def report_error(self, err):
+        # Classifies an error seen on one of this pool's connections (see storage.py) and
+        # feeds outages to the circuit breaker. Returns the error kind.
+        kind = self.backend.classify_error(err)
+        if kind == UNAVAILABLE and self.breaker is not None and self.breaker.record_failure():
+            self.close_all() # The idle connections went down with the server
+        return kind
+
+    def record_retry(self, delay):
+        with self._cond:
+            self._stats['retries'] += 1
+            self._stats['retry_wait_time'] += delay
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pool_size'] = self.pool_size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['prepared_statements'] = sum(len(cache) for cache in self._statements.values())
+        stats['avg_wait_time'] = stats['wait_time'] / stats['waits'] if stats['waits'] else 0.0
+        lookups = stats['statement_hits'] + stats['statement_misses']
+        stats['statement_hit_rate'] = stats['statement_hits'] / lookups if lookups else 0.0
+        connects = stats['created'] + stats['connect_failures']
+        stats['avg_connect_time'] = stats['connect_time'] / connects if connects else 0.0
+        if self.breaker is not None:
+            stats.update({f"circuit_{key}": value for key, value in self.breaker.stats().items()})
+        return stats
+
+    def _is_healthy(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _bump(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    def _record_connect(self, connect_started, failed=False):
+        took = time.perf_counter() - connect_started
+        with self._cond:
+            self._stats['connect_time'] += took
+            self._stats['max_connect_time'] = max(self._stats['max_connect_time'], took)
+            if failed:
+                self._stats['connect_failures'] += 1
+
+    def _record_wait(self, wait_started):
+        # Caller holds self._cond
+        if wait_started is not None:
+            waited = time.perf_counter() - wait_started
+            self._stats['wait_time'] += waited
+            self._stats['max_wait_time'] = max(self._stats['max_wait_time'], waited)
+
+    def _discard(self, raw):
+        with self._cond:
+            self._statements.pop(id(raw), None) # Closing the connection frees its statements
+        try:
+            raw.close()
+        except Exception:
+            pass
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+
+DB_POOL = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global DB_POOL
+    with _pool_lock:
+        if DB_POOL is None:
+            query_stats = None
+            if QUERY_STATS_CONFIG['enabled']:
+                query_stats = QueryStats(**{key: value for key, value in QUERY_STATS_CONFIG.items() if key != 'enabled'})
+            DB_POOL = ConnectionPool(create_backend(DB_ENGINE, DB_CONFIG, SQLITE_PATH), query_stats=query_stats,
+                                     **DB_POOL_CONFIG)
+        return DB_POOL
+
+def get_pool_stats():
+    return get_pool().stats()
+
+def get_query_stats(top=20, order_by="total_ms"):
+    # Top statements by order_by plus acquire times, or None with instrumentation off
+    stats = get_pool().query_stats
+    return stats.snapshot(top, order_by) if stats is not None else None
+
+
+# - Retries -
+def retrying(idempotent=True):
+    # Decorator for functions that take their own connection from the pool. A call that
+    # fails with an error the backend classifies as unavailable or transient (see
+    # storage.py) runs again, up to DB_RETRY_CONFIG['attempts'] times, after a full
+    # jitter backoff: uniform(0, min(max_delay, base_delay * 2**retry)), so callers that
+    # failed together do not all come back together. CircuitOpenError is not retried.
+    # Writes (idempotent=False) only run again if the failed attempt never sent COMMIT:
+    # an uncommitted transaction dies with its connection, so it cannot be applied twice.
+    # A connection lost during COMMIT raises CommitUnknownError instead. Calls nested in
+    # a retrying call run once; the outermost one retries the whole unit.
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_retry_state, 'depth', 0):
+                return func(*args, **kwargs)
+            pool = get_pool()
+            attempts = max(1, DB_RETRY_CONFIG['attempts'])
+            _retry_state.depth = 1
+            try:
+                for attempt in range(attempts):
+                    _retry_state.commit_sent = False
+                    try:
+                        result = func(*args, **kwargs)
+                    except DB_ERRORS as err:
+                        if isinstance(err, PoolError): # Timeout, breaker open: retrying adds load
+                            raise
+                        kind = pool.report_error(err)
+                        if kind == UNAVAILABLE and not idempotent and _retry_state.commit_sent:
+                            pool._bump('commit_unknown')
+                            raise CommitUnknownError(
+                                f"Lost the database connection while saving; the change may or may not have been saved ({err})"
+                            ) from err
+                        if kind is None:
+                            raise
+                        if attempt == attempts - 1:
+                            pool._bump('retries_exhausted')
+                            raise
+                        delay = random.uniform(0, min(DB_RETRY_CONFIG['max_delay'], DB_RETRY_CONFIG['base_delay'] * 2 ** attempt))
+                        pool.record_retry(delay)
+                        time.sleep(delay)
+                        continue
+                    if attempt:
+                        pool._bump('retry_recovered')
+                    if pool.breaker is not None:
+                        pool.breaker.record_success()
+                    return result
+            finally:
+                _retry_state.depth = 0
+        return wrapper
+    return decorate
+
+
+# Called as handler(title, message) when fetch_all/fetch_one/execute_query swallow a
+# database error. The GUI installs a message box; without one the error goes to stderr.
+# The same title is shown at most once per DB_ERROR_REPEAT_INTERVAL seconds (the rest go
+# to stderr), so an outage does not bury the user in identical dialogs.
+DB_ERROR_HANDLER = None
+DB_ERROR_REPEAT_INTERVAL = 30
+
+_last_shown = {} # title -> time.monotonic() it was last shown
+_shown_lock = threading.Lock()
+
+def show_db_error(title, message):
+    now = time.monotonic()
+    with _shown_lock:
+        quiet = now - _last_shown.get(title, -DB_ERROR_REPEAT_INTERVAL) < DB_ERROR_REPEAT_INTERVAL
+        if not quiet:
+            _last_shown[title] = now
+    if DB_ERROR_HANDLER is not None and not quiet:
+        DB_ERROR_HANDLER(title, message)
+    else:
+        print(f"{title}: {message}", file=sys.stderr)
+
+
+def get_db_connection():
+    try:
+        return get_pool().acquire()
+    except DB_ERRORS as err:
+        show_db_error("Database Error", f"Error connecting to database: {err}")
+        return None
+
+# Swallowing variants: errors are shown (see show_db_error) and an empty result returned
+def fetch_all(query, params=None):
+    try:
+        return query_all(query, params)
+    except DB_ERRORS as err:
+        show_db_error("Database Error", f"Error fetching data: {err}")
+        return []
+
+def fetch_one(query, params=None):
+    try:
+        return query_one(query, params)
+    except DB_ERRORS as err:
+        show_db_error("Database Error", f"Error fetching data: {err}")
+        return None
+
+def execute_query(query, params=None):
+    try:
+        _, lastrowid = execute_write(query, params)
+        return True, lastrowid # Return True and last inserted ID if applicable
+    except DB_ERRORS as err:
+        show_db_error("Database Error", f"Error executing query: {err}")
+        return False, None
+
+# Raising variants for callers that report errors themselves (service layer, API).
+# prepared=True runs the query as a cached prepared statement on the connection
+# (see StatementCache); use it for fixed hot queries, not for SQL built per call.
+# Reads are retried on connection failures, writes only when that is safe (see retrying).
+@retrying()
+def query_all(query, params=None, prepared=False):
+    conn = get_pool().acquire()
+    try:
+        if prepared:
+            return execute_prepared(conn, query, params)
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+@retrying()
+def query_one(query, params=None, prepared=False):
+    conn = get_pool().acquire()
+    try:
+        if prepared:
+            rows = execute_prepared(conn, query, params)
+            return rows[0] if rows else None
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+@retrying(idempotent=False)
+def execute_write(query, params=None, prepared=False):
+    # Returns (rowcount, lastrowid)
+    conn = get_pool().acquire()
+    cursor = conn.prepare(query) if prepared else conn.cursor()
+    try:
+        cursor.execute(query, params or ())
+        conn.commit()
+        return cursor.rowcount, cursor.lastrowid
+    except Exception as err:
+        conn.rollback()
+        if prepared and isinstance(err, DB_ERRORS):
+            conn.discard_statement(query)
+        raise
+    finally:
+        if not prepared:
+            cursor.close()
+        conn.close()
+
+def execute_prepared(conn, query, params=None):
+    # Runs a cached prepared statement on conn. Returns dict rows for a SELECT
+    # (all rows are read so the statement is ready for its next execute), else [].
+    cursor = conn.prepare(query)
+    try:
+        cursor.execute(query, params or ())
+        return dict_rows(cursor, cursor.fetchall()) if cursor.description else []
+    except DB_ERRORS:
+        conn.discard_statement(query) # May be unusable now (e.g. the server restarted)
+        raise
+
+def dict_rows(cursor, rows):
+    columns = cursor.column_names
+    return [dict(zip(columns, row)) for row in rows]
+
+# - Reference Data Cache -
+REFERENCE_CACHE_TTL = 600 # Seconds before static tables are re-read from the database
+
+class ReferenceCache:
+    # In-process copy of a small, rarely changing table (e.g. the food menu).
+    # Loaded once, refreshed after ttl seconds or on invalidate(), with both
+    # label -> id and id -> label indexes so lookups either way are O(1).
+    def __init__(self, name, loader, id_field, label_func, ttl=REFERENCE_CACHE_TTL):
+        self.name = name
+        self.loader = loader         # Returns a list of row dicts
+        self.id_field = id_field
+        self.label_func = label_func # Row dict -> display label
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._rows = []
+        self._by_label = {}
+        self._by_id = {}
+        self._loaded_at = None
+        self._stats = {'hits': 0, 'misses': 0, 'loads': 0, 'invalidations': 0}
+
+    def is_fresh(self):
+        loaded_at = self._loaded_at
+        return loaded_at is not None and (not self.ttl or time.monotonic() - loaded_at < self.ttl)
+
+    def options(self):
+        # Label -> id, in table order (suitable for a Combobox)
+        self._ensure_loaded()
+        return dict(self._by_label)
+
+    def rows(self):
+        self._ensure_loaded()
+        return list(self._rows)
+
+    def id_for(self, label, default=None):
+        self._ensure_loaded()
+        return self._by_label.get(label, default)
+
+    def label_for(self, row_id, default=None):
+        self._ensure_loaded()
+        return self._by_id.get(row_id, default)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = len(self._rows)
+        stats['fresh'] = self.is_fresh()
+        return stats
+
+    def _ensure_loaded(self):
+        with self._lock: # Held while loading so concurrent callers share one query
+            if self.is_fresh():
+                self._stats['hits'] += 1
+                return
+            self._stats['misses'] += 1
+            rows = self.loader()
+            self._stats['loads'] += 1
+            by_label = {}
+            by_id = {}
+            for row in rows:
+                label = self.label_func(row)
+                by_label[label] = row[self.id_field]
+                by_id[row[self.id_field]] = label
+            # Swap in whole indexes so readers never see a half-built one
+            self._rows, self._by_label, self._by_id = rows, by_label, by_id
+            if rows: # An empty result is usually a failed query: retry on next access
+                self._loaded_at = time.monotonic()
+
+
+FOOD_CACHE = ReferenceCache(
+    "food_items",
+    lambda: fetch_all("SELECT food_id, item_name, type, price FROM food_items ORDER BY type, item_name"),
+    "food_id",
+    lambda food: f"{food['item_name']} ({food['type']})"
+)
+
+# Table name -> cache. Call invalidate_reference_data(table) after editing one of these tables.
+REFERENCE_CACHES = {cache.name: cache for cache in (FOOD_CACHE,)}
+
+def invalidate_reference_data(table=None):
+    for name, cache in REFERENCE_CACHES.items():
+        if table is None or name == table:
+            cache.invalidate()
+
+def get_reference_cache_stats():
+    return {name: cache.stats() for name, cache in REFERENCE_CACHES.items()}
+
+
+# - Seat Availability Cache -
+FLIGHT_CACHE_TTL = 30       # Seconds a cached flight row is served before it is re-read
+FLIGHT_CACHE_SIZE = 10000   # Flights kept, least recently used dropped first
+FLIGHT_CACHE_BATCH = 500    # Most flights re-read by one refresh query
+
+class FlightCache:
+    # In-process copy of flight rows (prices, schedule, seat counters) keyed by
+    # flight_id, each carrying the row's version (bumped by every write, see the
+    # flights triggers). Reads are served from memory while fresh. A stale or
+    # missing row is re-read together with every other stale row in one IN query,
+    # and a row only replaces the cached one if its version is not older.
+    def __init__(self, ttl=FLIGHT_CACHE_TTL, max_size=FLIGHT_CACHE_SIZE, batch=FLIGHT_CACHE_BATCH):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.batch = batch
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock() # One refresh query at a time; waiters reuse its rows
+        self._entries = OrderedDict() # flight_id -> (row, loaded_at)
+        self._stats = {'hits': 0, 'misses': 0, 'loads': 0, 'rows_loaded': 0, 'stale_installs': 0, 'invalidations': 0}
+
+    def get(self, flight_id):
+        # Flight row dict (a copy), or None if there is no such flight
+        return self.get_many([flight_id]).get(flight_id)
+
+    def get_many(self, flight_ids):
+        # flight_id -> row for the ids that exist, refreshing what is stale in one go
+        found, missing = self._lookup(flight_ids)
+        if missing:
+            with self._load_lock:
+                found_now, missing = self._lookup(missing, count=False) # Another thread may have loaded them
+                found.update(found_now)
+                if missing:
+                    self._load(missing)
+                    found.update(self._lookup(missing, count=False)[0])
+        return found
+
+    def peek(self, flight_id):
+        # Cached row even if stale, without touching the database
+        with self._lock:
+            entry = self._entries.get(flight_id)
+        return dict(entry[0]) if entry else None
+
+    def install(self, rows):
+        # Compare-and-set on version: never replace a row with an older one
+        now = time.monotonic()
+        with self._lock:
+            for row in rows:
+                current = self._entries.get(row['flight_id'])
+                if current and current[0]['version'] > row['version']:
+                    self._stats['stale_installs'] += 1
+                    continue
+                self._entries[row['flight_id']] = (dict(row), now)
+                self._entries.move_to_end(row['flight_id'])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, flight_id=None):
+        # Mark one flight (or all) stale; the next read refreshes it in bulk
+        with self._lock:
+            targets = [flight_id] if flight_id is not None else list(self._entries)
+            for key in targets:
+                if key in self._entries:
+                    self._entries[key] = (self._entries[key][0], None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['stale'] = sum(1 for _, loaded_at in self._entries.values() if not self._is_fresh(loaded_at))
+        return stats
+
+    def _is_fresh(self, loaded_at):
+        return loaded_at is not None and (not self.ttl or time.monotonic() - loaded_at < self.ttl)
+
+    def _lookup(self, flight_ids, count=True):
+        found, missing = {}, []
+        with self._lock:
+            for flight_id in flight_ids:
+                entry = self._entries.get(flight_id)
+                if entry and self._is_fresh(entry[1]):
+                    self._entries.move_to_end(flight_id)
+                    found[flight_id] = dict(entry[0])
+                else:
+                    missing.append(flight_id)
+            if count:
+                self._stats['hits'] += len(found)
+                self._stats['misses'] += len(missing)
+        return found, missing
+
+    def _load(self, flight_ids):
+        # Caller holds self._load_lock. Piggyback the other stale rows on this query.
+        with self._lock:
+            wanted = dict.fromkeys(flight_ids)
+            for flight_id, (_, loaded_at) in self._entries.items():
+                if len(wanted) >= max(self.batch, len(flight_ids)):
+                    break
+                if not self._is_fresh(loaded_at):
+                    wanted[flight_id] = None
+        wanted = list(wanted)
+        for start in range(0, len(wanted), self.batch):
+            chunk = wanted[start:start + self.batch]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            rows = query_all(f"SELECT * FROM flights WHERE flight_id IN ({placeholders})", tuple(chunk))
+            self.install(rows)
+            returned = {row['flight_id'] for row in rows}
+            with self._lock:
+                self._stats['loads'] += 1
+                self._stats['rows_loaded'] += len(rows)
+                for flight_id in chunk: # Deleted flights
+                    if flight_id not in returned:
+                        self._entries.pop(flight_id, None)
+
+
+FLIGHT_CACHE = FlightCache()
+
+
+# - Flight Search & Keyset Paging -
+PAGE_SIZE = 100 # Rows fetched per page by the list views
+
+# Sort orders for the paged lists: (column, direction). The last column must be unique
+# so that the values of one row identify its position (the keyset cursor).
+FLIGHT_ORDER = [("departure_time", "ASC"), ("flight_id", "ASC")]
+TICKET_ORDER = [("departure_time", "DESC"), ("booking_id", "ASC"), ("passenger_id", "ASC")]
+
+def keyset_condition(order_by, after, backward=False):
+    # Rows strictly after the cursor row in order_by (before it when backward).
+    # Written as OR-ed equality prefixes rather than a row constructor so MySQL
+    # can range-scan the matching index instead of filtering every row.
+    clauses = []
+    params = []
+    for i, (column, direction) in enumerate(order_by):
+        op = ">" if (direction == "ASC") != backward else "<"
+        parts = [f"{col} = %s" for col, _ in order_by[:i]] + [f"{column} {op} %s"]
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(after[:i + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+def order_clause(order_by, backward=False):
+    flip = {"ASC": "DESC", "DESC": "ASC"}
+    return ", ".join(f"{col} {flip[direction] if backward else direction}" for col, direction in order_by)
+
+def paged_query(query, params, order_by, after=None, backward=False, limit=PAGE_SIZE):
+    # Appends the keyset filter, ORDER BY and LIMIT to a query that already has a WHERE clause
+    params = list(params)
+    if after is not None:
+        condition, condition_params = keyset_condition(order_by, after, backward)
+        query += f" AND {condition}"
+        params.extend(condition_params)
+    query += f" ORDER BY {order_clause(order_by, backward)} LIMIT %s"
+    params.append(limit)
+    return query, tuple(params)
+
+def like_prefix(text):
+    # Prefix pattern for LIKE with wildcards in the user's text escaped, so the
+    # route index on (origin, destination, departure_time) can be range-scanned
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+def list_query(select, from_clause, scope, conditions, order_by, after=None, backward=False,
+               limit=PAGE_SIZE, changed_since=None, version_columns=()):
+    # Builds the query behind a paged list view. scope = [(sql, params)] always applied in
+    # WHERE; conditions = [(sql, params)] decide whether a row belongs in the list.
+    # Normal mode returns one keyset page. Delta mode (changed_since given) returns only rows
+    # whose version columns changed since then, flagged with still_matches so the view can
+    # patch or drop them in place.
+    scope_sql = [sql for sql, _ in scope]
+    scope_params = [p for _, sql_params in scope for p in sql_params]
+    condition_sql = [sql for sql, _ in conditions]
+    condition_params = [p for _, sql_params in conditions for p in sql_params]
+
+    if changed_since is None:
+        where = scope_sql + condition_sql
+        query = f"SELECT {select} {from_clause} WHERE {' AND '.join(where) or '1 = 1'}"
+        return paged_query(query, scope_params + condition_params, order_by, after, backward, limit)
+
+    matches = " AND ".join(condition_sql) or "1 = 1"
+    changed = " OR ".join(f"{column} >= %s" for column in version_columns)
+    where = scope_sql + [f"({changed})"]
+    query = f"SELECT {select}, ({matches}) AS still_matches {from_clause} WHERE {' AND '.join(where)}"
+    return query, tuple(condition_params + scope_params + [changed_since] * len(version_columns))
+
+FLIGHT_SEARCH_COLUMNS = """flight_id, flight_number, origin, destination, departure_time, arrival_time,
+    economy_price, business_price,
+    (economy_seats_total - economy_seats_booked) AS eco_avail,
+    (business_seats_total - business_seats_booked) AS biz_avail"""
+
+def build_flight_search_query(origin="", destination="", date_from=None, date_to=None, after=None, backward=False,
+                              limit=PAGE_SIZE, changed_since=None):
+    # Cities match by prefix (case-insensitive with the default collation). Dates are
+    # datetime.date values; date_to is inclusive. after is the (departure_time, flight_id)
+    # of the last row already shown. Returns (query, params).
+    conditions = [ # Only show flights that still fly and have available seats
+        ("status = 'Scheduled'", []),
+        ("((economy_seats_total - economy_seats_booked) > 0 OR (business_seats_total - business_seats_booked) > 0)", [])
+    ]
+    if origin:
+        conditions.append(("origin LIKE %s", [like_prefix(origin)]))
+    if destination:
+        conditions.append(("destination LIKE %s", [like_prefix(destination)]))
+    if date_from:
+        conditions.append(("departure_time >= %s", [datetime.combine(date_from, datetime.min.time())]))
+    if date_to:
+        conditions.append(("departure_time < %s", [datetime.combine(date_to + timedelta(days=1), datetime.min.time())]))
+    return list_query(FLIGHT_SEARCH_COLUMNS, "FROM flights", [], conditions, FLIGHT_ORDER, after, backward,
+                      limit, changed_since, ["updated_at"])
+
+def build_upcoming_flights_query(after=None, backward=False, limit=PAGE_SIZE, changed_since=None):
+    # A delta (changed_since) cannot report flights that merely departed since the last
+    # one; the client drops those itself against the DB time (VirtualTreeview expired)
+    select = """flight_id, flight_number, origin, destination, departure_time, arrival_time, aircraft_name,
+    (economy_seats_total - economy_seats_booked) AS eco_available,
+    (business_seats_total - business_seats_booked) AS biz_available"""
+    return list_query(select, "FROM flights", [], [("departure_time > NOW()", []), ("status = 'Scheduled'", [])], FLIGHT_ORDER,
+                      after, backward, limit, changed_since, ["updated_at"])
+
+def build_my_tickets_query(user_id, after=None, backward=False, limit=PAGE_SIZE, changed_since=None):
+    # One range scan of idx_ticket_summaries_user (see Ticket Summaries below), no joins
+    select = """booking_id, passenger_id, flight_number, origin, destination, departure_time,
+    passenger_name, age, seat_class, seat_number, food_preference, status, total_amount"""
+    return list_query(select, "FROM ticket_summaries", [("user_id = %s", [user_id])], [], TICKET_ORDER,
+                      after, backward, limit, changed_since, ["updated_at"])
+
+# Delta refreshes re-read this much before their watermark, for rows whose writes
+# committed after a refresh but were stamped before it
+DELTA_OVERLAP = timedelta(seconds=5)
+
+def fetch_db_time():
+    # Server clock, used as the watermark for delta refreshes (client clocks may drift)
+    return query_one("SELECT NOW(6) AS now")['now']
+
+def flight_row_key(row):
+    return (row['departure_time'], row['flight_id'])
+
+def ticket_row_key(row):
+    return (row['departure_time'], row['booking_id'], row['passenger_id'])
+
+
+# - Ticket Summaries -
+# ticket_summaries is the My Tickets list materialized: one row per passenger with the
+# flight, meal and booking fields it shows, indexed by (user_id, departure_time, ...).
+# Every write to a booking, its passengers or a flight's schedule re-derives the
+# affected rows in the same transaction (write-through), so the list is never stale.
+TICKET_SUMMARY_KEYS = { # What refresh_ticket_summaries can select rows by
+    'booking_id': "b.booking_id",
+    'passenger_id': "p.passenger_id",
+    'flight_id': "b.flight_id",
+    'user_id': "b.user_id"
+}
+TICKET_SUMMARY_BATCH = 500            # Ids per refresh statement
+TICKET_SUMMARY_REBUILD_BATCH = 50000  # Bookings per transaction when rebuilding
+
+def refresh_ticket_summaries(cursor, key, ids):
+    # Re-derives the summary rows of these bookings/passengers/flights/users from the
+    # base tables. Runs on the caller's cursor, inside the caller's transaction.
+    ids = list(ids)
+    for start in range(0, len(ids), TICKET_SUMMARY_BATCH):
+        chunk = tuple(ids[start:start + TICKET_SUMMARY_BATCH])
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM ticket_summaries WHERE {key} IN ({placeholders})", chunk)
+        cursor.execute(f"{TICKET_SUMMARY_FILL} WHERE {TICKET_SUMMARY_KEYS[key]} IN ({placeholders})", chunk)
+
+def rebuild_ticket_summaries(conn, first_booking_id=1, batch=TICKET_SUMMARY_REBUILD_BATCH):
+    # Re-derives every summary row from first_booking_id on, one booking id range per
+    # transaction (bulk loads write the base tables directly). Returns rows written.
+    cursor = conn.cursor()
+    written = 0
+    try:
+        cursor.execute("SELECT COALESCE(MAX(booking_id), 0) FROM bookings")
+        last = cursor.fetchone()[0]
+        for start in range(first_booking_id, last + 1, batch):
+            if not conn.in_transaction:
+                conn.start_transaction()
+            cursor.execute("DELETE FROM ticket_summaries WHERE booking_id >= %s AND booking_id < %s", (start, start + batch))
+            cursor.execute(f"{TICKET_SUMMARY_FILL} WHERE b.booking_id >= %s AND b.booking_id < %s", (start, start + batch))
+            written += cursor.rowcount
+            conn.commit()
+    finally:
+        cursor.close()
+    return written
+
+
+
+# - Analytics Rollups -
+# Admin analytics read two small rollup tables instead of scanning bookings:
+#   sales_daily  (sale_date, origin, destination, seat_class) -> passengers sold, revenue,
+#                and how many of them were later cancelled and the amount refunded
+#   meal_demand  (flight_id, food_id) -> passengers on active bookings with that meal
+# The booking engine applies every booking, cancellation and meal change to them in
+# the same transaction, so a report costs O(rollup rows), not O(bookings). Load
+# factor needs no rollup: flights already keep booked/total seat counters.
+ANALYTICS_GROUPS = { # Revenue report dimensions -> sales_daily columns
+    'route': ["origin", "destination"],
+    'day': ["sale_date"],
+    'class': ["seat_class"]
+}
+
+SALES_UPSERT_SQL = """INSERT INTO sales_daily (sale_date, origin, destination, seat_class,
+    passengers, revenue, cancelled_passengers, refunded)
+    VALUES (COALESCE(%s, CURDATE()), %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE passengers = passengers + VALUES(passengers), revenue = revenue + VALUES(revenue),
+    cancelled_passengers = cancelled_passengers + VALUES(cancelled_passengers), refunded = refunded + VALUES(refunded)"""
+MEAL_UPSERT_SQL = """INSERT INTO meal_demand (flight_id, food_id, passengers) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE passengers = passengers + VALUES(passengers)"""
+
+def record_sales(cursor, sale_date, origin, destination, by_class, cancelled=False):
+    # by_class: seat_class -> (passengers, amount). sale_date None means today
+    # (database clock); a cancellation is recorded against the day of the sale.
+    for seat_class, (count, amount) in sorted(by_class.items()): # Fixed order: no lock cycles
+        counts = (0, 0, count, amount) if cancelled else (count, amount, 0, 0)
+        cursor.execute(SALES_UPSERT_SQL, (sale_date, origin, destination, seat_class) + counts)
+
+def record_meals(cursor, flight_id, changes):
+    # changes: food_id -> change in passengers (None, no preference, is not counted)
+    for food_id, delta in sorted((k, v) for k, v in changes.items() if k is not None and v):
+        cursor.execute(MEAL_UPSERT_SQL, (flight_id, food_id, delta))
+
+def rebuild_rollups(conn):
+    # Recomputes both rollups from the base tables (after bulk loads or manual edits)
+    cursor = conn.cursor()
+    try:
+        if not conn.in_transaction:
+            conn.start_transaction()
+        for table, fill in ROLLUP_FILLS.items():
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(fill)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def date_range_conditions(column, date_from=None, date_to=None):
+    # [(sql, params)] for date_from <= column < date_to + 1 day (both optional, inclusive)
+    conditions = []
+    if date_from:
+        conditions.append((f"{column} >= %s", [date_from]))
+    if date_to:
+        conditions.append((f"{column} < %s", [date_to + timedelta(days=1)]))
+    return conditions
+
+def build_revenue_query(date_from=None, date_to=None, group_by=("route",)):
+    # Sales by the chosen dimensions (sale date range), biggest net revenue first.
+    # No dimensions gives one totals row.
+    columns = [column for group in group_by for column in ANALYTICS_GROUPS[group]]
+    conditions = date_range_conditions("sale_date", date_from, date_to)
+    select = ", ".join(columns + [
+        "SUM(passengers) AS passengers", "SUM(revenue) AS revenue",
+        "SUM(cancelled_passengers) AS cancelled_passengers", "SUM(refunded) AS refunded",
+        "SUM(revenue) - SUM(refunded) AS net_revenue"])
+    query = f"SELECT {select} FROM sales_daily WHERE {' AND '.join(sql for sql, _ in conditions) or '1 = 1'}"
+    if columns:
+        query += f" GROUP BY {', '.join(columns)} ORDER BY net_revenue DESC, {', '.join(columns)}"
+    return query, tuple(p for _, params in conditions for p in params)
+
+def build_load_factor_query(date_from=None, date_to=None, lowest=True, limit=20):
+    # Flights departing in the range by seats sold / seats offered (lowest or highest first)
+    conditions = date_range_conditions("departure_time", date_from, date_to)
+    booked = "(" + " + ".join(booked_col for booked_col, _, _ in SEAT_COLUMNS.values()) + ")"
+    total = "(" + " + ".join(total_col for _, total_col, _ in SEAT_COLUMNS.values()) + ")"
+    direction = "ASC" if lowest else "DESC"
+    query = f"""SELECT flight_id, flight_number, origin, destination, departure_time,
+        {booked} AS seats_booked, {total} AS seats_total
+        FROM flights WHERE {total} > 0{''.join(' AND ' + sql for sql, _ in conditions)}
+        ORDER BY {booked} * 1.0 / {total} {direction}, departure_time, flight_id LIMIT %s"""
+    return query, tuple(p for _, params in conditions for p in params) + (limit,)
+
+def build_seat_totals_query(date_from=None, date_to=None):
+    # Seats sold and offered over all flights departing in the range (overall load factor)
+    conditions = date_range_conditions("departure_time", date_from, date_to)
+    booked = " + ".join(f"SUM({booked_col})" for booked_col, _, _ in SEAT_COLUMNS.values())
+    total = " + ".join(f"SUM({total_col})" for _, total_col, _ in SEAT_COLUMNS.values())
+    query = f"""SELECT COUNT(*) AS flights, {booked} AS seats_booked, {total} AS seats_total
+        FROM flights WHERE {' AND '.join(sql for sql, _ in conditions) or '1 = 1'}"""
+    return query, tuple(p for _, params in conditions for p in params)
+
+def build_meal_demand_query(date_from=None, date_to=None):
+    # Meals needed on flights departing in the range, most requested first
+    conditions = date_range_conditions("f.departure_time", date_from, date_to)
+    query = f"""SELECT m.food_id, fi.item_name, fi.type, SUM(m.passengers) AS passengers
+        FROM meal_demand m
+        JOIN flights f ON m.flight_id = f.flight_id
+        JOIN food_items fi ON m.food_id = fi.food_id
+        WHERE {' AND '.join(sql for sql, _ in conditions) or '1 = 1'}
+        GROUP BY m.food_id, fi.item_name, fi.type
+        HAVING SUM(m.passengers) > 0
+        ORDER BY passengers DESC, fi.item_name"""
+    return query, tuple(p for _, params in conditions for p in params)
+
+# - Bookings Export -
+EXPORT_CHUNK_SIZE = 1000 # Rows pulled from the server and written per chunk
+BOOKING_STATUSES = ["Confirmed", "Cancelled"]
+
+def build_bookings_export_query(date_from=None, date_to=None, flight_number=None, status=None):
+    query = """
+    SELECT b.booking_id, u.username, f.flight_number, f.origin, f.destination,
+           b.booking_date, b.total_amount, b.status
+    FROM bookings b
+    JOIN users u ON b.user_id = u.user_id
+    JOIN flights f ON b.flight_id = f.flight_id
+    WHERE 1 = 1
+    """
+    params = []
+    if date_from:
+        query += " AND b.booking_date >= %s"
+        params.append(datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query += " AND b.booking_date < %s"
+        params.append(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if flight_number:
+        query += " AND f.flight_number = %s"
+        params.append(flight_number)
+    if status:
+        query += " AND b.status = %s"
+        params.append(status)
+    query += " ORDER BY b.booking_id"
+    return query, tuple(params)
+
+def stream_rows(query, params=None, chunk_size=EXPORT_CHUNK_SIZE):
+    # Yields lists of up to chunk_size row dicts. The cursor is unbuffered, so the server
+    # streams the result set and only one chunk is ever held in memory. Raises on errors.
+    conn = get_pool().acquire()
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    finished = False
+    try:
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+        finished = True
+    finally:
+        if finished:
+            try:
+                cursor.close()
+            except DB_ERRORS:
+                pass
+        else:
+            # The caller stopped early (or a fetch failed) and the rest of the result is
+            # unread. Closing the cursor or rolling back would first pull every remaining
+            # row off the wire, so the connection is marked broken and the pool closes it.
+            conn._broken = True
+        conn.close()
+
+def export_bookings(path, fmt="csv", date_from=None, date_to=None, flight_number=None, status=None,
+                    chunk_size=EXPORT_CHUNK_SIZE, progress=None, cancel_event=None):
+    # Writes matching bookings to path as CSV or JSON lines ("jsonl") in fixed-size chunks.
+    # progress(rows_written, rows_per_sec) is called after every chunk (on the calling thread).
+    # Returns {'rows', 'seconds', 'rows_per_sec', 'cancelled'}.
+    query, params = build_bookings_export_query(date_from, date_to, flight_number, status)
+    started = time.perf_counter()
+    written = 0
+    cancelled = False
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = None
+        for rows in stream_rows(query, params, chunk_size):
+            if fmt == "csv":
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(rows[0].keys()))
+                    writer.writeheader()
+                writer.writerows(rows)
+            else:
+                out.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+            written += len(rows)
+            elapsed = time.perf_counter() - started
+            if progress:
+                progress(written, written / elapsed if elapsed else 0.0)
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                break
+    elapsed = time.perf_counter() - started
+    return {'rows': written, 'seconds': elapsed, 'rows_per_sec': written / elapsed if elapsed else 0.0, 'cancelled': cancelled}
+
+
+# - Seat Maps -
+# Seats of one class on one flight are a single bitmap row in seat_maps (bit i set =
+# seat i taken, seat 0 in the lowest bit of the first byte): 63 bytes for 500 seats,
+# so the seat picker reads a whole aircraft in one small query and checking
+# availability never touches per-seat rows. The booking engine changes a map only
+# while it holds the flight row lock taken by its seat counter UPDATE, in the same
+# transaction, so maps and counters always commit together. Seats are numbered by
+# row, business cabin first; SEAT_LAYOUTS lists the letters across a row, a space
+# marking the aisle.
+SEAT_LAYOUTS = {'Business': "AC DF", 'Economy': "ABC DEF"}
+SEAT_NUMBER_RE = re.compile(r"(\d{1,3})([A-Z])")
+# Largest capacity of one cabin. Both cabins at this size need 417 rows (seat numbers
+# stop at row 999) and 125-byte maps (seat_maps.taken holds 1024 bytes on MySQL).
+MAX_CABIN_SEATS = 1000
+SEAT_MAP_UPSERT_SQL = """INSERT INTO seat_maps (flight_id, seat_class, taken) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE taken = VALUES(taken)"""
+
+class SeatMap:
+    def __init__(self, seat_class, total, taken=b"", first_row=1):
+        self.seat_class = seat_class
+        self.total = total
+        self.first_row = first_row # Row number of seat 0
+        layout = SEAT_LAYOUTS[seat_class]
+        self.letters = layout.replace(" ", "")
+        self.width = len(self.letters)
+        self.blocks = [] # (first column, columns) of each aisle-separated block of a row
+        column = 0
+        for block in layout.split(" "):
+            self.blocks.append((column, len(block)))
+            column += len(block)
+        self.bits = int.from_bytes(taken, "little")
+
+    @classmethod
+    def for_flight(cls, flight, seat_class, taken=b""):
+        # flight: a row with economy_seats_total and business_seats_total
+        first_row = 1
+        if seat_class != 'Business': # Economy rows continue after the business cabin
+            first_row += -(-flight['business_seats_total'] // len(SEAT_LAYOUTS['Business'].replace(" ", "")))
+        return cls(seat_class, flight[SEAT_COLUMNS[seat_class][1]], taken, first_row)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['seat_class'], data['total'], bytes.fromhex(data['taken']), data['first_row'])
+
+    def to_dict(self):
+        return {'seat_class': self.seat_class, 'total': self.total, 'first_row': self.first_row,
+                'taken': self.to_bytes().hex()}
+
+    def to_bytes(self):
+        return self.bits.to_bytes((max(self.total, self.bits.bit_length()) + 7) // 8, "little")
+
+    def is_taken(self, index):
+        return bool(self.bits >> index & 1)
+
+    def free_count(self):
+        return self.total - bin(self.bits & ((1 << self.total) - 1)).count("1")
+
+    def label(self, index):
+        row, column = divmod(index, self.width)
+        return f"{self.first_row + row}{self.letters[column]}"
+
+    def index_of(self, label):
+        # Seat index for a seat number such as "12C", or None if this cabin has no such seat
+        match = SEAT_NUMBER_RE.fullmatch(label.strip().upper())
+        if not match or match.group(2) not in self.letters:
+            return None
+        index = (int(match.group(1)) - self.first_row) * self.width + self.letters.index(match.group(2))
+        return index if 0 <= index < self.total and int(match.group(1)) >= self.first_row else None
+
+    def take(self, indexes):
+        for index in indexes:
+            self.bits |= 1 << index
+
+    def release(self, indexes):
+        for index in indexes:
+            self.bits &= ~(1 << index)
+
+    def first_fit(self):
+        # Lowest free seat, or None
+        free = ~self.bits & ((1 << self.total) - 1)
+        return (free & -free).bit_length() - 1 if free else None
+
+    def allocate(self, count):
+        # Takes count seats for one party, side by side where possible: a free run within
+        # one aisle block of a row, else anywhere in one row, else count consecutive seats
+        # across rows, else the first free ones. Returns their indexes, or None (nothing
+        # taken) if fewer than count are free.
+        if count > self.free_count():
+            return None
+        for blocks in (self.blocks, [(0, self.width)]):
+            for row_start in range(0, self.total, self.width):
+                for first, columns in blocks:
+                    for start in range(row_start + first, row_start + first + columns - count + 1):
+                        if self._run_is_free(start, count):
+                            return self._take_run(start, count)
+        for start in range(self.total - count + 1):
+            if self._run_is_free(start, count):
+                return self._take_run(start, count)
+        seats = []
+        for _ in range(count):
+            seats.append(self.first_fit())
+            self.take(seats[-1:])
+        return seats
+
+    def _run_is_free(self, start, count):
+        return start + count <= self.total and not self.bits & (((1 << count) - 1) << start)
+
+    def _take_run(self, start, count):
+        seats = list(range(start, start + count))
+        self.take(seats)
+        return seats
+
+
+def read_seat_map(cursor, flight, seat_class):
+    # The stored map of one class, or None if it has none yet
+    cursor.execute("SELECT taken FROM seat_maps WHERE flight_id = %s AND seat_class = %s",
+                   (flight['flight_id'], seat_class))
+    row = cursor.fetchone()
+    return SeatMap.for_flight(flight, seat_class, bytes(row['taken'])) if row else None
+
+def load_seat_map(cursor, flight, seat_class):
+    # The map of one class for changing it; the caller holds the flight row lock. A class
+    # without a map yet (booked before seat maps existed, or never booked) gets one now,
+    # and passengers already on it are given the first free seats in booking order.
+    seat_map = read_seat_map(cursor, flight, seat_class)
+    if seat_map is not None:
+        return seat_map
+    seat_map = SeatMap.for_flight(flight, seat_class)
+    cursor.execute("""SELECT p.passenger_id, p.seat_index FROM passengers p JOIN bookings b ON p.booking_id = b.booking_id
+        WHERE b.flight_id = %s AND p.seat_class = %s AND b.status <> 'Cancelled' ORDER BY p.passenger_id""",
+                   (flight['flight_id'], seat_class))
+    rows = cursor.fetchall()
+    seat_map.take(row['seat_index'] for row in rows if row['seat_index'] is not None)
+    seated = []
+    for row in rows:
+        index = seat_map.first_fit() if row['seat_index'] is None else None
+        if index is not None:
+            seat_map.take([index])
+            seated.append((index, seat_map.label(index), row['passenger_id']))
+    if seated:
+        cursor.executemany("UPDATE passengers SET seat_index = %s, seat_number = %s WHERE passenger_id = %s", seated)
+        refresh_ticket_summaries(cursor, "passenger_id", [passenger_id for _, _, passenger_id in seated])
+    return seat_map
+
+def save_seat_map(cursor, flight_id, seat_map):
+    cursor.execute(SEAT_MAP_UPSERT_SQL, (flight_id, seat_map.seat_class, seat_map.to_bytes()))
+
+def assign_seats(cursor, flight, passengers):
+    # Seats for a new booking's passengers, in their order, as (seat_index, seat_number)
+    # pairs. A passenger's 'seat' (a seat number picked on the seat map) is honoured or
+    # the booking fails; the others of each class are seated together (SeatMap.allocate).
+    seats = [None] * len(passengers)
+    for seat_class in SEAT_COLUMNS:
+        positions = [i for i, passenger in enumerate(passengers) if passenger['seat_class'] == seat_class]
+        if not positions:
+            continue
+        seat_map = load_seat_map(cursor, flight, seat_class)
+        unpicked = []
+        for i in positions:
+            label = passengers[i].get('seat')
+            if not label:
+                unpicked.append(i)
+                continue
+            index = seat_map.index_of(label)
+            if index is None:
+                raise BookingError(f"There is no {seat_class} seat {label} on this flight.")
+            if seat_map.is_taken(index):
+                raise SeatTakenError(f"Seat {seat_map.label(index)} has just been taken. Please choose another.")
+            seat_map.take([index])
+            seats[i] = (index, seat_map.label(index))
+        if unpicked:
+            indexes = seat_map.allocate(len(unpicked))
+            if indexes is None: # Counters said yes: only a map out of step with them gets here
+                raise SoldOutError(f"Sorry, not enough {seat_class} seats are left on this flight.")
+            for i, index in zip(unpicked, indexes):
+                seats[i] = (index, seat_map.label(index))
+        save_seat_map(cursor, flight['flight_id'], seat_map)
+    return seats
+
+def release_seats(cursor, booking_id, flight_id):
+    # Frees the seats of a booking's passengers in their flight's maps (the caller holds
+    # the flight row lock)
+    cursor.execute("SELECT seat_class, seat_index FROM passengers WHERE booking_id = %s AND seat_index IS NOT NULL",
+                   (booking_id,))
+    by_class = {}
+    for row in cursor.fetchall():
+        by_class.setdefault(row['seat_class'], []).append(row['seat_index'])
+    if not by_class:
+        return
+    cursor.execute("SELECT flight_id, economy_seats_total, business_seats_total FROM flights WHERE flight_id = %s",
+                   (flight_id,))
+    flight = cursor.fetchone()
+    for seat_class, indexes in by_class.items():
+        seat_map = read_seat_map(cursor, flight, seat_class)
+        if seat_map is not None:
+            seat_map.release(indexes)
+            save_seat_map(cursor, flight_id, seat_map)
+
+def fetch_seat_maps(flight_id):
+    # Both cabins of a flight (seat_class -> SeatMap) in one query, or None if there is no
+    # such flight. A cabin without a stored map shows its booked seats as the first ones,
+    # which is where load_seat_map will put those passengers.
+    rows = query_all("""SELECT f.flight_id, f.economy_seats_total, f.business_seats_total,
+        f.economy_seats_booked, f.business_seats_booked, s.seat_class, s.taken
+        FROM flights f LEFT JOIN seat_maps s ON s.flight_id = f.flight_id WHERE f.flight_id = %s""", (flight_id,))
+    if not rows:
+        return None
+    stored = {row['seat_class']: bytes(row['taken']) for row in rows if row['seat_class']}
+    seat_maps = {}
+    for seat_class, (booked_col, total_col, _) in SEAT_COLUMNS.items():
+        seat_map = SeatMap.for_flight(rows[0], seat_class, stored.get(seat_class, b""))
+        if seat_class not in stored:
+            seat_map.take(range(min(rows[0][booked_col], rows[0][total_col])))
+        seat_maps[seat_class] = seat_map
+    return seat_maps
+
+
+# - Booking Engine -
+# Per seat class: (booked counter, capacity, price) columns on the flights table
+SEAT_COLUMNS = {
+    'Economy': ('economy_seats_booked', 'economy_seats_total', 'economy_price'),
+    'Business': ('business_seats_booked', 'business_seats_total', 'business_price')
+}
+
+class BookingError(Exception):
+    pass
+
+class SoldOutError(BookingError):
+    pass
+
+class SeatTakenError(BookingError):
+    # A seat picked on the seat map was booked by someone else in the meantime
+    pass
+
+class StaleFlightError(BookingError):
+    # The flight changed since the version the customer looked at; .flight is the current row
+    def __init__(self, message, flight=None):
+        super().__init__(message)
+        self.flight = flight
+
+MAX_GROUP_SIZE = 9 # Passengers on one booking
+
+# Seat counter statements, fixed text so they run as cached prepared statements
+RESERVE_SEATS_SQL = { # Only matches while the flight is scheduled and enough seats are left
+    seat_class: f"UPDATE flights SET {booked_col} = {booked_col} + %s WHERE flight_id = %s AND {booked_col} + %s <= {total_col}"
+                " AND status = 'Scheduled'"
+    for seat_class, (booked_col, total_col, _) in SEAT_COLUMNS.items()
+}
+RESERVE_SEATS_IF_VERSION_SQL = { # Same, and only if nobody changed the flight since expected_version
+    seat_class: query + " AND version = %s" for seat_class, query in RESERVE_SEATS_SQL.items()
+}
+RELEASE_SEATS_SQL = "UPDATE flights SET " + ", ".join( # Gives back exactly the seats a booking's passengers held
+    f"{booked_col} = GREATEST(0, {booked_col} - (SELECT COUNT(*) FROM passengers WHERE booking_id = %s AND seat_class = '{seat_class}'))"
+    for seat_class, (booked_col, _, _) in SEAT_COLUMNS.items()
+) + " WHERE flight_id = %s"
+
+def book_flight(user_id, flight_id, passenger_name, age, gender, seat_class, food_id=None, expected_version=None):
+    # Single passenger booking (see book_group)
+    booking = book_group(user_id, flight_id, [{
+        'passenger_name': passenger_name, 'age': age, 'gender': gender, 'seat_class': seat_class, 'food_id': food_id
+    }], expected_version)
+    booking['price'] = booking['total_amount']
+    return booking
+
+@retrying(idempotent=False)
+def book_group(user_id, flight_id, passengers, expected_version=None):
+    # Books all passengers (dicts with passenger_name, age, gender, seat_class, food_id)
+    # on one booking, all or nothing. Seat check, seat reservation and the inserts run in
+    # one transaction on one connection: one conditional counter UPDATE per seat class
+    # (only matches while that many seats are left, so concurrent bookings can never push
+    # *_seats_booked past *_seats_total), then the booking row and a single batched
+    # passenger insert. The UPDATEs run first so the flight row lock is taken before the
+    # inserts' foreign key checks (avoids lock upgrade deadlocks between clerks).
+    # With expected_version (the flights.version the customer looked at) the first
+    # UPDATE also requires the row to be unchanged and StaleFlightError says otherwise.
+    # Every passenger gets a seat in the flight's seat maps (see assign_seats), under the
+    # same row lock and in the same transaction as the counters.
+    if not passengers:
+        raise BookingError("Add at least one passenger.")
+    if len(passengers) > MAX_GROUP_SIZE:
+        raise BookingError(f"At most {MAX_GROUP_SIZE} passengers per booking.")
+    seats = {}
+    for passenger in passengers:
+        if passenger['seat_class'] not in SEAT_COLUMNS:
+            raise BookingError(f"Unknown seat class: {passenger['seat_class']}")
+        seats[passenger['seat_class']] = seats.get(passenger['seat_class'], 0) + 1
+
+    conn = get_pool().acquire()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        conn.start_transaction()
+        check_version = expected_version is not None
+        for seat_class in SEAT_COLUMNS: # Fixed order
+            if seat_class not in seats:
+                continue
+            booked_col, total_col, _ = SEAT_COLUMNS[seat_class]
+            params = (seats[seat_class], flight_id, seats[seat_class])
+            query = RESERVE_SEATS_SQL[seat_class]
+            if check_version: # Later classes: the row is ours (locked) and our own UPDATE bumped the version
+                query, params = RESERVE_SEATS_IF_VERSION_SQL[seat_class], params + (expected_version,)
+            reserve = conn.prepare(query) # Hot path: prepared once per connection
+            reserve.execute(query, params)
+            if reserve.rowcount != 1:
+                cursor.execute(f"SELECT {total_col} - {booked_col} AS seats_left, version, status FROM flights WHERE flight_id = %s", (flight_id,))
+                flight = cursor.fetchone()
+                if not flight:
+                    raise BookingError("This flight no longer exists.")
+                if flight['status'] != 'Scheduled':
+                    raise BookingError("This flight has been cancelled.")
+                if check_version and flight['version'] != expected_version:
+                    cursor.execute("SELECT * FROM flights WHERE flight_id = %s", (flight_id,))
+                    raise StaleFlightError("This flight changed since you selected it.", cursor.fetchone())
+                if flight['seats_left'] <= 0:
+                    raise SoldOutError(f"Sorry, {seat_class} class is sold out for this flight.")
+                raise SoldOutError(f"Only {flight['seats_left']} {seat_class} seat(s) left on this flight.")
+            check_version = False
+
+        # Row is locked by our UPDATE, so these are the prices we actually charge
+        price_columns = ", ".join(f"{price_col} AS {seat_class.lower()}_price"
+                                  for seat_class, (_, _, price_col) in SEAT_COLUMNS.items())
+        cursor.execute(
+            f"""SELECT flight_id, flight_number, origin, destination, departure_time, economy_seats_total,
+            business_seats_total, {price_columns} FROM flights WHERE flight_id = %s""",
+            (flight_id,)
+        )
+        row = cursor.fetchone()
+        prices = {seat_class: row.pop(f"{seat_class.lower()}_price") for seat_class in SEAT_COLUMNS}
+        assigned = assign_seats(cursor, row, passengers)
+        flight = {key: row[key] for key in ('flight_number', 'origin', 'destination', 'departure_time')}
+        total = sum(prices[passenger['seat_class']] for passenger in passengers)
+
+        cursor.execute(
+            "INSERT INTO bookings (user_id, flight_id, total_amount) VALUES (%s, %s, %s)",
+            (user_id, flight_id, total)
+        )
+        booking_id = cursor.lastrowid
+        cursor.executemany( # Sent as one multi-row INSERT
+            """INSERT INTO passengers (booking_id, passenger_name, age, gender, seat_class, food_preference_id, price,
+            seat_index, seat_number) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            [(booking_id, p['passenger_name'], p['age'], p['gender'], p['seat_class'], p.get('food_id'), prices[p['seat_class']])
+             + seat for p, seat in zip(passengers, assigned)]
+        )
+        refresh_ticket_summaries(cursor, "booking_id", [booking_id])
+        record_sales(cursor, None, flight['origin'], flight['destination'],
+                     {seat_class: (count, prices[seat_class] * count) for seat_class, count in seats.items()})
+        meals = {}
+        for passenger in passengers:
+            meals[passenger.get('food_id')] = meals.get(passenger.get('food_id'), 0) + 1
+        record_meals(cursor, flight_id, meals)
+        conn.commit()
+    except Exception as err:
+        conn.rollback()
+        if isinstance(err, DB_ERRORS): # Sold out is routine; a database error may leave the statements unusable
+            for query in list(RESERVE_SEATS_SQL.values()) + list(RESERVE_SEATS_IF_VERSION_SQL.values()):
+                conn.discard_statement(query)
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    flight['booking_id'] = booking_id
+    flight['total_amount'] = total
+    flight['passengers'] = [dict(passenger, price=prices[passenger['seat_class']], seat_number=seat_number)
+                            for passenger, (_, seat_number) in zip(passengers, assigned)]
+    return flight
+
+@retrying(idempotent=False)
+def cancel_booking(booking_id, user_id):
+    # Cancels the whole booking and gives back exactly the seats its passengers held,
+    # per class, with one set-based UPDATE, and frees them in the seat maps. Returns the flight_id.
+    conn = get_pool().acquire()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        conn.start_transaction()
+        cursor.execute(
+            "SELECT flight_id, booking_date FROM bookings WHERE booking_id = %s AND user_id = %s AND status <> 'Cancelled' FOR UPDATE",
+            (booking_id, user_id)
+        )
+        booking = cursor.fetchone()
+        if not booking:
+            raise BookingError("Booking not found or already cancelled.")
+        flight_id = booking['flight_id']
+
+        cursor.execute("UPDATE bookings SET status = 'Cancelled' WHERE booking_id = %s", (booking_id,))
+
+        conn.prepare(RELEASE_SEATS_SQL).execute(RELEASE_SEATS_SQL, (booking_id,) * len(SEAT_COLUMNS) + (flight_id,))
+        release_seats(cursor, booking_id, flight_id)
+        refresh_ticket_summaries(cursor, "booking_id", [booking_id])
+        record_cancellation(cursor, booking_id, flight_id, booking['booking_date'])
+        conn.commit()
+    except Exception as err:
+        conn.rollback()
+        if isinstance(err, DB_ERRORS):
+            conn.discard_statement(RELEASE_SEATS_SQL)
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    return flight_id
+
+def record_cancellation(cursor, booking_id, flight_id, booking_date):
+    # Rollup side of cancelling a booking (its seats are released separately).
+    # Fares not stored (bookings older than the price column) count at the flight's price.
+    cursor.execute("SELECT * FROM flights WHERE flight_id = %s", (flight_id,))
+    flight = cursor.fetchone()
+    cursor.execute("SELECT seat_class, food_preference_id, price FROM passengers WHERE booking_id = %s", (booking_id,))
+    refunds, meals = {}, {}
+    for passenger in cursor.fetchall():
+        seat_class = passenger['seat_class']
+        price = passenger['price'] if passenger['price'] is not None else flight[SEAT_COLUMNS[seat_class][2]]
+        count, amount = refunds.get(seat_class, (0, 0))
+        refunds[seat_class] = (count + 1, amount + price)
+        meals[passenger['food_preference_id']] = meals.get(passenger['food_preference_id'], 0) - 1
+    sale_date = booking_date.date() if isinstance(booking_date, datetime) else booking_date
+    record_sales(cursor, sale_date, flight['origin'], flight['destination'], refunds, cancelled=True)
+    record_meals(cursor, flight_id, meals)
+
+# Refunds of every active booking on the flights, one sales_daily row per sale day,
+# route and class (append the flight id IN list)
+CANCEL_FLIGHTS_SALES_SQL = f"""INSERT INTO sales_daily (sale_date, origin, destination, seat_class,
+    passengers, revenue, cancelled_passengers, refunded)
+    SELECT DATE(b.booking_date), f.origin, f.destination, p.seat_class, 0, 0, COUNT(*), SUM({FARE_SQL})
+    FROM bookings b
+    JOIN flights f ON b.flight_id = f.flight_id
+    JOIN passengers p ON b.booking_id = p.booking_id
+    WHERE b.status <> 'Cancelled' AND b.flight_id IN ({{ids}})
+    GROUP BY DATE(b.booking_date), f.origin, f.destination, p.seat_class
+    ON DUPLICATE KEY UPDATE cancelled_passengers = cancelled_passengers + VALUES(cancelled_passengers),
+    refunded = refunded + VALUES(refunded)"""
+
+@retrying(idempotent=False)
+def cancel_flights(flight_ids, reason=None):
+    # Scrubs whole flights (admin): marks them cancelled with their seat counters back at
+    # zero, cancels every active booking on them, credits the refunds to sales_daily,
+    # clears their meal demand and seat maps and queues one cancellation_notices row per affected
+    # booking for notifying the customer. One transaction of set-based statements, so
+    # the round trips stay the same however many passengers were booked. The flight
+    # rows are locked first, as book_group does, so no booking can slip in meanwhile.
+    # Returns {'flights', 'bookings', 'passengers', 'refunded'}.
+    flight_ids = sorted(set(flight_ids))
+    if not flight_ids:
+        raise BookingError("Select at least one flight.")
+    ids = ", ".join(["%s"] * len(flight_ids))
+    params = tuple(flight_ids)
+
+    conn = get_pool().acquire()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        conn.start_transaction()
+        cursor.execute(f"SELECT flight_id, flight_number, status FROM flights WHERE flight_id IN ({ids}) FOR UPDATE", params)
+        flights = cursor.fetchall()
+        missing = set(flight_ids) - {flight['flight_id'] for flight in flights}
+        if missing:
+            raise BookingError(f"Flight(s) not found: {', '.join(str(flight_id) for flight_id in sorted(missing))}")
+        cancelled = [flight['flight_number'] for flight in flights if flight['status'] == 'Cancelled']
+        if cancelled:
+            raise BookingError(f"Already cancelled: {', '.join(cancelled)}")
+
+        cursor.execute(f"""SELECT COUNT(DISTINCT b.booking_id) AS bookings, COUNT(p.passenger_id) AS passengers,
+            SUM({FARE_SQL}) AS refunded
+            FROM bookings b
+            JOIN flights f ON b.flight_id = f.flight_id
+            JOIN passengers p ON b.booking_id = p.booking_id
+            WHERE b.status <> 'Cancelled' AND b.flight_id IN ({ids})""", params)
+        result = cursor.fetchone()
+        cursor.execute(f"""INSERT INTO cancellation_notices (booking_id, user_id, flight_id, reason)
+            SELECT booking_id, user_id, flight_id, %s FROM bookings
+            WHERE status <> 'Cancelled' AND flight_id IN ({ids})""", (reason,) + params)
+        cursor.execute(CANCEL_FLIGHTS_SALES_SQL.format(ids=ids), params)
+        cursor.execute(f"DELETE FROM meal_demand WHERE flight_id IN ({ids})", params)
+        cursor.execute(f"DELETE FROM seat_maps WHERE flight_id IN ({ids})", params) # Passengers keep their seat numbers
+        cursor.execute(f"UPDATE bookings SET status = 'Cancelled' WHERE status <> 'Cancelled' AND flight_id IN ({ids})", params)
+        counters = ", ".join(f"{booked_col} = 0" for booked_col, _, _ in SEAT_COLUMNS.values())
+        cursor.execute(f"UPDATE flights SET status = 'Cancelled', {counters} WHERE flight_id IN ({ids})", params)
+        refresh_ticket_summaries(cursor, "flight_id", flight_ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    result['flights'] = len(flight_ids)
+    result['refunded'] = result['refunded'] or 0
+    return result
+
+@retrying(idempotent=False)
+def set_food_preference(passenger_id, food_id=None):
+    # Changes one passenger's meal, their ticket summary row and the meal rollup together
+    conn = get_pool().acquire()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        conn.start_transaction()
+        cursor.execute("""SELECT p.food_preference_id, b.flight_id, b.status
+            FROM passengers p JOIN bookings b ON p.booking_id = b.booking_id
+            WHERE p.passenger_id = %s FOR UPDATE""", (passenger_id,))
+        current = cursor.fetchone()
+        if not current:
+            raise BookingError("Passenger not found.")
+        cursor.execute("UPDATE passengers SET food_preference_id = %s WHERE passenger_id = %s", (food_id, passenger_id))
+        refresh_ticket_summaries(cursor, "passenger_id", [passenger_id])
+        if current['status'] != 'Cancelled' and current['food_preference_id'] != food_id:
+            record_meals(cursor, current['flight_id'], {current['food_preference_id']: -1, food_id: 1})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,288 @@
+# Query instrumentation for the data layer: every statement run through a pooled
+# connection is timed and counted under its normalized SQL (literals and IN lists
+# folded, so "flight_id = 7" and "flight_id = 9" are one entry), with a latency
+# histogram, rows returned/affected, errors, and the time spent waiting for a
+# connection. Statements slower than the threshold go to a rotating log file.
+# Recording is a dict lookup and a few additions under one lock, cheap enough to
+# leave on (QUERY_STATS_CONFIG in database.py turns it off).
+#
+#   python instrumentation.py --url http://127.0.0.1:8080 --phone 0000000000 --password ...
+#       top queries of a running API server (admin login), by total time
+#
+# In the GUI: Admin Panel -> "Query Stats (Console)".
+
+import argparse
+import bisect
+import logging
+import logging.handlers
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is everything slower)
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+ORDER_FIELDS = ["total_ms", "count", "mean_ms", "max_ms", "p99_ms", "rows", "errors"]
+
+_NORMALIZE_RULES = [
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'"), "?"),                    # String literals
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b"), "?"),             # Numeric literals
+    (re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)"), "(...)"), # IN (%s, %s, ...) of any length
+    (re.compile(r"\s+"), " "),
+]
+
+@lru_cache(maxsize=4096)
+def normalize_sql(query):
+    for pattern, replacement in _NORMALIZE_RULES:
+        query = pattern.sub(replacement, query)
+    return query.strip()
+
+
+def histogram_percentile(counts, fraction):
+    # Upper bound (ms) of the bucket holding the given fraction of samples
+    total = sum(counts)
+    if not total:
+        return 0.0
+    target = fraction * total
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= target:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else float("inf")
+    return float("inf")
+
+
+class QueryStats:
+    def __init__(self, slow_query_ms=200, slow_log_path=None, slow_log_max_bytes=5 * 1024 * 1024, slow_log_backups=3):
+        self.slow_query_ms = slow_query_ms     # None/0 disables the slow log
+        self.slow_log_path = slow_log_path
+        self.slow_log_max_bytes = slow_log_max_bytes
+        self.slow_log_backups = slow_log_backups
+
+        self._lock = threading.Lock()
+        self._queries = {} # normalized SQL -> [count, total_s, max_s, rows, errors, bucket counts]
+        self._acquire = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS_MS) + 1)] # count, total_s, max_s, buckets
+        self._started = time.time()
+        self._slow_logger = None
+
+    def record(self, query, seconds, rows=0, error=False):
+        key = normalize_sql(query)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = [0, 0.0, 0.0, 0, 0, [0] * (len(LATENCY_BUCKETS_MS) + 1)]
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+            entry[3] += max(rows, 0)
+            if error:
+                entry[4] += 1
+            entry[5][bucket] += 1
+        if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+            self._log_slow(key, seconds, rows, error)
+
+    def record_acquire(self, seconds):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            self._acquire[0] += 1
+            self._acquire[1] += seconds
+            if seconds > self._acquire[2]:
+                self._acquire[2] = seconds
+            self._acquire[3][bucket] += 1
+
+    def top(self, n=20, order_by="total_ms"):
+        # Per-query summaries, largest order_by first
+        if order_by not in ORDER_FIELDS:
+            raise ValueError(f"order_by must be one of {', '.join(ORDER_FIELDS)}")
+        with self._lock:
+            entries = [(key, entry[:5] + [list(entry[5])]) for key, entry in self._queries.items()]
+        rows = [self._summary(key, *entry) for key, entry in entries]
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:n] if n else rows
+
+    def acquire_stats(self):
+        with self._lock:
+            count, total, longest, buckets = self._acquire[0], self._acquire[1], self._acquire[2], list(self._acquire[3])
+        return {
+            'count': count,
+            'total_ms': round(total * 1000, 3),
+            'mean_ms': round(total * 1000 / count, 3) if count else 0.0,
+            'max_ms': round(longest * 1000, 3),
+            'p99_ms': histogram_percentile(buckets, 0.99)
+        }
+
+    def snapshot(self, n=20, order_by="total_ms"):
+        with self._lock:
+            statements = len(self._queries)
+            executions = sum(entry[0] for entry in self._queries.values())
+        return {
+            'since': self._started,
+            'statements': statements,
+            'executions': executions,
+            'acquire': self.acquire_stats(),
+            'top': self.top(n, order_by)
+        }
+
+    def reset(self):
+        with self._lock:
+            self._queries = {}
+            self._acquire = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS_MS) + 1)]
+            self._started = time.time()
+
+    def _summary(self, key, count, total, longest, rows, errors, buckets):
+        return {
+            'query': key,
+            'count': count,
+            'total_ms': round(total * 1000, 3),
+            'mean_ms': round(total * 1000 / count, 3) if count else 0.0,
+            'max_ms': round(longest * 1000, 3),
+            'p50_ms': histogram_percentile(buckets, 0.50),
+            'p95_ms': histogram_percentile(buckets, 0.95),
+            'p99_ms': histogram_percentile(buckets, 0.99),
+            'rows': rows,
+            'errors': errors,
+            'histogram': buckets
+        }
+
+    def _log_slow(self, key, seconds, rows, error):
+        logger = self._slow_logger
+        if logger is None:
+            logger = self._slow_logger = self._open_slow_log()
+        if logger is not None:
+            logger.warning("%.1f ms rows=%d%s %s", seconds * 1000, rows, " ERROR" if error else "", key)
+
+    def _open_slow_log(self):
+        # Rotating file, opened on the first slow query; stderr if no path is set
+        logger = logging.getLogger("airport.slow_queries")
+        logger.propagate = False
+        if not logger.handlers:
+            if self.slow_log_path:
+                handler = logging.handlers.RotatingFileHandler(
+                    self.slow_log_path, maxBytes=self.slow_log_max_bytes, backupCount=self.slow_log_backups,
+                    encoding="utf-8", delay=True)
+            else:
+                handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(asctime)s slow query %(message)s"))
+            logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        return logger
+
+
+class InstrumentedCursor:
+    # Wraps a backend cursor and records each statement once its result is used up
+    # (all rows fetched, the cursor closed or re-executed); time spent fetching rows
+    # counts towards the statement, so unbuffered reads are measured end to end.
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._pending = None # [query, seconds so far, rows so far]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def execute(self, query, params=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(query, params)
+        except Exception:
+            self._stats.record(query, time.perf_counter() - started, 0, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        if self._cursor.description is None: # No result set: done
+            self._stats.record(query, elapsed, self._cursor.rowcount)
+        else:
+            self._pending = [query, elapsed, 0]
+        return result
+
+    def executemany(self, query, seq_params):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(query, seq_params)
+        except Exception:
+            self._stats.record(query, time.perf_counter() - started, 0, error=True)
+            raise
+        self._stats.record(query, time.perf_counter() - started, self._cursor.rowcount)
+        return result
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1, done=row is None)
+        return row
+
+    def fetchmany(self, size=1):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(started, len(rows), done=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows), done=True)
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def _fetched(self, started, rows, done):
+        pending = self._pending
+        if pending is not None:
+            pending[1] += time.perf_counter() - started
+            pending[2] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        if self._pending is not None:
+            query, seconds, rows = self._pending
+            self._pending = None
+            self._stats.record(query, seconds, rows)
+
+
+def print_report(snapshot):
+    try:
+        import tabulate
+    except ImportError:
+        tabulate = None
+    print(f"\n--- Query Stats: {snapshot['statements']} statements, {snapshot['executions']} executions since "
+          f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['since']))} ---")
+    acquire = snapshot['acquire']
+    print(f"Connection acquire: {acquire['count']} x, mean {acquire['mean_ms']:.3f} ms, "
+          f"p99 <= {acquire['p99_ms']} ms, max {acquire['max_ms']:.3f} ms")
+    columns = ["total_ms", "count", "mean_ms", "p95_ms", "p99_ms", "max_ms", "rows", "errors", "query"]
+    rows = [[row[column] for column in columns[:-1]] + [row['query'][:120]] for row in snapshot['top']]
+    if tabulate is not None:
+        print(tabulate.tabulate(rows, headers=columns, tablefmt="grid"))
+    else:
+        for row in rows:
+            print("  ".join(str(value) for value in row))
+
+
+if __name__ == "__main__":
+    from api import ApiClient
+
+    parser = argparse.ArgumentParser(description="Show the top queries of a running API server.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="API server address")
+    parser.add_argument("--phone", required=True, help="admin phone number")
+    parser.add_argument("--password", required=True, help="admin password")
+    parser.add_argument("--top", type=int, default=20, help="number of queries to show")
+    parser.add_argument("--order-by", choices=ORDER_FIELDS, default="total_ms")
+    args = parser.parse_args()
+
+    client = ApiClient(args.url)
+    session = client.login(args.phone, args.password)
+    try:
+        print_report(client.query_stats(session, args.top, args.order_by))
+    finally:
+        client.logout(session)
@@ -0,0 +1,316 @@
+# Connecting-flight itinerary search. RouteGraph keeps every scheduled flight in memory
+# as a time-expanded graph: each flight is an edge from a departure event at its origin
+# to an arrival event at its destination, and each airport keeps its departures sorted
+# by time, so "flights leaving X between t1 and t2" (the waiting edges) is a bisect.
+# A search is a best-first walk over those edges from the origin's departures, so the
+# first k complete itineraries it reaches are the k best (by duration, price or arrival,
+# all of which only grow as legs are added), and it never tries an airport from which
+# the destination is out of reach within the remaining legs.
+#
+# The graph is loaded once and then kept current incrementally: every write to a flight
+# bumps its updated_at and version (see the flights triggers), so a refresh re-reads
+# only the rows changed since the last one and installs those that are not older than
+# what it has. Seat counts, times, prices and cancellations all arrive that way. Deleted
+# flights are only noticed by the periodic full reload (ROUTE_GRAPH_REBUILD).
+#
+#   python itineraries.py Kolkata Frankfurt --date 2024-09-02 --seats 2
+#   python itineraries.py Delhi "New York" --engine sqlite --sqlite-path airport.db --order-by price
+#
+# In the GUI: Book a Flight -> "Find Connections"; on the API server: GET /itineraries.
+
+import argparse
+import heapq
+import itertools
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+import database
+from database import query_all, stream_rows, fetch_db_time, SEAT_COLUMNS, DELTA_OVERLAP
+
+MAX_LEGS = 3                 # Flights per itinerary (two connections)
+MIN_CONNECTION_MINUTES = 60  # Default minimum time between landing and the next departure
+MAX_LAYOVER_HOURS = 24       # Longest wait at a connecting airport
+DEFAULT_ITINERARIES = 5      # k when the caller does not say
+MAX_ITINERARIES = 50         # Largest k a caller may ask for
+ITINERARY_ORDERS = ["duration", "price", "arrival"]
+ROUTE_GRAPH_REFRESH = 5      # Seconds between incremental refreshes (searches in between use the graph as is)
+ROUTE_GRAPH_REBUILD = 600    # Seconds between full reloads
+
+LEG_COLUMNS = ", ".join(
+    ["flight_id", "flight_number", "origin", "destination", "departure_time", "arrival_time", "status", "version"]
+    + [f"{price_col} AS {seat_class.lower()}_price" for seat_class, (_, _, price_col) in SEAT_COLUMNS.items()]
+    + [f"{total_col} - {booked_col} AS {seat_class.lower()}_left"
+       for seat_class, (booked_col, total_col, _) in SEAT_COLUMNS.items()]
+)
+
+Leg = namedtuple("Leg", ["flight_id", "flight_number", "origin", "destination", "departure_time", "arrival_time",
+                         "version", "prices", "seats_left"]) # prices / seats_left: seat_class -> value
+
+
+def airport_key(name):
+    return name.strip().casefold()
+
+
+class RouteGraph:
+    def __init__(self, refresh_interval=ROUTE_GRAPH_REFRESH, rebuild_interval=ROUTE_GRAPH_REBUILD):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+
+        self._lock = threading.Lock()          # Guards the graph; held by searches and while applying changes
+        self._refresh_lock = threading.Lock()  # One refresh at a time; other callers search the current graph
+        self._legs = {}           # flight_id -> Leg
+        self._departures = {}     # airport key -> sorted [(departure_time, flight_id)]
+        self._inbound = {}        # airport key -> Counter(origin airport key -> flights), for reachability
+        self._names = {}          # airport key -> display name
+        self._watermark = None    # Database time of the last refresh
+        self._refreshed_at = None # time.monotonic() of the last refresh
+        self._loaded_at = None    # time.monotonic() of the last full load
+        self._stale = False
+        self._stats = {'full_loads': 0, 'refreshes': 0, 'rows_applied': 0, 'searches': 0,
+                       'search_time': 0.0, 'max_search_time': 0.0}
+
+    # - Keeping it current -
+    def refresh(self, force=False):
+        # Full load when never loaded or due, else an incremental refresh if the last one
+        # is older than refresh_interval (or mark_stale() was called). Returns at once if
+        # another thread is already refreshing a loaded graph.
+        now = time.monotonic()
+        if self._loaded_at is not None and not (force or self._stale or now - self._refreshed_at >= self.refresh_interval):
+            return
+        if not self._refresh_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._loaded_at is None or force or now - self._loaded_at >= self.rebuild_interval:
+                self._load()
+            elif self._stale or now - self._refreshed_at >= self.refresh_interval:
+                self._refresh_changed()
+        finally:
+            self._refresh_lock.release()
+
+    def mark_stale(self):
+        # Flights changed (a booking, a cancellation, an import): refresh before the next search
+        self._stale = True
+
+    def _load(self):
+        watermark = fetch_db_time()
+        self._stale = False
+        legs, departures, inbound, names = {}, {}, {}, {}
+        rows = 0
+        for chunk in stream_rows(f"SELECT {LEG_COLUMNS} FROM flights WHERE status = 'Scheduled'"):
+            for row in chunk:
+                leg = self._leg(row, names)
+                legs[leg.flight_id] = leg
+                departures.setdefault(airport_key(leg.origin), []).append((leg.departure_time, leg.flight_id))
+                inbound.setdefault(airport_key(leg.destination), Counter())[airport_key(leg.origin)] += 1
+            rows += len(chunk)
+        for times in departures.values():
+            times.sort()
+        with self._lock:
+            self._legs, self._departures, self._inbound, self._names = legs, departures, inbound, names
+            self._watermark = watermark
+            self._loaded_at = self._refreshed_at = time.monotonic()
+            self._stats['full_loads'] += 1
+            self._stats['rows_applied'] += rows
+
+    def _refresh_changed(self):
+        watermark = fetch_db_time()
+        self._stale = False
+        rows = query_all(f"SELECT {LEG_COLUMNS} FROM flights WHERE updated_at >= %s",
+                         (self._watermark - DELTA_OVERLAP,))
+        with self._lock:
+            for row in rows:
+                current = self._legs.get(row['flight_id'])
+                if current is not None and current.version > row['version']:
+                    continue # We already have a newer copy
+                if current is not None:
+                    self._remove(current)
+                if row['status'] == 'Scheduled':
+                    self._add(self._leg(row, self._names))
+            self._watermark = watermark
+            self._refreshed_at = time.monotonic()
+            self._stats['refreshes'] += 1
+            self._stats['rows_applied'] += len(rows)
+
+    def _leg(self, row, names):
+        names.setdefault(airport_key(row['origin']), row['origin'])
+        names.setdefault(airport_key(row['destination']), row['destination'])
+        return Leg(row['flight_id'], row['flight_number'], row['origin'], row['destination'], row['departure_time'],
+                   row['arrival_time'], row['version'],
+                   {seat_class: row[f"{seat_class.lower()}_price"] for seat_class in SEAT_COLUMNS},
+                   {seat_class: row[f"{seat_class.lower()}_left"] for seat_class in SEAT_COLUMNS})
+
+    def _add(self, leg):
+        # Caller holds self._lock
+        self._legs[leg.flight_id] = leg
+        insort(self._departures.setdefault(airport_key(leg.origin), []), (leg.departure_time, leg.flight_id))
+        self._inbound.setdefault(airport_key(leg.destination), Counter())[airport_key(leg.origin)] += 1
+
+    def _remove(self, leg):
+        # Caller holds self._lock
+        del self._legs[leg.flight_id]
+        times = self._departures[airport_key(leg.origin)]
+        del times[bisect_left(times, (leg.departure_time, leg.flight_id))]
+        inbound = self._inbound[airport_key(leg.destination)]
+        inbound[airport_key(leg.origin)] -= 1
+        if not inbound[airport_key(leg.origin)]:
+            del inbound[airport_key(leg.origin)]
+
+    # - Searching -
+    def search(self, origin, destination, date_from=None, date_to=None, seats=1, seat_class="Economy",
+               k=DEFAULT_ITINERARIES, max_legs=MAX_LEGS, min_connection=MIN_CONNECTION_MINUTES,
+               max_layover=MAX_LAYOVER_HOURS, order_by="duration"):
+        # Up to k itineraries (best first) from an airport whose name starts with origin to
+        # one starting with destination, first flight departing between date_from and
+        # date_to (dates, inclusive), with at least min_connection minutes and at most
+        # max_layover hours between flights and seats free seats in seat_class on every leg.
+        started = time.perf_counter()
+        min_gap, max_gap = timedelta(minutes=min_connection), timedelta(hours=max_layover)
+        start = datetime.combine(date_from, datetime.min.time()) if date_from else None
+        end = datetime.combine(date_to + timedelta(days=1), datetime.min.time()) if date_to else None
+        cost = {'duration': lambda path: (path[-1].arrival_time - path[0].departure_time, self._price(path, seat_class)),
+                'price': lambda path: (self._price(path, seat_class), path[-1].arrival_time - path[0].departure_time),
+                'arrival': lambda path: (path[-1].arrival_time, self._price(path, seat_class))}[order_by]
+        results = []
+        with self._lock:
+            origins = self._match(origin)
+            targets = set(self._match(destination))
+            legs_to_go = self._legs_to_targets(targets, max_legs)
+            heap, tiebreak = [], itertools.count()
+
+            def push(path):
+                heapq.heappush(heap, (cost(path), next(tiebreak), path))
+
+            def usable(leg, legs_left): # legs_left: flights still allowed after this one
+                return (leg.seats_left[seat_class] >= seats
+                        and legs_to_go.get(airport_key(leg.destination), max_legs) <= legs_left)
+
+            for airport in origins:
+                if airport in targets:
+                    continue
+                times = self._departures.get(airport, [])
+                first = bisect_left(times, (start,)) if start else 0
+                last = bisect_left(times, (end,)) if end else len(times)
+                for _, flight_id in times[first:last]:
+                    leg = self._legs[flight_id]
+                    if usable(leg, max_legs - 1):
+                        push((leg,))
+
+            expanded = Counter() # flight_id -> partial itineraries extended from it (at most k are needed)
+            while heap and len(results) < k:
+                _, _, path = heapq.heappop(heap)
+                last_leg = path[-1]
+                here = airport_key(last_leg.destination)
+                if here in targets:
+                    results.append(path)
+                    continue
+                if len(path) >= max_legs or expanded[last_leg.flight_id] >= k:
+                    continue
+                expanded[last_leg.flight_id] += 1
+                visited = {airport_key(leg.origin) for leg in path}
+                times = self._departures.get(here, [])
+                first = bisect_left(times, (last_leg.arrival_time + min_gap,))
+                last = bisect_right(times, (last_leg.arrival_time + max_gap, float("inf")))
+                for _, flight_id in times[first:last]:
+                    leg = self._legs[flight_id]
+                    if airport_key(leg.destination) not in visited and usable(leg, max_legs - len(path) - 1):
+                        push(path + (leg,))
+
+        took = time.perf_counter() - started
+        with self._lock:
+            self._stats['searches'] += 1
+            self._stats['search_time'] += took
+            self._stats['max_search_time'] = max(self._stats['max_search_time'], took)
+        return [self._itinerary(path, seats, seat_class) for path in results]
+
+    def _match(self, text):
+        # Airport keys starting with text (the same prefix match as the flight search)
+        prefix = airport_key(text)
+        return [key for key in self._names if key.startswith(prefix)] if prefix else []
+
+    def _legs_to_targets(self, targets, max_legs):
+        # airport key -> fewest flights from it to a target, for airports within max_legs - 1
+        legs_to_go = dict.fromkeys(targets, 0)
+        frontier = list(targets)
+        for hops in range(1, max_legs):
+            reached = []
+            for airport in frontier:
+                for origin in self._inbound.get(airport, ()):
+                    if origin not in legs_to_go:
+                        legs_to_go[origin] = hops
+                        reached.append(origin)
+            frontier = reached
+        return legs_to_go
+
+    def _price(self, path, seat_class):
+        return sum(leg.prices[seat_class] for leg in path)
+
+    def _itinerary(self, path, seats, seat_class):
+        price = self._price(path, seat_class)
+        return {
+            'origin': path[0].origin, 'destination': path[-1].destination,
+            'departure_time': path[0].departure_time, 'arrival_time': path[-1].arrival_time,
+            'duration_minutes': int((path[-1].arrival_time - path[0].departure_time).total_seconds() // 60),
+            'stops': len(path) - 1,
+            'layover_minutes': [int((after.departure_time - before.arrival_time).total_seconds() // 60)
+                                for before, after in zip(path, path[1:])],
+            'seat_class': seat_class, 'price': price, 'total_price': price * seats,
+            'seats_left': min(leg.seats_left[seat_class] for leg in path),
+            'legs': [{'flight_id': leg.flight_id, 'flight_number': leg.flight_number, 'origin': leg.origin,
+                      'destination': leg.destination, 'departure_time': leg.departure_time,
+                      'arrival_time': leg.arrival_time, 'price': leg.prices[seat_class],
+                      'seats_left': leg.seats_left[seat_class]} for leg in path]
+        }
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['flights'] = len(self._legs)
+            stats['airports'] = len(self._names)
+        stats['avg_search_time'] = stats['search_time'] / stats['searches'] if stats['searches'] else 0.0
+        return stats
+
+
+ROUTE_GRAPH = RouteGraph()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find connecting-flight itineraries.")
+    parser.add_argument("origin")
+    parser.add_argument("destination")
+    parser.add_argument("--date", help="First flight departs on this day (YYYY-MM-DD)")
+    parser.add_argument("--seats", type=int, default=1)
+    parser.add_argument("--seat-class", choices=list(SEAT_COLUMNS), default="Economy")
+    parser.add_argument("-k", type=int, default=DEFAULT_ITINERARIES, help="Itineraries to list")
+    parser.add_argument("--max-legs", type=int, default=MAX_LEGS)
+    parser.add_argument("--min-connection", type=int, default=MIN_CONNECTION_MINUTES, help="Minutes")
+    parser.add_argument("--order-by", choices=ITINERARY_ORDERS, default="duration")
+    parser.add_argument("--engine", choices=["mysql", "sqlite"], help="storage engine (default: database.DB_ENGINE)")
+    parser.add_argument("--sqlite-path", help="SQLite database file")
+    args = parser.parse_args()
+
+    if args.engine:
+        database.DB_ENGINE = args.engine
+    if args.sqlite_path:
+        database.SQLITE_PATH = args.sqlite_path
+
+    started = time.perf_counter()
+    ROUTE_GRAPH.refresh()
+    loaded = time.perf_counter()
+    day = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else None
+    itineraries = ROUTE_GRAPH.search(args.origin, args.destination, day, day, args.seats, args.seat_class, args.k,
+                                     args.max_legs, args.min_connection, order_by=args.order_by)
+    searched = time.perf_counter()
+    for itinerary in itineraries:
+        route = " -> ".join([itinerary['origin']] + [leg['destination'] for leg in itinerary['legs']])
+        flights = ", ".join(leg['flight_number'] for leg in itinerary['legs'])
+        print(f"{itinerary['departure_time']:%Y-%m-%d %H:%M} -> {itinerary['arrival_time']:%Y-%m-%d %H:%M}"
+              f"  {itinerary['duration_minutes'] // 60}h{itinerary['duration_minutes'] % 60:02d}"
+              f"  INR {itinerary['total_price']:.2f}  {route}  ({flights})")
+    if not itineraries:
+        print("No itineraries found.")
+    stats = ROUTE_GRAPH.stats()
+    print(f"Graph: {stats['flights']} flights, {stats['airports']} airports, loaded in {(loaded - started) * 1000:.0f} ms; "
+          f"search took {(searched - loaded) * 1000:.2f} ms")
@@ -1,74 +1,144 @@
+import time
+STARTUP_T0 = time.perf_counter() # Before the heavy imports, for --startup-time
+
 import tkinter as tk
-from tkinter import ttk, messagebox
-import mysql.connector
-import tabulate
+from tkinter import ttk, messagebox, filedialog
+import argparse
+import json
+import os
+import sys
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import database
+from database import (stream_rows, export_bookings, build_bookings_export_query,
+                      flight_row_key, ticket_row_key, BookingError, SoldOutError, SeatTakenError, StaleFlightError,
+                      DB_ERRORS, SeatMap, SEAT_LAYOUTS, BOOKING_STATUSES, EXPORT_CHUNK_SIZE, PAGE_SIZE, FLIGHT_ORDER, TICKET_ORDER, MAX_GROUP_SIZE,
+                      ANALYTICS_GROUPS, DELTA_OVERLAP)
+from service import AirportService, ServiceError
+# Optional modules are imported where they are used, off the startup path:
+# api (asyncio, http.client) only as an API client, tabulate only by the admin console,
+# schedule_import only when an admin imports a flight schedule
 
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',
-    'database': 'airport_management'
-}
 
+# Address of a running API server (python api.py), e.g. http://127.0.0.1:8080, to use
+# this terminal as a client of it. Unset: the service layer runs inside this process.
+API_URL = os.environ.get('AIRPORT_API_URL')
 
-CURRENT_USER = None
 
+# Work queued for the Tk main thread (drained by DBWorker). Tk is not thread safe,
+# so anything that touches widgets from a worker thread must go through here.
+_ui_queue = queue.Queue()
 
-def get_db_connection():
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as err:
-        messagebox.showerror("Database Error", f"Error connecting to database: {err}")
-        return None
+def call_on_ui_thread(func, *args):
+    if threading.current_thread() is threading.main_thread():
+        func(*args)
+    else:
+        _ui_queue.put((func, args))
+
+def show_db_error(title, message):
+    call_on_ui_thread(messagebox.showerror, title, message)
+
+database.DB_ERROR_HANDLER = show_db_error
+
+def describe_error(err):
+    # Message for a failed service call: the service's own wording for expected
+    # failures (bad input, sold out, not logged in), a generic one otherwise
+    if isinstance(err, (ServiceError, BookingError)):
+        return str(err)
+    if isinstance(err, DB_ERRORS):
+        return f"Database error: {err}"
+    return f"An unexpected error occurred: {err}"
+
+
+# - Background DB Worker -
+class DBWorker:
+    # Runs queries on a thread pool so the Tk main loop never blocks on the database.
+    # Results come back on the main thread through an after() poll of _ui_queue.
+    # Jobs belong to an owner (a page): cancel(owner) drops everything still pending
+    # for it, and for a given (owner, key) only the newest job's result is delivered.
+    # Writes are submitted with keep=True so their outcome is still reported.
+    def __init__(self, root, max_workers=4, poll_ms=30):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self._generation = {}  # owner -> bumped on cancel(owner)
+        self._latest = {}      # (owner, key) -> newest job id
+        self._pending = {}     # owner -> {job id: (loading text, future, keep)}
+        self._next_job_id = 0
+        self.on_busy_change = None # Called with the owner whenever its pending jobs change
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, owner, func, *args, on_done=None, on_error=None, key=None, loading="Loading...", keep=False):
+        self._next_job_id += 1
+        job_id = self._next_job_id
+        generation = None if keep else self._generation.get(owner, 0)
+        self._latest[(owner, key)] = job_id
+
+        future = self.executor.submit(func, *args)
+        self._pending.setdefault(owner, {})[job_id] = (loading, future, keep)
+        future.add_done_callback(
+            lambda fut: _ui_queue.put((self._deliver, (owner, key, job_id, generation, fut, on_done, on_error)))
+        )
+        self._busy_changed(owner)
+        return future
+
+    def cancel(self, owner):
+        self._generation[owner] = self._generation.get(owner, 0) + 1
+        jobs = self._pending.get(owner, {})
+        for job_id, (_, future, keep) in list(jobs.items()):
+            if not keep:
+                future.cancel() # Only stops jobs that have not started yet
+                del jobs[job_id]
+        self._busy_changed(owner)
+
+    def is_busy(self, owner):
+        return bool(self._pending.get(owner))
+
+    def loading_text(self, owner):
+        jobs = self._pending.get(owner)
+        if not jobs:
+            return ""
+        return jobs[max(jobs)][0]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _deliver(self, owner, key, job_id, generation, future, on_done, on_error):
+        if self._pending.get(owner, {}).pop(job_id, None) is not None:
+            self._busy_changed(owner)
+        stale = (generation is not None and self._generation.get(owner, 0) != generation) \
+            or self._latest.get((owner, key)) != job_id
+        if stale or future.cancelled():
+            return
+        del self._latest[(owner, key)]
 
-def fetch_all(query, params=None):
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(query, params or ())
-        results = cursor.fetchall()
-        return results
-    except mysql.connector.Error as err:
-        messagebox.showerror("Query Error", f"Error fetching data: {err}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
-
-def fetch_one(query, params=None):
-    conn = get_db_connection()
-    if not conn: return None
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(query, params or ())
-        result = cursor.fetchone()
-        return result
-    except mysql.connector.Error as err:
-        messagebox.showerror("Query Error", f"Error fetching data: {err}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
-
-def execute_query(query, params=None):
-    conn = get_db_connection()
-    if not conn: return False, None
-    cursor = conn.cursor()
-    try:
-        cursor.execute(query, params or ())
-        conn.commit()
-        return True, cursor.lastrowid # Return True and last inserted ID if applicable
-    except mysql.connector.Error as err:
-        conn.rollback()
-        messagebox.showerror("Query Error", f"Error executing query: {err}")
-        return False, None
-    finally:
-        cursor.close()
-        conn.close()
+        err = future.exception()
+        if err is not None:
+            if on_error:
+                on_error(err)
+            else:
+                messagebox.showerror("Error", f"An unexpected error occurred: {err}")
+        elif on_done:
+            on_done(future.result())
+
+    def _busy_changed(self, owner):
+        if self.on_busy_change:
+            self.on_busy_change(owner)
+
+    def _poll(self):
+        while True:
+            try:
+                func, args = _ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+        self.root.after(self.poll_ms, self._poll)
 
 # - Main Application Class -
 class AirportApp(tk.Tk):
@@ -81,44 +151,345 @@ class AirportApp(tk.Tk):
         style = ttk.Style(self)
         style.theme_use("classic") # 'clam', 'alt', 'default', 'classic'
 
+        # Status bar (shows the loading state of the current page)
+        self.status_var = tk.StringVar()
+        tk.Label(self, textvariable=self.status_var, anchor="w", font=("Arial", 10), relief="sunken").pack(side="bottom", fill="x")
+
         # Container for frames
         self.container = tk.Frame(self)
         self.container.pack(side="top", fill="both", expand=True)
         self.container.grid_rowconfigure(0, weight=1)
         self.container.grid_columnconfigure(0, weight=1)
 
-        self.frames = {}
+        # Booking service (in-process, or a remote API server) and this terminal's login
+        if API_URL:
+            from api import ApiClient
+            self.service = ApiClient(API_URL)
+        else:
+            self.service = AirportService()
+        self.session = None
+
+        # Background worker for database calls
+        self.db_worker = DBWorker(self)
+        self.db_worker.on_busy_change = self.on_busy_change
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self.frames = {} # Built on first show_frame (see get_frame)
         self.current_frame = None
-        self.create_frames()
+        self.startup_marks = [("imports", self.startup_mark_time())]
+        self.backend_ready = None # None while the readiness check runs, then True/False
         self.show_frame("LoginPage")
+        self.startup_marks.append(("login_page_built", self.startup_mark_time()))
 
-    def create_frames(self):
-        for F in (LoginPage, SignupPage, UserDashboardPage, AdminDashboardPage, BookFlightPage, ViewAvailableFlightsPage, ViewMyTicketsPage, EditTicketPage): # Add more frames here
-            page_name = F.__name__
-            frame = F(parent=self.container, controller=self)
+    def get_frame(self, page_name):
+        # Pages are built the first time they are shown, so startup only pays for the login screen
+        frame = self.frames.get(page_name)
+        if frame is None:
+            frame = PAGES[page_name](parent=self.container, controller=self)
             self.frames[page_name] = frame
             frame.grid(row=0, column=0, sticky="nsew")
+        return frame
 
     def show_frame(self, page_name, data=None):
-        global CURRENT_USER
-        if page_name == "LoginPage": # Reset user on logout/going to login
-            CURRENT_USER = None
+        frame = self.get_frame(page_name)
+        if page_name == "LoginPage" and self.session is not None: # Log out on going back to login
+            session, self.session = self.session, None
+            self.run_async(frame, self.service.logout, session, on_error=lambda err: None, key="logout", keep=True)
 
-        frame = self.frames[page_name]
+        if self.current_frame is not None and self.current_frame is not frame:
+            self.db_worker.cancel(self.current_frame) # Drop results the old page no longer needs
+        self.current_frame = frame
+        self.on_busy_change(frame)
         if hasattr(frame, 'on_show'): # Call on_show if frame has it (to refresh data)
              frame.on_show(data)
-        frame.tkraise()
-        self.current_frame = frame
+        if self.current_frame is frame: # on_show may have redirected elsewhere
+            frame.tkraise()
+
+    def run_async(self, page, func, *args, on_done=None, on_error=None, key=None, loading="Loading...", keep=False):
+        # Run func(*args) off the main thread; on_done(result) runs back on the main thread
+        # unless the user has navigated away from page (or started a newer job with the same key).
+        # keep=True delivers the result even after navigating away (use it for writes).
+        return self.db_worker.submit(page, func, *args, on_done=on_done, on_error=on_error, key=key, loading=loading, keep=keep)
+
+    def on_busy_change(self, page):
+        if page is not self.current_frame:
+            return
+        text = self.db_worker.loading_text(page)
+        self.status_var.set(text)
+        self.config(cursor="watch" if text else "")
+
+    def on_close(self):
+        self.db_worker.shutdown()
+        if not API_URL:
+            self.service.hasher.shutdown()
+        self.destroy()
+
+    # Startup
+    def check_backend(self, on_failure):
+        # Database (or API server) readiness check on the DB worker, so the login
+        # screen paints first. Opening the pool also creates a SQLite schema.
+        self.run_async(self.get_frame("LoginPage"), self.probe_backend,
+                       on_done=self.on_backend_ready, on_error=lambda err: self.on_backend_failed(err, on_failure),
+                       key="ready", loading="Connecting to database...", keep=True)
+
+    def probe_backend(self): # Runs on the DB worker
+        if API_URL:
+            self.service.health()
+        else:
+            database.get_pool().acquire().close()
+
+    def on_backend_ready(self, result):
+        self.backend_ready = True
+        self.startup_marks.append(("backend_ready", self.startup_mark_time()))
+        if not API_URL: # Start the password hashing processes while the user types
+            self.run_async(self, self.service.hasher.start, on_error=lambda err: None, key="hasher", keep=True)
+
+    def on_backend_failed(self, err, on_failure):
+        self.backend_ready = False
+        self.startup_marks.append(("backend_failed", self.startup_mark_time()))
+        on_failure(err)
+
+    def startup_mark_time(self):
+        return time.perf_counter() - STARTUP_T0
+
+    def wait_for_first_paint(self, callback):
+        # callback() once the login screen has been mapped and drawn
+        frame = self.get_frame("LoginPage")
+        def on_map(event):
+            frame.unbind("<Map>")
+            self.after_idle(lambda: (self.startup_marks.append(("first_paint", self.startup_mark_time())), callback()))
+        if frame.winfo_ismapped():
+            on_map(None)
+        else:
+            frame.bind("<Map>", on_map)
 
     def get_current_user_id(self):
-        return CURRENT_USER['user_id'] if CURRENT_USER else None
+        return self.session.user_id if self.session else None
 
     def get_food_options(self):
-        foods = fetch_all("SELECT food_id, item_name, type FROM food_items ORDER BY type, item_name")
-        return {f"{food['item_name']} ({food['type']})": food['food_id'] for food in foods}
+        return self.service.food_options()
+
+    def load_food_options(self, page):
+        # Served straight from the cache when it is warm, otherwise loaded on the DB worker
+        if self.service.food_cache.is_fresh():
+            page.set_food_options(self.get_food_options())
+        else:
+            self.run_async(page, self.get_food_options, on_done=page.set_food_options,
+                           key="food", loading="Loading menu...")
 
 #  GUI Pages
 
+class VirtualTreeview:
+    # Keyset-paginated Treeview. Only a window of at most max_rows rows lives in the
+    # widget; when the user scrolls within `prefetch` (fraction of the view) of either
+    # edge, the next/previous page is fetched on the DB worker and rows that fall
+    # outside the window on the far side are dropped (re-fetched if scrolled back to).
+    # refresh() fetches only rows changed since the last load and patches them by iid.
+    PLACEHOLDER = "__placeholder__"
+
+    def __init__(self, page, tree, scrollbar, order_by, row_key, row_values, row_iid,
+                 page_size=PAGE_SIZE, max_rows=PAGE_SIZE * 3, prefetch=0.2):
+        self.page = page
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.order_by = order_by     # Same (column, direction) list the queries sort by
+        self.row_key = row_key       # Row dict -> keyset cursor tuple
+        self.row_values = row_values # Row dict -> Treeview values
+        self.row_iid = row_iid       # Row dict -> iid
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.prefetch = prefetch
+
+        self.fetch_page = None    # fetch_page(after, limit, backward) -> rows, runs on the DB worker
+        self.fetch_changes = None # fetch_changes(since) -> changed rows with still_matches
+        self.expired = None       # expired(row_key, db_time) -> True once time alone has taken the row out of the query
+        self.on_empty = None
+        self.since = None         # DB time of the last full or delta load
+        self.keys = []            # Cursor per rendered row, in display order
+        self.at_start = True
+        self.at_end = True
+        self.loading = False
+        tree.configure(yscrollcommand=self.on_yview)
+
+    def reset(self, fetch_page, fetch_changes=None, on_empty=None, loading_values=("Loading...",), expired=None):
+        # Start over with a new query (new search criteria or a full reload)
+        self.fetch_page = fetch_page
+        self.fetch_changes = fetch_changes
+        self.expired = expired
+        self.on_empty = on_empty
+        self.since = None
+        self.tree.delete(*self.tree.get_children())
+        self.keys = []
+        self.at_start = True
+        self.at_end = False
+        self.loading = False
+        self.show_placeholder(loading_values)
+        self.load_more(backward=False)
+
+    def show_placeholder(self, values):
+        columns = len(self.tree["columns"])
+        self.tree.insert("", "end", iid=self.PLACEHOLDER, values=tuple(values) + ("",) * (columns - len(values)))
+
+    def load_more(self, backward):
+        if self.loading or self.fetch_page is None:
+            return
+        if (backward and self.at_start) or (not backward and self.at_end):
+            return
+        self.loading = True
+        after = None
+        if self.keys:
+            after = self.keys[0] if backward else self.keys[-1]
+        fetch_page = self.fetch_page
+        first_page = self.since is None
+
+        def job(): # Runs on the DB worker; the first page also records the delta watermark
+            since = self.page.controller.service.db_time() if first_page and self.fetch_changes else None
+            return since, fetch_page(after, self.page_size, backward)
+
+        self.page.controller.run_async(
+            self.page, job, on_done=lambda result: self.on_page(fetch_page, result, backward),
+            on_error=self.on_load_error, key=("page", id(self)), loading="Loading more rows..." if self.keys else "Loading..."
+        )
+
+    def on_page(self, fetch_page, result, backward):
+        if fetch_page is not self.fetch_page: # A newer reset() superseded this page
+            return
+        since, rows = result
+        self.loading = False
+        if since is not None:
+            self.since = since
+        if self.tree.exists(self.PLACEHOLDER):
+            self.tree.delete(self.PLACEHOLDER)
+        exhausted = len(rows) < self.page_size
+
+        if backward:
+            self.at_start = exhausted
+            rows = list(reversed(rows)) # Fetched in reverse order, shown in natural order
+            for index, row in enumerate(rows):
+                self.tree.insert("", index, iid=self.row_iid(row), values=self.row_values(row))
+            self.keys[:0] = [self.row_key(row) for row in rows]
+            self.tree.yview_scroll(len(rows), "units") # Keep the rows the user is looking at in place
+            self.trim(from_top=False)
+        else:
+            self.at_end = exhausted
+            for row in rows:
+                self.tree.insert("", "end", iid=self.row_iid(row), values=self.row_values(row))
+            self.keys.extend(self.row_key(row) for row in rows)
+            self.trim(from_top=True)
+
+        if not self.keys and self.on_empty:
+            self.on_empty()
+
+    def refresh(self):
+        # Delta refresh: cost follows the number of changed rows, not the table size
+        if self.fetch_changes is None or self.since is None:
+            if self.fetch_page is not None and not self.loading:
+                self.reset(self.fetch_page, self.fetch_changes, self.on_empty, expired=self.expired)
+            return
+        fetch_page, fetch_changes, since = self.fetch_page, self.fetch_changes, self.since
+        db_time = self.page.controller.service.db_time
+
+        def job(): # Runs on the DB worker
+            now = db_time()
+            return now, fetch_changes(since - DELTA_OVERLAP)
+
+        self.page.controller.run_async(
+            self.page, job, on_done=lambda result: self.on_changes(fetch_page, result),
+            on_error=self.on_load_error, key=("delta", id(self)), loading="Refreshing..."
+        )
+
+    def on_changes(self, fetch_page, result):
+        if fetch_page is not self.fetch_page:
+            return
+        now, rows = result
+        had_rows = bool(self.keys)
+        for row in rows:
+            if row['still_matches']:
+                self.upsert(row)
+            else:
+                self.remove(self.row_iid(row))
+        if now is not None and self.expired is not None:
+            # Rows whose condition lapsed with the clock (e.g. a departure now past) were
+            # never written, so the delta did not carry them: drop them here
+            for iid, key in list(zip(self.tree.get_children(), self.keys)):
+                if self.expired(key, now):
+                    self.remove(iid)
+        if now is not None:
+            self.since = now
+        if had_rows and not self.keys and self.at_start and self.at_end and self.on_empty:
+            self.on_empty()
+
+    def upsert(self, row):
+        iid = str(self.row_iid(row))
+        key = self.row_key(row)
+        if self.tree.exists(iid):
+            index = self.tree.index(iid)
+            if self.keys[index] == key: # Same position: patch the values in place
+                self.tree.item(iid, values=self.row_values(row))
+                return
+            self.remove(iid) # Sort key changed: move it
+
+        index = self.insert_position(key)
+        # Only place rows that land inside the loaded window; the rest arrive when scrolled to
+        if (index == 0 and not self.at_start) or (index == len(self.keys) and not self.at_end):
+            return
+        if self.tree.exists(self.PLACEHOLDER):
+            self.tree.delete(self.PLACEHOLDER)
+        self.tree.insert("", index, iid=iid, values=self.row_values(row))
+        self.keys.insert(index, key)
+
+    def remove(self, iid):
+        iid = str(iid)
+        if self.tree.exists(iid):
+            del self.keys[self.tree.index(iid)]
+            self.tree.delete(iid)
+
+    def insert_position(self, key):
+        low, high = 0, len(self.keys)
+        while low < high:
+            mid = (low + high) // 2
+            if self.compare_keys(self.keys[mid], key) < 0:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def compare_keys(self, a, b):
+        for value_a, value_b, (_, direction) in zip(a, b, self.order_by):
+            if value_a != value_b:
+                result = -1 if value_a < value_b else 1
+                return result if direction == "ASC" else -result
+        return 0
+
+    def on_load_error(self, err):
+        self.loading = False
+        messagebox.showerror("Query Error", f"Error fetching data: {err}")
+
+    def trim(self, from_top):
+        excess = len(self.keys) - self.max_rows
+        if excess <= 0:
+            return
+        children = self.tree.get_children()
+        if from_top:
+            self.tree.delete(*children[:excess])
+            del self.keys[:excess]
+            self.at_start = False
+            self.tree.yview_scroll(-excess, "units")
+        else:
+            self.tree.delete(*children[-excess:])
+            del self.keys[-excess:]
+            self.at_end = False
+
+    def on_yview(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.loading:
+            return
+        if float(last) >= 1.0 - self.prefetch and not self.at_end:
+            self.tree.after_idle(self.load_more, False)
+        elif float(first) <= self.prefetch and not self.at_start:
+            self.tree.after_idle(self.load_more, True)
+
+
 class LoginPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
@@ -150,7 +521,6 @@ class LoginPage(tk.Frame):
 
 
     def login(self):
-        global CURRENT_USER
         phone = self.phone_entry.get()
         password = self.password_entry.get()
 
@@ -158,19 +528,19 @@ class LoginPage(tk.Frame):
             messagebox.showerror("Error", "Phone number and password are required.")
             return
 
-        user = fetch_one("SELECT user_id, username, password, role FROM users WHERE phone_number = %s", (phone,))
-
-        if user and user['password'] == password: # In real app: check hashed password
-            CURRENT_USER = {'user_id': user['user_id'], 'username': user['username'], 'role': user['role']}
-            messagebox.showinfo("Success", f"Welcome {user['username']}!")
-            self.phone_entry.delete(0, tk.END) # Clear fields
-            self.password_entry.delete(0, tk.END)
-            if user['role'] == 'admin':
-                self.controller.show_frame("AdminDashboardPage")
-            else:
-                self.controller.show_frame("UserDashboardPage")
+        self.controller.run_async(self, self.controller.service.login, phone, password, on_done=self.on_login_result,
+                                  on_error=lambda err: messagebox.showerror("Error", describe_error(err)),
+                                  key="login", loading="Signing in...")
+
+    def on_login_result(self, session):
+        self.controller.session = session
+        messagebox.showinfo("Success", f"Welcome {session.username}!")
+        self.phone_entry.delete(0, tk.END) # Clear fields
+        self.password_entry.delete(0, tk.END)
+        if session.is_admin:
+            self.controller.show_frame("AdminDashboardPage")
         else:
-            messagebox.showerror("Error", "Invalid phone number or password.")
+            self.controller.show_frame("UserDashboardPage")
 
 class SignupPage(tk.Frame):
     def __init__(self, parent, controller):
@@ -217,27 +587,23 @@ class SignupPage(tk.Frame):
         if password != confirm_password:
             messagebox.showerror("Error", "Passwords do not match.")
             return
-        if not phone.isdigit() or len(phone) < 10: # Basic phone validation
-            messagebox.showerror("Error", "Invalid phone number format (at least 10 digits).")
-            return
 
-        # Check if phone number already exists
-        existing_user = fetch_one("SELECT user_id FROM users WHERE phone_number = %s", (phone,))
-        if existing_user:
-            messagebox.showerror("Error", "Phone number already registered.")
-            return
+        # Phone format and duplicate checks happen in the service
+        self.controller.run_async(self, self.controller.service.register, username, password, phone,
+                                  on_done=self.on_register_result, on_error=self.on_register_error,
+                                  key="register", loading="Registering...", keep=True)
 
-        success, _ = execute_query("INSERT INTO users (username, password, phone_number) VALUES (%s, %s, %s)",
-                                 (username, password, phone))
-        if success:
-            messagebox.showinfo("Success", "Registration successful! Please login.")
-            self.username_entry.delete(0, tk.END)
-            self.password_entry.delete(0, tk.END)
-            self.confirm_password_entry.delete(0, tk.END)
-            self.phone_entry.delete(0, tk.END)
-            self.controller.show_frame("LoginPage")
-        else:
-            messagebox.showerror("Error", "Registration failed. Please try again.")
+    def on_register_error(self, err):
+        messagebox.showerror("Error", describe_error(err) if isinstance(err, ServiceError)
+                             else "Registration failed. Please try again.")
+
+    def on_register_result(self, user_id):
+        messagebox.showinfo("Success", "Registration successful! Please login.")
+        self.username_entry.delete(0, tk.END)
+        self.password_entry.delete(0, tk.END)
+        self.confirm_password_entry.delete(0, tk.END)
+        self.phone_entry.delete(0, tk.END)
+        self.controller.show_frame("LoginPage")
 
 
 class UserDashboardPage(tk.Frame):
@@ -264,8 +630,9 @@ class UserDashboardPage(tk.Frame):
 
 
     def on_show(self, data=None): # Called when frame is shown
-        if CURRENT_USER:
-            self.welcome_label.config(text=f"Welcome, {CURRENT_USER['username']}!")
+        session = self.controller.session
+        if session:
+            self.welcome_label.config(text=f"Welcome, {session.username}!")
         else: # Should not happen if logic is correct
             self.welcome_label.config(text="User Dashboard")
             self.controller.show_frame("LoginPage") # Redirect if no user
@@ -283,36 +650,578 @@ class AdminDashboardPage(tk.Frame):
 
         # Placeholder for admin actions, e.g., view all bookings
         ttk.Button(self, text="View All Bookings (Console)", command=self.view_all_bookings_console).pack(pady=10)
-        ttk.Button(self, text="Manage Flights (Add/Edit - Future)", command=self.manage_flights_placeholder).pack(pady=10)
+        ttk.Button(self, text="Query Stats (Console)", command=self.view_query_stats_console).pack(pady=5)
+        ttk.Button(self, text="Analytics", command=lambda: controller.show_frame("AnalyticsPage")).pack(pady=5)
+        ttk.Button(self, text="Cancel Flights", command=lambda: controller.show_frame("CancelFlightsPage")).pack(pady=5)
+
+        # Streaming bookings export
+        export_frame = ttk.LabelFrame(self, text="Export Bookings")
+        export_frame.pack(padx=10, pady=10)
+
+        tk.Label(export_frame, text="Date From:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.export_from_entry = ttk.Entry(export_frame, width=12)
+        self.export_from_entry.grid(row=0, column=1, padx=5, pady=5)
+        tk.Label(export_frame, text="Date To:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        self.export_to_entry = ttk.Entry(export_frame, width=12)
+        self.export_to_entry.grid(row=0, column=3, padx=5, pady=5)
+        tk.Label(export_frame, text="(YYYY-MM-DD)").grid(row=0, column=4, padx=5, pady=5, sticky="w")
+
+        tk.Label(export_frame, text="Flight No:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.export_flight_entry = ttk.Entry(export_frame, width=12)
+        self.export_flight_entry.grid(row=1, column=1, padx=5, pady=5)
+        tk.Label(export_frame, text="Status:").grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        self.export_status_var = tk.StringVar(value="Any")
+        ttk.Combobox(export_frame, textvariable=self.export_status_var, values=["Any"] + BOOKING_STATUSES,
+                     width=10, state="readonly").grid(row=1, column=3, padx=5, pady=5)
+        self.export_format_var = tk.StringVar(value="CSV")
+        ttk.Combobox(export_frame, textvariable=self.export_format_var, values=["CSV", "JSON Lines"],
+                     width=10, state="readonly").grid(row=1, column=4, padx=5, pady=5)
+
+        self.export_button = ttk.Button(export_frame, text="Export...", command=self.export_bookings)
+        self.export_button.grid(row=2, column=0, columnspan=2, padx=5, pady=5)
+        self.export_cancel_button = ttk.Button(export_frame, text="Cancel Export", command=self.cancel_export, state="disabled")
+        self.export_cancel_button.grid(row=2, column=2, columnspan=2, padx=5, pady=5)
+        self.export_status_label = tk.Label(export_frame, text="", anchor="w")
+        self.export_status_label.grid(row=3, column=0, columnspan=5, padx=5, pady=5, sticky="w")
+        self.export_cancel_event = None
+
+        # Flight schedule import (CSV / JSON, upserted on flight number)
+        import_frame = ttk.LabelFrame(self, text="Manage Flights")
+        import_frame.pack(padx=10, pady=10)
+        self.import_button = ttk.Button(import_frame, text="Import Schedule...", command=self.import_schedule)
+        self.import_button.grid(row=0, column=0, padx=5, pady=5)
+        self.import_cancel_button = ttk.Button(import_frame, text="Cancel Import", command=self.cancel_import, state="disabled")
+        self.import_cancel_button.grid(row=0, column=1, padx=5, pady=5)
+        self.import_status_label = tk.Label(import_frame, text="", anchor="w")
+        self.import_status_label.grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        self.import_cancel_event = None
+
         ttk.Button(self, text="Logout", command=lambda: controller.show_frame("LoginPage")).pack(pady=20)
 
     def on_show(self, data=None):
-        if CURRENT_USER and CURRENT_USER['role'] == 'admin':
-            self.welcome_label.config(text=f"Admin Panel - Welcome, {CURRENT_USER['username']}")
+        session = self.controller.session
+        if session and session.is_admin:
+            self.welcome_label.config(text=f"Admin Panel - Welcome, {session.username}")
         else:
             self.controller.show_frame("LoginPage") # Redirect if not admin
 
     def view_all_bookings_console(self):
         # This is a console output using tabulate as an example
-        query = """
-        SELECT b.booking_id, u.username, f.flight_number, f.origin, f.destination,
-               b.booking_date, b.total_amount, b.status
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN flights f ON b.flight_id = f.flight_id
-        ORDER BY b.booking_date DESC;
-        """
-        all_bookings = fetch_all(query)
-        if all_bookings:
-            headers = ["Booking ID", "User", "Flight No.", "Origin", "Dest.", "Date", "Amount", "Status"]
-            print("\n--- All Bookings ---")
-            print(tabulate(all_bookings, headers="keys", tablefmt="grid")) # "keys" uses dict keys as headers
-            messagebox.showinfo("Admin Action", "All bookings printed to console.")
+        query, params = build_bookings_export_query()
+        self.controller.run_async(self, self.print_bookings, query, params, on_done=self.on_bookings_printed,
+                                  on_error=self.on_export_error, key="bookings", loading="Printing all bookings...")
+
+    def view_query_stats_console(self):
+        # Top statements by total time, from this process or the API server
+        service, session = self.controller.service, self.controller.session
+        def print_query_stats(): # Runs on the DB worker
+            from instrumentation import print_report
+            print_report(service.query_stats(session, 20))
+        self.controller.run_async(self, print_query_stats,
+                                  on_done=lambda result: messagebox.showinfo("Admin Action", "Query stats printed to console."),
+                                  on_error=lambda err: messagebox.showerror("Query Stats", describe_error(err)),
+                                  key="query_stats", loading="Collecting query stats...")
+
+    def print_bookings(self, query, params): # Runs on the DB worker, one chunk in memory at a time
+        import tabulate # Only the admin console needs it
+        print("\n--- All Bookings ---")
+        total = 0
+        for rows in stream_rows(query, params):
+            # "keys" uses dict keys as headers; repeated per chunk so each block stands alone
+            print(tabulate.tabulate(rows, headers="keys", tablefmt="grid"))
+            total += len(rows)
+        return total
+
+    def on_bookings_printed(self, total):
+        if total:
+            messagebox.showinfo("Admin Action", f"All bookings ({total}) printed to console.")
         else:
             messagebox.showinfo("Admin Action", "No bookings found.")
 
-    def manage_flights_placeholder(self):
-        messagebox.showinfo("Admin Action", "Flight management GUI is a future enhancement.\nAdmin could add/edit flights here.")
+    def export_bookings(self):
+        try:
+            date_from = self.parse_date(self.export_from_entry.get())
+            date_to = self.parse_date(self.export_to_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date. Use the format YYYY-MM-DD.")
+            return
+        flight_number = self.export_flight_entry.get().strip() or None
+        status = self.export_status_var.get()
+        status = None if status == "Any" else status
+        fmt = "csv" if self.export_format_var.get() == "CSV" else "jsonl"
+
+        path = filedialog.asksaveasfilename(
+            title="Export Bookings", defaultextension=f".{fmt}",
+            filetypes=[("CSV", "*.csv")] if fmt == "csv" else [("JSON Lines", "*.jsonl")]
+        )
+        if not path:
+            return
+
+        self.export_cancel_event = threading.Event()
+        self.export_button.config(state="disabled")
+        self.export_cancel_button.config(state="normal")
+        self.export_status_label.config(text="Starting export...")
+        self.controller.run_async(
+            self, export_bookings, path, fmt, date_from, date_to, flight_number, status, EXPORT_CHUNK_SIZE,
+            lambda rows, rate: call_on_ui_thread(self.show_export_progress, rows, rate), self.export_cancel_event,
+            on_done=lambda result: self.on_export_done(path, result), on_error=self.on_export_error,
+            key="export", loading="Exporting bookings...", keep=True
+        )
+
+    def parse_date(self, text):
+        text = text.strip()
+        return datetime.strptime(text, '%Y-%m-%d').date() if text else None
+
+    def show_export_progress(self, rows, rate):
+        self.export_status_label.config(text=f"Exported {rows:,} rows ({rate:,.0f} rows/sec)...")
+
+    def cancel_export(self):
+        if self.export_cancel_event:
+            self.export_cancel_event.set()
+
+    def on_export_done(self, path, result):
+        self.export_button.config(state="normal")
+        self.export_cancel_button.config(state="disabled")
+        summary = f"{result['rows']:,} rows in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/sec)"
+        if result['cancelled']:
+            self.export_status_label.config(text=f"Export cancelled after {summary}.")
+        else:
+            self.export_status_label.config(text=f"Exported {summary}.")
+            messagebox.showinfo("Admin Action", f"Exported {summary} to:\n{path}")
+
+    def on_export_error(self, err):
+        self.export_button.config(state="normal")
+        self.export_cancel_button.config(state="disabled")
+        self.export_status_label.config(text="")
+        messagebox.showerror("Export Error", f"Failed to read bookings: {err}")
+
+    def import_schedule(self):
+        from schedule_import import import_schedule, IMPORT_BATCH_SIZE
+        path = filedialog.askopenfilename(
+            title="Import Flight Schedule",
+            filetypes=[("Schedules", "*.csv *.json *.jsonl"), ("CSV", "*.csv"), ("JSON / JSON Lines", "*.json *.jsonl")]
+        )
+        if not path:
+            return
+        rejects_path = os.path.splitext(path)[0] + ".rejects.csv"
+
+        self.import_cancel_event = threading.Event()
+        self.import_button.config(state="disabled")
+        self.import_cancel_button.config(state="normal")
+        self.import_status_label.config(text="Starting import...")
+        self.controller.run_async(
+            self, import_schedule, path, None, IMPORT_BATCH_SIZE,
+            lambda rows, rate, rejected: call_on_ui_thread(self.show_import_progress, rows, rate, rejected),
+            self.import_cancel_event, rejects_path,
+            on_done=self.on_import_done, on_error=self.on_import_error,
+            key="import", loading="Importing flight schedule...", keep=True
+        )
+
+    def show_import_progress(self, rows, rate, rejected):
+        self.import_status_label.config(text=f"Read {rows:,} rows, {rejected:,} rejected ({rate:,.0f} rows/sec)...")
+
+    def cancel_import(self):
+        if self.import_cancel_event:
+            self.import_cancel_event.set()
+
+    def on_import_done(self, result):
+        self.import_button.config(state="normal")
+        self.import_cancel_button.config(state="disabled")
+        summary = (f"{result['rows']:,} rows in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/sec): "
+                   f"{result['inserted']:,} added, {result['updated']:,} updated, {result['unchanged']:,} unchanged, "
+                   f"{result['rejected']:,} rejected")
+        if result['cancelled']:
+            self.import_status_label.config(text=f"Import cancelled after {summary}.")
+            return
+        self.import_status_label.config(text=f"Imported {summary}.")
+        message = f"Imported {summary}."
+        if result['rejected']:
+            message += "\n\n" + "\n".join(f"Row {position}: {error}" for position, error in result['rejects'][:10])
+            if result['rejects_path']:
+                message += f"\n\nAll rejected rows were written to:\n{result['rejects_path']}"
+        messagebox.showinfo("Admin Action", message)
+
+    def on_import_error(self, err):
+        self.import_button.config(state="normal")
+        self.import_cancel_button.config(state="disabled")
+        self.import_status_label.config(text="")
+        messagebox.showerror("Import Error", f"Failed to import the schedule: {err}")
+
+
+class AnalyticsPage(tk.Frame):
+    # Admin reports served from the rollup tables (see "Analytics Rollups" in database.py)
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+
+        tk.Label(self, text="Analytics", font=("Arial", 18, "bold")).pack(pady=10)
+
+        filter_frame = ttk.LabelFrame(self, text="Period")
+        filter_frame.pack(padx=10, pady=5, fill="x")
+        tk.Label(filter_frame, text="Date From:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.from_entry = ttk.Entry(filter_frame, width=12)
+        self.from_entry.grid(row=0, column=1, padx=5, pady=5)
+        tk.Label(filter_frame, text="Date To:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        self.to_entry = ttk.Entry(filter_frame, width=12)
+        self.to_entry.grid(row=0, column=3, padx=5, pady=5)
+        tk.Label(filter_frame, text="(YYYY-MM-DD; sales by day of sale, flights by departure)").grid(
+            row=0, column=4, padx=5, pady=5, sticky="w")
+
+        tk.Label(filter_frame, text="Revenue by:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.group_vars = {}
+        for column, group in enumerate(ANALYTICS_GROUPS, start=1):
+            self.group_vars[group] = tk.BooleanVar(value=(group == "route"))
+            ttk.Checkbutton(filter_frame, text=group.title(), variable=self.group_vars[group]).grid(
+                row=1, column=column, padx=5, pady=5, sticky="w")
+        ttk.Button(filter_frame, text="Refresh", command=self.load_report).grid(row=1, column=4, padx=5, pady=5, sticky="w")
+
+        self.summary_label = tk.Label(self, text="", anchor="w", justify="left")
+        self.summary_label.pack(padx=10, pady=5, fill="x")
+
+        notebook = ttk.Notebook(self)
+        notebook.pack(padx=10, pady=5, fill="both", expand=True)
+        self.revenue_tree = self.add_table(notebook, "Revenue", [])
+        self.load_tree = self.add_table(notebook, "Load Factor",
+                                        ["Flight No", "Origin", "Dest.", "Departure", "Booked", "Seats", "Load"])
+        self.meal_tree = self.add_table(notebook, "Meal Demand", ["Meal", "Type", "Passengers"])
+
+        ttk.Button(self, text="Back to Dashboard", command=lambda: controller.show_frame("AdminDashboardPage")).pack(pady=10)
+
+    def add_table(self, notebook, title, cols):
+        frame = tk.Frame(notebook)
+        tree = ttk.Treeview(frame, columns=cols, show='headings')
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        notebook.add(frame, text=title)
+        self.set_columns(tree, cols)
+        return tree
+
+    def set_columns(self, tree, cols):
+        tree['columns'] = cols
+        for col in cols:
+            tree.heading(col, text=col)
+            tree.column(col, width=100, anchor="w")
+
+    def on_show(self, data=None):
+        session = self.controller.session
+        if not session or not session.is_admin:
+            self.controller.show_frame("LoginPage")
+            return
+        self.load_report()
+
+    def load_report(self):
+        try:
+            date_from = self.parse_date(self.from_entry.get())
+            date_to = self.parse_date(self.to_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date. Use the format YYYY-MM-DD.")
+            return
+        group_by = [group for group, var in self.group_vars.items() if var.get()]
+        self.controller.run_async(self, self.controller.service.analytics, self.controller.session,
+                                  date_from, date_to, group_by, on_done=lambda report: self.show_report(report, group_by),
+                                  on_error=lambda err: messagebox.showerror("Analytics", describe_error(err)),
+                                  key="report", loading="Loading analytics...")
+
+    def parse_date(self, text):
+        text = text.strip()
+        return datetime.strptime(text, '%Y-%m-%d').date() if text else None
+
+    def show_report(self, report, group_by):
+        totals, seats = report['totals'], report['seats']
+        self.summary_label.config(text=(
+            f"Sold: {totals['passengers'] or 0:,} passengers, revenue {totals['revenue']:,.2f}, "
+            f"refunded {totals['refunded']:,.2f}, net {totals['net_revenue']:,.2f}. "
+            f"Cancellation rate: {totals['cancellation_rate']:.1%}.\n"
+            f"Load factor: {seats['load_factor']:.1%} ({seats['seats_booked'] or 0:,} of {seats['seats_total'] or 0:,} seats "
+            f"on {seats['flights']:,} flights)."))
+
+        group_cols = [column for group in group_by for column in ANALYTICS_GROUPS[group]]
+        headings = {'sale_date': "Day", 'origin': "Origin", 'destination': "Dest.", 'seat_class': "Class"}
+        cols = [headings[column] for column in group_cols] + ["Passengers", "Revenue", "Cancelled", "Refunded", "Net", "Cancel %"]
+        self.set_columns(self.revenue_tree, cols)
+        self.revenue_tree.delete(*self.revenue_tree.get_children())
+        for row in report['sales']:
+            self.revenue_tree.insert("", "end", values=[row[column] for column in group_cols] + [
+                row['passengers'], f"{row['revenue']:.2f}", row['cancelled_passengers'], f"{row['refunded']:.2f}",
+                f"{row['net_revenue']:.2f}", f"{row['cancellation_rate']:.1%}"])
+
+        self.load_tree.delete(*self.load_tree.get_children())
+        for label, rows in (("Lowest", report['lowest_load']), ("Highest", report['highest_load'])):
+            self.load_tree.insert("", "end", values=(f"-- {label} --",))
+            for row in rows:
+                self.load_tree.insert("", "end", values=(
+                    row['flight_number'], row['origin'], row['destination'],
+                    row['departure_time'].strftime('%Y-%m-%d %H:%M'),
+                    row['seats_booked'], row['seats_total'], f"{row['load_factor']:.1%}"))
+
+        self.meal_tree.delete(*self.meal_tree.get_children())
+        for row in report['meal_demand']:
+            self.meal_tree.insert("", "end", values=(row['item_name'], row['type'], row['passengers']))
+
+
+class CancelFlightsPage(tk.Frame):
+    # Admin: scrub flights. Every booking on the selected flights is cancelled in one
+    # transaction (database.cancel_flights) and queued in cancellation_notices.
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+
+        tk.Label(self, text="Cancel Flights", font=("Arial", 18, "bold")).pack(pady=10)
+
+        tree_frame = tk.Frame(self)
+        tree_frame.pack(pady=10, padx=10, fill="both", expand=True)
+
+        cols = ("Flight No", "Origin", "Destination", "Departure", "Aircraft", "Eco Seats Avail.", "Biz Seats Avail.")
+        self.flights_tree = ttk.Treeview(tree_frame, columns=cols, show='headings', selectmode="extended")
+        for col in cols:
+            self.flights_tree.heading(col, text=col)
+            self.flights_tree.column(col, width=110, anchor="w")
+        self.flights_tree.pack(side="left", fill="both", expand=True)
+
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.flights_tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.flights_view = VirtualTreeview(self, self.flights_tree, scrollbar, FLIGHT_ORDER, flight_row_key,
+                                            self.flight_values, lambda flight: flight['flight_id'])
+
+        action_frame = tk.Frame(self)
+        action_frame.pack(pady=5)
+        tk.Label(action_frame, text="Reason:").pack(side="left", padx=5)
+        self.reason_entry = ttk.Entry(action_frame, width=40)
+        self.reason_entry.pack(side="left", padx=5)
+        self.cancel_button = ttk.Button(action_frame, text="Cancel Selected Flights", command=self.cancel_selected)
+        self.cancel_button.pack(side="left", padx=5)
+
+        ttk.Button(self, text="Refresh", command=self.flights_view.refresh).pack(pady=5)
+        ttk.Button(self, text="Back to Dashboard", command=lambda: controller.show_frame("AdminDashboardPage")).pack(pady=10)
+
+    def on_show(self, data=None):
+        session = self.controller.session
+        if not session or not session.is_admin:
+            self.controller.show_frame("LoginPage")
+            return
+        if self.flights_view.fetch_page:
+            self.flights_view.refresh()
+        else:
+            service = self.controller.service
+            def fetch_page(after, limit, backward): # Runs on the DB worker
+                return service.upcoming_flights(after, backward, limit)
+            def fetch_changes(since):
+                return service.upcoming_flights(changed_since=since)
+            self.flights_view.reset(fetch_page, fetch_changes,
+                                    on_empty=lambda: self.flights_view.show_placeholder(("No upcoming flights found.",)))
+
+    def flight_values(self, flight):
+        return (
+            flight['flight_number'], flight['origin'], flight['destination'],
+            flight['departure_time'].strftime('%Y-%m-%d %H:%M'), flight['aircraft_name'],
+            flight['eco_available'], flight['biz_available']
+        )
+
+    def cancel_selected(self):
+        selected = [iid for iid in self.flights_tree.selection() if iid != VirtualTreeview.PLACEHOLDER]
+        if not selected:
+            messagebox.showwarning("Selection Error", "Please select the flights to cancel.")
+            return
+        numbers = ", ".join(self.flights_tree.item(iid, 'values')[0] for iid in selected)
+        if not messagebox.askyesno("Confirm Cancellation",
+                                   f"Cancel {numbers} and every booking on them? This action cannot be undone."):
+            return
+        self.cancel_button.config(state="disabled")
+        self.controller.run_async(
+            self, self.controller.service.cancel_flights, self.controller.session, [int(iid) for iid in selected],
+            self.reason_entry.get(), on_done=self.on_flights_cancelled, on_error=self.on_cancel_error,
+            key="cancel", loading="Cancelling flights...", keep=True
+        )
+
+    def on_flights_cancelled(self, result):
+        self.cancel_button.config(state="normal")
+        self.reason_entry.delete(0, tk.END)
+        messagebox.showinfo("Flights Cancelled",
+                            f"Cancelled {result['flights']} flight(s): {result['bookings']} booking(s), "
+                            f"{result['passengers']} passenger(s), {result['refunded']:,.2f} to refund.\n"
+                            f"The affected bookings are queued for notification.")
+        self.flights_view.refresh()
+
+    def on_cancel_error(self, err):
+        self.cancel_button.config(state="normal")
+        if isinstance(err, (BookingError, ServiceError) + DB_ERRORS):
+            messagebox.showerror("Cancellation Error", f"Failed to cancel flights: {err}")
+        else:
+            messagebox.showerror("Cancellation Error", describe_error(err))
+        self.flights_view.refresh()
+
+
+class SeatPicker(tk.Toplevel):
+    # Seat map of one cabin: click free seats to pick up to count of them (click again
+    # to drop one). on_done gets the picked seat numbers in the order they were picked.
+    CELL = 30 # Seat square, pixels
+    GAP = 4
+    COLORS = {'free': "#c8e6c9", 'taken': "#bdbdbd", 'picked': "#42a5f5"}
+
+    def __init__(self, parent, seat_map, count, picked, on_done):
+        super().__init__(parent)
+        self.title(f"Choose {seat_map.seat_class} Seats")
+        self.seat_map = seat_map
+        self.count = count
+        self.on_done = on_done
+        self.picked = [] # Seat indexes
+        for label in picked:
+            index = seat_map.index_of(label) if label else None
+            if index is not None and not seat_map.is_taken(index) and len(self.picked) < count:
+                self.picked.append(index)
+        self.cells = {} # Canvas item -> seat index
+
+        self.status_label = tk.Label(self)
+        self.status_label.pack(padx=10, pady=5)
+        legend = tk.Frame(self)
+        legend.pack()
+        for state, text in (('free', "Free"), ('picked', "Yours"), ('taken', "Taken")):
+            tk.Label(legend, text=text, bg=self.COLORS[state], width=8).pack(side="left", padx=3)
+
+        canvas_frame = tk.Frame(self)
+        canvas_frame.pack(padx=10, pady=5, fill="both", expand=True)
+        self.canvas = tk.Canvas(canvas_frame, height=min(480, self.draw_height()), highlightthickness=0)
+        scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        self.draw()
+        self.canvas.bind("<Button-1>", self.on_click)
+
+        buttons = tk.Frame(self)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Done", command=self.done).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Clear", command=self.clear).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Cancel", command=self.destroy).pack(side="left", padx=5)
+        self.update_status()
+        self.transient(parent)
+        self.grab_set()
+
+    def draw_height(self):
+        rows = -(-self.seat_map.total // self.seat_map.width)
+        return (rows + 1) * (self.CELL + self.GAP) + self.GAP
+
+    def draw(self):
+        step = self.CELL + self.GAP
+        columns = [] # x of each seat letter, with a wider gap at the aisle
+        x = self.CELL + self.GAP
+        for char in SEAT_LAYOUTS[self.seat_map.seat_class]:
+            if char == " ":
+                x += self.CELL // 2
+            else:
+                columns.append(x)
+                self.canvas.create_text(x + self.CELL // 2, self.CELL // 2, text=char)
+                x += step
+        for index in range(self.seat_map.total):
+            row, column = divmod(index, self.seat_map.width)
+            y = (row + 1) * step
+            if column == 0:
+                self.canvas.create_text(self.CELL // 2, y + self.CELL // 2, text=str(self.seat_map.first_row + row))
+            cell = self.canvas.create_rectangle(columns[column], y, columns[column] + self.CELL, y + self.CELL,
+                                                fill=self.COLORS[self.seat_state(index)], outline="#757575")
+            self.cells[cell] = index
+        self.canvas.configure(width=x + self.GAP, scrollregion=(0, 0, x + self.GAP, self.draw_height()))
+
+    def seat_state(self, index):
+        if index in self.picked:
+            return 'picked'
+        return 'taken' if self.seat_map.is_taken(index) else 'free'
+
+    def on_click(self, event):
+        items = self.canvas.find_overlapping(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y),
+                                             self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        index = next((self.cells[item] for item in items if item in self.cells), None)
+        if index is None or self.seat_map.is_taken(index):
+            return
+        if index in self.picked:
+            self.picked.remove(index)
+        elif len(self.picked) < self.count:
+            self.picked.append(index)
+        else:
+            self.bell()
+            return
+        self.redraw()
+
+    def redraw(self):
+        for cell, index in self.cells.items():
+            self.canvas.itemconfig(cell, fill=self.COLORS[self.seat_state(index)])
+        self.update_status()
+
+    def update_status(self):
+        labels = ", ".join(self.seat_map.label(index) for index in self.picked) or "none"
+        self.status_label.config(text=f"{self.seat_map.free_count()} seats free. Picked {len(self.picked)} of "
+                                      f"{self.count}: {labels}. Passengers without a pick are seated together.")
+
+    def clear(self):
+        self.picked = []
+        self.redraw()
+
+    def done(self):
+        self.on_done([self.seat_map.label(index) for index in self.picked])
+        self.destroy()
+
+
+class ItineraryWindow(tk.Toplevel):
+    # Itineraries from a connection search, one row each with its flights underneath.
+    # Each leg is booked on its own: "Book This Leg" runs the flight search for it.
+    def __init__(self, parent, itineraries, seats, on_leg):
+        super().__init__(parent)
+        self.title("Connections")
+        self.on_leg = on_leg
+        self.legs = {} # Tree item -> leg
+
+        tk.Label(self, text=f"{len(itineraries)} itineraries with {seats} seat(s) free on every flight. "
+                            "Book each flight separately.").pack(padx=10, pady=5)
+        tree_frame = tk.Frame(self)
+        tree_frame.pack(padx=10, pady=5, fill="both", expand=True)
+        cols = ("Flight", "Route", "Departure", "Arrival", "Duration", "Price", "Seats Left")
+        self.tree = ttk.Treeview(tree_frame, columns=cols, selectmode="browse", height=15)
+        self.tree.heading("#0", text="Itinerary")
+        self.tree.column("#0", width=160)
+        for col in cols:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=140 if col in ("Route", "Departure", "Arrival") else 90, anchor="center")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        for number, itinerary in enumerate(itineraries, 1):
+            stops = itinerary['stops']
+            text = f"{number}. " + ("Direct" if not stops else f"{stops} stop{'s' if stops > 1 else ''}")
+            parent_item = self.tree.insert("", "end", text=text, open=True, values=(
+                "", f"{itinerary['origin']} -> {itinerary['destination']}",
+                itinerary['departure_time'].strftime('%Y-%m-%d %H:%M'),
+                itinerary['arrival_time'].strftime('%Y-%m-%d %H:%M'),
+                self.duration(itinerary['duration_minutes']), f"{itinerary['total_price']:.2f}",
+                itinerary['seats_left']))
+            for i, leg in enumerate(itinerary['legs']):
+                wait = f"after {self.duration(itinerary['layover_minutes'][i - 1])}" if i else ""
+                item = self.tree.insert(parent_item, "end", text=wait, values=(
+                    leg['flight_number'], f"{leg['origin']} -> {leg['destination']}",
+                    leg['departure_time'].strftime('%Y-%m-%d %H:%M'), leg['arrival_time'].strftime('%Y-%m-%d %H:%M'),
+                    self.duration(int((leg['arrival_time'] - leg['departure_time']).total_seconds() // 60)),
+                    f"{leg['price'] * seats:.2f}", leg['seats_left']))
+                self.legs[item] = leg
+        self.tree.bind("<Double-1>", lambda event: self.book_leg())
+
+        buttons = tk.Frame(self)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Book This Leg", command=self.book_leg).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Close", command=self.destroy).pack(side="left", padx=5)
+        self.transient(parent)
+
+    def duration(self, minutes):
+        return f"{minutes // 60}h {minutes % 60:02d}m"
+
+    def book_leg(self):
+        leg = self.legs.get(self.tree.focus())
+        if leg is None:
+            messagebox.showinfo("Connections", "Select one of the flights of an itinerary.", parent=self)
+            return
+        self.on_leg(leg)
 
 
 class BookFlightPage(tk.Frame):
@@ -337,8 +1246,17 @@ class BookFlightPage(tk.Frame):
         self.dest_entry = ttk.Entry(search_frame, width=20)
         self.dest_entry.grid(row=0, column=3, padx=5, pady=5)
 
-        # For simplicity, not adding date search, but it's important in a real system
+        tk.Label(search_frame, text="Date From:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.date_from_entry = ttk.Entry(search_frame, width=20)
+        self.date_from_entry.grid(row=1, column=1, padx=5, pady=5)
+
+        tk.Label(search_frame, text="Date To:").grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        self.date_to_entry = ttk.Entry(search_frame, width=20)
+        self.date_to_entry.grid(row=1, column=3, padx=5, pady=5)
+        tk.Label(search_frame, text="(YYYY-MM-DD, optional)").grid(row=1, column=4, padx=5, pady=5, sticky="w")
+
         ttk.Button(search_frame, text="Search Flights", command=self.search_flights).grid(row=0, column=4, padx=10, pady=5)
+        ttk.Button(search_frame, text="Find Connections", command=self.find_connections).grid(row=0, column=5, padx=10, pady=5)
 
         # Flights Display Frame (using Treeview)
         flights_frame = ttk.LabelFrame(self, text="Available Flights")
@@ -353,7 +1271,8 @@ class BookFlightPage(tk.Frame):
 
         scrollbar = ttk.Scrollbar(flights_frame, orient="vertical", command=self.flights_tree.yview)
         scrollbar.pack(side="right", fill="y")
-        self.flights_tree.configure(yscrollcommand=scrollbar.set)
+        self.flights_view = VirtualTreeview(self, self.flights_tree, scrollbar, FLIGHT_ORDER, flight_row_key,
+                                            self.flight_values, lambda flight: flight['flight_id'])
 
         self.flights_tree.bind("<<TreeviewSelect>>", self.on_flight_select)
 
@@ -384,82 +1303,134 @@ class BookFlightPage(tk.Frame):
         self.food_combo = ttk.Combobox(passenger_frame, textvariable=self.food_var, width=25, state="readonly")
         self.food_combo.grid(row=2, column=1, columnspan=3, padx=5, pady=5, sticky="ew")
 
+        # Group booking: passengers added here are booked together on one booking
+        ttk.Button(passenger_frame, text="Add Passenger", command=self.add_passenger).grid(row=0, column=4, padx=10, pady=5)
+        ttk.Button(passenger_frame, text="Remove", command=self.remove_passenger).grid(row=1, column=4, padx=10, pady=5)
+        ttk.Button(passenger_frame, text="Choose Seats...", command=self.choose_seats).grid(row=2, column=4, padx=10, pady=5)
+        group_cols = ("Name", "Age", "Gender", "Class", "Seat", "Food")
+        self.group_tree = ttk.Treeview(passenger_frame, columns=group_cols, show='headings', height=3, selectmode="browse")
+        for col in group_cols:
+            self.group_tree.heading(col, text=col)
+            self.group_tree.column(col, width=90, anchor="w")
+        self.group_tree.grid(row=0, column=5, rowspan=3, padx=5, pady=5, sticky="nsew")
+        self.group = [] # Passenger dicts, in the order of group_tree
+
         # Action Buttons Frame
         action_frame = tk.Frame(self)
         action_frame.pack(pady=10)
-        ttk.Button(action_frame, text="Confirm Booking", command=self.confirm_booking, style="Accent.TButton").pack(side="left", padx=10)
+        self.confirm_button = ttk.Button(action_frame, text="Confirm Booking", command=self.confirm_booking, style="Accent.TButton")
+        self.confirm_button.pack(side="left", padx=10)
         ttk.Button(action_frame, text="Back to Dashboard", command=lambda: controller.show_frame("UserDashboardPage")).pack(side="left", padx=10)
 
     def on_show(self, data=None): # Refresh data when page is shown
-        self.food_options_map = self.controller.get_food_options()
-        self.food_combo['values'] = ["No Preference"] + list(self.food_options_map.keys())
+        self.food_combo['values'] = ["No Preference"]
         self.food_var.set("No Preference")
-        self.search_flights() # Load all flights initially
-        self.name_entry.delete(0, tk.END)
-        self.age_entry.delete(0, tk.END)
+        self.controller.load_food_options(self)
+        if self.flights_view.fetch_page:
+            self.flights_view.refresh() # Patch seat counts that changed while away
+        else:
+            self.search_flights() # Load all flights initially
+        self.clear_passengers()
         self.selected_flight_id = None
         self.selected_flight_details = None
 
+    def set_food_options(self, food_options_map):
+        self.food_options_map = food_options_map
+        self.food_combo['values'] = ["No Preference"] + list(self.food_options_map.keys())
+
     def search_flights(self):
-        for item in self.flights_tree.get_children(): # Clear previous results
-            self.flights_tree.delete(item)
+        origin = self.origin_entry.get().strip()
+        destination = self.dest_entry.get().strip()
+        try:
+            date_from = self.parse_date(self.date_from_entry.get())
+            date_to = self.parse_date(self.date_to_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date. Use the format YYYY-MM-DD.")
+            return
+        if date_from and date_to and date_from > date_to:
+            messagebox.showerror("Error", "'Date From' must not be after 'Date To'.")
+            return
 
+        service = self.controller.service
+        def fetch_page(after, limit, backward): # Runs on the DB worker
+            return service.search_flights(origin, destination, date_from, date_to, after, backward, limit)
+        def fetch_changes(since):
+            return service.search_flights(origin, destination, date_from, date_to, changed_since=since)
+        self.flights_view.reset(fetch_page, fetch_changes, on_empty=self.on_no_flights) # Clears previous results
+
+    def find_connections(self):
+        # Direct and connecting itineraries (see itineraries.py) with seats for everyone
+        # listed in the class picked in the form (at least one)
         origin = self.origin_entry.get().strip()
         destination = self.dest_entry.get().strip()
+        if not origin or not destination:
+            messagebox.showerror("Error", "Enter both From and To to find connections.")
+            return
+        try:
+            date_from = self.parse_date(self.date_from_entry.get())
+            date_to = self.parse_date(self.date_to_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid date. Use the format YYYY-MM-DD.")
+            return
+        seat_class = self.class_var.get()
+        seats = max(1, sum(1 for p in self.group if p['seat_class'] == seat_class))
+        def show(itineraries):
+            if not itineraries:
+                messagebox.showinfo("No Connections", "No direct or connecting flights found matching your criteria.")
+                return
+            ItineraryWindow(self, itineraries, seats, self.show_leg)
+        self.controller.run_async(self, self.controller.service.search_itineraries, origin, destination, date_from,
+                                  date_to, seats, seat_class, on_done=show,
+                                  on_error=lambda err: messagebox.showerror("Error", describe_error(err)),
+                                  key="connections", loading="Finding connections...")
+
+    def show_leg(self, leg):
+        # Search for one flight of an itinerary so it can be selected and booked
+        day = leg['departure_time'].strftime('%Y-%m-%d')
+        for entry, text in ((self.origin_entry, leg['origin']), (self.dest_entry, leg['destination']),
+                            (self.date_from_entry, day), (self.date_to_entry, day)):
+            entry.delete(0, tk.END)
+            entry.insert(0, text)
+        self.search_flights()
+
+    def parse_date(self, text):
+        text = text.strip()
+        return datetime.strptime(text, '%Y-%m-%d').date() if text else None
+
+    def flight_values(self, flight):
+        return (
+            flight['flight_number'], flight['origin'], flight['destination'],
+            flight['departure_time'].strftime('%Y-%m-%d %H:%M'),
+            flight['arrival_time'].strftime('%Y-%m-%d %H:%M'),
+            f"{flight['economy_price']:.2f}", f"{flight['business_price']:.2f}",
+            flight['eco_avail'], flight['biz_avail']
+        )
 
-        query = """
-        SELECT flight_id, flight_number, origin, destination, departure_time, arrival_time,
-               economy_price, business_price,
-               (economy_seats_total - economy_seats_booked) AS eco_avail,
-               (business_seats_total - business_seats_booked) AS biz_avail
-        FROM flights
-        WHERE (economy_seats_total - economy_seats_booked) > 0 OR (business_seats_total - business_seats_booked) > 0
-        """ # Only show flights with available seats
-        params = []
-        if origin:
-            query += " AND origin LIKE %s"
-            params.append(f"%{origin}%")
-        if destination:
-            query += " AND destination LIKE %s"
-            params.append(f"%{destination}%")
-
-        query += " ORDER BY departure_time"
-
-        flights = fetch_all(query, tuple(params))
-        if flights:
-            for flight in flights:
-                self.flights_tree.insert("", "end", iid=flight['flight_id'], values=(
-                    flight['flight_number'], flight['origin'], flight['destination'],
-                    flight['departure_time'].strftime('%Y-%m-%d %H:%M'),
-                    flight['arrival_time'].strftime('%Y-%m-%d %H:%M'),
-                    f"{flight['economy_price']:.2f}", f"{flight['business_price']:.2f}",
-                    flight['eco_avail'], flight['biz_avail']
-                ))
-        else:
-            messagebox.showinfo("No Flights", "No flights found matching your criteria.")
+    def on_no_flights(self):
+        messagebox.showinfo("No Flights", "No flights found matching your criteria.")
 
     def on_flight_select(self, event):
         selected_item = self.flights_tree.focus() # Get selected item's IID
-        if selected_item:
+        if selected_item and selected_item != VirtualTreeview.PLACEHOLDER:
+            if int(selected_item) != self.selected_flight_id:
+                self.clear_seats() # Seats picked were on the previous flight
             self.selected_flight_id = int(selected_item) # IID is flight_id
-            # Fetch full flight details to use for booking if needed (e.g. prices)
-            self.selected_flight_details = fetch_one("SELECT * FROM flights WHERE flight_id = %s", (self.selected_flight_id,))
+            self.selected_flight_details = None
+            # Versioned snapshot from the service's seat availability cache; the booking is
+            # checked against its version, so prices shown are the prices charged
+            self.controller.run_async(self, self.controller.service.flight, self.selected_flight_id,
+                                      on_done=self.set_flight_details, on_error=lambda err: None,
+                                      key="select", loading="Loading flight details...")
 
+    def set_flight_details(self, flight):
+        if flight and flight['flight_id'] == self.selected_flight_id: # Ignore if selection moved on
+            self.selected_flight_details = flight
 
-    def confirm_booking(self):
-        if not CURRENT_USER:
-            messagebox.showerror("Error", "You must be logged in to book.")
-            self.controller.show_frame("LoginPage")
-            return
-
-        if not self.selected_flight_id or not self.selected_flight_details:
-            messagebox.showerror("Error", "Please select a flight first.")
-            return
 
+    def read_passenger(self):
+        # Passenger dict from the form, or None (after telling the user) if invalid
         name = self.name_entry.get().strip()
         age_str = self.age_entry.get().strip()
-        gender = self.gender_var.get()
-        seat_class = self.class_var.get()
         food_pref_display = self.food_var.get()
 
         food_id = None
@@ -468,76 +1439,154 @@ class BookFlightPage(tk.Frame):
 
         if not name or not age_str:
             messagebox.showerror("Error", "Passenger name and age are required.")
-            return
+            return None
         try:
             age = int(age_str)
             if age <= 0: raise ValueError("Age must be positive")
         except ValueError:
             messagebox.showerror("Error", "Invalid age.")
+            return None
+        return {'passenger_name': name, 'age': age, 'gender': self.gender_var.get(), 'seat_class': self.class_var.get(),
+                'food_id': food_id, 'food_label': food_pref_display}
+
+    def add_passenger(self):
+        if len(self.group) >= MAX_GROUP_SIZE:
+            messagebox.showerror("Error", f"At most {MAX_GROUP_SIZE} passengers per booking.")
             return
+        passenger = self.read_passenger()
+        if not passenger: return
+        self.group.append(passenger)
+        self.group_tree.insert("", "end", values=self.group_values(passenger))
+        self.name_entry.delete(0, tk.END)
+        self.age_entry.delete(0, tk.END)
 
-        # Determine price and check seat availability
-        price = 0
-        available_seats = 0
-        if seat_class == "Economy":
-            price = self.selected_flight_details['economy_price']
-            available_seats = self.selected_flight_details['economy_seats_total'] - self.selected_flight_details['economy_seats_booked']
-        elif seat_class == "Business":
-            price = self.selected_flight_details['business_price']
-            available_seats = self.selected_flight_details['business_seats_total'] - self.selected_flight_details['business_seats_booked']
+    def group_values(self, passenger):
+        return (passenger['passenger_name'], passenger['age'], passenger['gender'], passenger['seat_class'],
+                passenger.get('seat') or "Any", passenger['food_label'])
 
-        if available_seats <= 0:
-            messagebox.showerror("Sold Out", f"Sorry, {seat_class} class is sold out for this flight.")
+    def choose_seats(self):
+        # Seat map of the class picked in the form, for the listed passengers of that class
+        if not self.selected_flight_id:
+            messagebox.showerror("Error", "Please select a flight first.")
             return
+        seat_class = self.class_var.get()
+        passengers = [p for p in self.group if p['seat_class'] == seat_class]
+        if not passengers:
+            messagebox.showinfo("Choose Seats", f"Add the {seat_class} passengers with 'Add Passenger' first.")
+            return
+        flight_id = self.selected_flight_id
+        def open_picker(data):
+            if flight_id != self.selected_flight_id: # Selection moved on while loading
+                return
+            seat_map = SeatMap.from_dict(data['seat_maps'][seat_class])
+            SeatPicker(self, seat_map, len(passengers), [p.get('seat') for p in passengers],
+                       lambda labels: self.set_seats(passengers, labels))
+        self.controller.run_async(self, self.controller.service.seat_map, flight_id, on_done=open_picker,
+                                  on_error=lambda err: messagebox.showerror("Error", describe_error(err)),
+                                  key="seats", loading="Loading seat map...")
+
+    def set_seats(self, passengers, labels):
+        for i, passenger in enumerate(passengers):
+            passenger['seat'] = labels[i] if i < len(labels) else None
+        self.refresh_group()
+
+    def clear_seats(self):
+        for passenger in self.group:
+            passenger['seat'] = None
+        self.refresh_group()
+
+    def refresh_group(self):
+        for item, passenger in zip(self.group_tree.get_children(), self.group):
+            self.group_tree.item(item, values=self.group_values(passenger))
+
+    def remove_passenger(self):
+        selected_item = self.group_tree.focus()
+        if not selected_item: return
+        del self.group[self.group_tree.index(selected_item)]
+        self.group_tree.delete(selected_item)
+
+    def clear_passengers(self):
+        self.name_entry.delete(0, tk.END)
+        self.age_entry.delete(0, tk.END)
+        self.group = []
+        self.group_tree.delete(*self.group_tree.get_children())
 
-        # Create Booking
-        booking_success, booking_id = execute_query(
-            "INSERT INTO bookings (user_id, flight_id, total_amount) VALUES (%s, %s, %s)",
-            (CURRENT_USER['user_id'], self.selected_flight_id, price)
-        )
-
-        if not booking_success or not booking_id:
-            messagebox.showerror("Booking Error", "Failed to create booking record.")
+    def confirm_booking(self):
+        if not self.controller.session:
+            messagebox.showerror("Error", "You must be logged in to book.")
+            self.controller.show_frame("LoginPage")
             return
 
-        # Add Passenger
-        passenger_success, _ = execute_query(
-            "INSERT INTO passengers (booking_id, passenger_name, age, gender, seat_class, food_preference_id) VALUES (%s, %s, %s, %s, %s, %s)",
-            (booking_id, name, age, gender, seat_class, food_id)
-        )
+        if not self.selected_flight_id:
+            messagebox.showerror("Error", "Please select a flight first.")
+            return
 
-        if not passenger_success:
-            # Rollback booking (simple delete for this example, transaction preferred)
-            execute_query("DELETE FROM bookings WHERE booking_id = %s", (booking_id,))
-            messagebox.showerror("Booking Error", "Failed to add passenger. Booking cancelled.")
+        # Everyone in the list, or just the form if nobody was added
+        passengers = list(self.group)
+        if not passengers or self.name_entry.get().strip():
+            passenger = self.read_passenger()
+            if not passenger: return
+            passengers.append(passenger)
+        if len(passengers) > MAX_GROUP_SIZE:
+            messagebox.showerror("Error", f"At most {MAX_GROUP_SIZE} passengers per booking.")
             return
 
-        # Update flight seat count
-        seat_update_column = "economy_seats_booked" if seat_class == "Economy" else "business_seats_booked"
-        update_flight_success, _ = execute_query(
-            f"UPDATE flights SET {seat_update_column} = {seat_update_column} + 1 WHERE flight_id = %s",
-            (self.selected_flight_id,)
+        # Seat check, reservation and inserts for the whole group happen atomically in the booking engine
+        self.confirm_button.config(state="disabled") # No double submits while the booking runs
+        labels = [p['food_label'] for p in passengers]
+        details = self.selected_flight_details
+        expected_version = details['version'] if details and details['flight_id'] == self.selected_flight_id else None
+        self.controller.run_async(
+            self, self.controller.service.book, self.controller.session, self.selected_flight_id,
+            [{key: p.get(key) for key in ('passenger_name', 'age', 'gender', 'seat_class', 'food_id', 'seat')} for p in passengers],
+            expected_version,
+            on_done=lambda booking: self.on_booking_done(booking, labels),
+            on_error=self.on_booking_error, key="book", loading="Booking...", keep=True
         )
 
-        if not update_flight_success:
-            # This is a critical error. Data inconsistency.
-            # In a real system, you'd have more robust transaction handling.
-            messagebox.showerror("Critical Error", "Failed to update flight seat count. Contact support.")
-            # Consider trying to rollback passenger and booking here too.
-            return
+    def on_booking_error(self, err):
+        self.confirm_button.config(state="normal")
+        if isinstance(err, StaleFlightError):
+            flight = getattr(err, 'flight', None)
+            if flight:
+                self.set_flight_details(flight)
+                messagebox.showwarning("Flight Changed", f"{err}\n\n"
+                    f"Now: Economy INR {flight['economy_price']:.2f}, Business INR {flight['business_price']:.2f}, "
+                    f"departs {flight['departure_time'].strftime('%Y-%m-%d %H:%M')}.\n"
+                    "Please review and confirm the booking again.")
+            else:
+                messagebox.showwarning("Flight Changed", f"{err}\nPlease select the flight again.")
+            self.flights_view.refresh()
+        elif isinstance(err, SeatTakenError):
+            messagebox.showerror("Seat Taken", str(err))
+            self.clear_seats()
+        elif isinstance(err, SoldOutError):
+            messagebox.showerror("Sold Out", str(err))
+            self.flights_view.refresh() # Seat counts on screen are stale
+        elif isinstance(err, (BookingError, ServiceError) + DB_ERRORS):
+            messagebox.showerror("Booking Error", f"Booking failed, nothing was charged: {err}")
+        else:
+            messagebox.showerror("Booking Error", describe_error(err))
+
+    def on_booking_done(self, booking, food_labels):
+        self.confirm_button.config(state="normal")
+        booking_id = booking['booking_id']
+        passenger_lines = "\n".join(
+            f"        {p['passenger_name']} ({p['seat_class']}, Seat {p['seat_number'] or '-'}, Food: {label if label != 'No Preference' else 'None'}): INR {p['price']:.2f}"
+            for p, label in zip(booking['passengers'], food_labels)
+        )
 
         # --- Invoice Generation (Simple Message Box) ---
         invoice_details = f"""
         --- FLIGHT BOOKING INVOICE ---
         Booking ID: {booking_id}
-        Passenger Name: {name}
-        Flight Number: {self.selected_flight_details['flight_number']}
-        From: {self.selected_flight_details['origin']} To: {self.selected_flight_details['destination']}
-        Departure: {self.selected_flight_details['departure_time'].strftime('%Y-%m-%d %H:%M')}
-        Class: {seat_class}
-        Food: {food_pref_display if food_pref_display != "No Preference" else "None"}
+        Flight Number: {booking['flight_number']}
+        From: {booking['origin']} To: {booking['destination']}
+        Departure: {booking['departure_time'].strftime('%Y-%m-%d %H:%M')}
+        Passengers:
+{passenger_lines}
         ---------------------------------
-        Total Amount: INR {price:.2f}
+        Total Amount: INR {booking['total_amount']:.2f}
         Payment Status: PAID (Simulated)
         ---------------------------------
         Thank you for booking with us!
@@ -546,11 +1595,10 @@ class BookFlightPage(tk.Frame):
         print(invoice_details) # Also print to console
 
         # Reset form and refresh flights
-        self.name_entry.delete(0, tk.END)
-        self.age_entry.delete(0, tk.END)
+        self.clear_passengers()
         self.selected_flight_id = None
         self.selected_flight_details = None
-        self.search_flights() # Refresh flight list (to show updated seat counts)
+        self.flights_view.refresh() # Patch only the rows whose seat counts changed
 
 
 class ViewAvailableFlightsPage(tk.Frame):
@@ -574,45 +1622,42 @@ class ViewAvailableFlightsPage(tk.Frame):
 
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.flights_tree.yview)
         scrollbar.pack(side="right", fill="y")
-        self.flights_tree.configure(yscrollcommand=scrollbar.set)
+        self.flights_view = VirtualTreeview(self, self.flights_tree, scrollbar, FLIGHT_ORDER, flight_row_key,
+                                            self.flight_values, lambda flight: flight['flight_id'])
 
-        ttk.Button(self, text="Refresh", command=self.load_flights).pack(pady=5)
+        ttk.Button(self, text="Refresh", command=self.flights_view.refresh).pack(pady=5)
         ttk.Button(self, text="Back to Dashboard", command=lambda: controller.show_frame("UserDashboardPage")).pack(pady=10)
 
     def on_show(self, data=None):
-        self.load_flights()
+        if self.flights_view.fetch_page:
+            self.flights_view.refresh()
+        else:
+            self.load_flights()
 
     def load_flights(self):
-        for item in self.flights_tree.get_children():
-            self.flights_tree.delete(item)
-
-        query = """
-        SELECT flight_number, origin, destination, departure_time, arrival_time, aircraft_name,
-               (economy_seats_total - economy_seats_booked) AS eco_available,
-               (business_seats_total - business_seats_booked) AS biz_available
-        FROM flights
-        WHERE departure_time > NOW()
-        ORDER BY departure_time;
-        """
-        flights_data = fetch_all(query)
-
-        if flights_data:
-            for flight in flights_data:
-                self.flights_tree.insert("", "end", values=(
-                    flight['flight_number'], flight['origin'], flight['destination'],
-                    flight['departure_time'].strftime('%Y-%m-%d %H:%M'),
-                    flight['arrival_time'].strftime('%Y-%m-%d %H:%M'),
-                    flight['aircraft_name'],
-                    flight['eco_available'], flight['biz_available']
-                ))
-        else:
-            self.flights_tree.insert("", "end", values=("No upcoming flights found.", "", "", "", "", "", "", ""))
+        service = self.controller.service
+        def fetch_page(after, limit, backward): # Runs on the DB worker
+            return service.upcoming_flights(after, backward, limit)
+        def fetch_changes(since):
+            return service.upcoming_flights(changed_since=since)
+        self.flights_view.reset(fetch_page, fetch_changes, on_empty=lambda: self.flights_view.show_placeholder(("No upcoming flights found.",)),
+                                expired=lambda key, now: key[0] <= now) # departure_time > NOW() no longer holds
+
+    def flight_values(self, flight):
+        return (
+            flight['flight_number'], flight['origin'], flight['destination'],
+            flight['departure_time'].strftime('%Y-%m-%d %H:%M'),
+            flight['arrival_time'].strftime('%Y-%m-%d %H:%M'),
+            flight['aircraft_name'],
+            flight['eco_available'], flight['biz_available']
+        )
 
 
 class ViewMyTicketsPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
+        self.loaded_user_id = None
 
         tk.Label(self, text="My Booked Tickets", font=("Arial", 18, "bold")).pack(pady=10)
 
@@ -620,7 +1665,7 @@ class ViewMyTicketsPage(tk.Frame):
         tree_frame = tk.Frame(self)
         tree_frame.pack(pady=10, padx=10, fill="both", expand=True)
 
-        cols = ("Booking ID", "Flight No", "Origin", "Dest.", "Departure", "Passenger", "Age", "Class", "Food", "Status", "Total Amt")
+        cols = ("Booking ID", "Flight No", "Origin", "Dest.", "Departure", "Passenger", "Age", "Class", "Seat", "Food", "Status", "Total Amt")
         self.tickets_tree = ttk.Treeview(tree_frame, columns=cols, show='headings')
         for col in cols:
             self.tickets_tree.heading(col, text=col)
@@ -628,60 +1673,45 @@ class ViewMyTicketsPage(tk.Frame):
 
         self.tickets_tree.column("Departure", width=140)
         self.tickets_tree.column("Total Amt", width=80, anchor="e")
+        self.tickets_tree.column("Seat", width=50)
 
         self.tickets_tree.pack(side="left", fill="both", expand=True)
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tickets_tree.yview)
         scrollbar.pack(side="right", fill="y")
-        self.tickets_tree.configure(yscrollcommand=scrollbar.set)
+        self.tickets_view = VirtualTreeview(self, self.tickets_tree, scrollbar, TICKET_ORDER, ticket_row_key,
+                                            self.ticket_values, lambda ticket: ticket['passenger_id']) # One row per passenger
 
-        ttk.Button(self, text="Refresh", command=self.load_my_tickets).pack(pady=5)
+        ttk.Button(self, text="Refresh", command=self.tickets_view.refresh).pack(pady=5)
         ttk.Button(self, text="Back to Dashboard", command=lambda: controller.show_frame("UserDashboardPage")).pack(pady=10)
 
     def on_show(self, data=None):
-        if not CURRENT_USER:
+        if not self.controller.session:
             self.controller.show_frame("LoginPage")
             return
-        self.load_my_tickets()
+        if self.loaded_user_id == self.controller.get_current_user_id():
+            self.tickets_view.refresh()
+        else:
+            self.load_my_tickets()
 
     def load_my_tickets(self):
-        for item in self.tickets_tree.get_children():
-            self.tickets_tree.delete(item)
-
-        user_id = self.controller.get_current_user_id()
-        if not user_id: return
-
-        query = """
-        SELECT
-            b.booking_id,
-            f.flight_number,
-            f.origin,
-            f.destination,
-            f.departure_time,
-            p.passenger_name,
-            p.age,
-            p.seat_class,
-            COALESCE(fi.item_name, 'None') AS food_preference,
-            b.status,
-            b.total_amount
-        FROM bookings b
-        JOIN flights f ON b.flight_id = f.flight_id
-        JOIN passengers p ON b.booking_id = p.booking_id
-        LEFT JOIN food_items fi ON p.food_preference_id = fi.food_id
-        WHERE b.user_id = %s
-        ORDER BY f.departure_time DESC, b.booking_id;
-        """
-        tickets = fetch_all(query, (user_id,))
-
-        if tickets:
-            for ticket in tickets:
-                self.tickets_tree.insert("", "end", iid=ticket['booking_id'], values=( # Use booking_id as iid
-                    ticket['booking_id'], ticket['flight_number'], ticket['origin'], ticket['destination'],
-                    ticket['departure_time'].strftime('%Y-%m-%d %H:%M'),
-                    ticket['passenger_name'], ticket['age'], ticket['seat_class'],
-                    ticket['food_preference'], ticket['status'], f"{ticket['total_amount']:.2f}"
-                ))
-        else:
-            self.tickets_tree.insert("", "end", values=("No tickets booked yet.", "", "", "", "", "", "", "", "", "", ""))
+        session = self.controller.session
+        if not session: return
+
+        service = self.controller.service
+        def fetch_page(after, limit, backward): # Runs on the DB worker
+            return service.my_tickets(session, after, backward, limit)
+        def fetch_changes(since):
+            return service.my_tickets(session, changed_since=since)
+        self.loaded_user_id = session.user_id
+        self.tickets_view.reset(fetch_page, fetch_changes, on_empty=lambda: self.tickets_view.show_placeholder(("No tickets booked yet.",)))
+
+    def ticket_values(self, ticket):
+        return (
+            ticket['booking_id'], ticket['flight_number'], ticket['origin'], ticket['destination'],
+            ticket['departure_time'].strftime('%Y-%m-%d %H:%M'),
+            ticket['passenger_name'], ticket['age'], ticket['seat_class'], ticket['seat_number'] or "-",
+            ticket['food_preference'], ticket['status'], f"{ticket['total_amount']:.2f}"
+        )
 
 
 class EditTicketPage(tk.Frame):
@@ -689,6 +1719,8 @@ class EditTicketPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
         self.current_booking_id_to_edit = None
+        self.current_passenger_id_to_edit = None
+        self.booking_passengers = [] # Passengers of the fetched booking
         self.food_options_map = {}
 
         tk.Label(self, text="Edit / Cancel Ticket", font=("Arial", 18, "bold")).pack(pady=10)
@@ -706,9 +1738,11 @@ class EditTicketPage(tk.Frame):
         self.details_frame = ttk.LabelFrame(self, text="Booking Details (Passenger Specific)")
         # self.details_frame.pack(padx=10, pady=10, fill="x") # Pack when details are loaded
 
-        tk.Label(self.details_frame, text="Passenger Name:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        self.name_label = tk.Label(self.details_frame, text="-", width=25, anchor="w") # Display only
-        self.name_label.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        tk.Label(self.details_frame, text="Passenger:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.passenger_var = tk.StringVar(value="-")
+        self.passenger_combo = ttk.Combobox(self.details_frame, textvariable=self.passenger_var, width=25, state="disabled")
+        self.passenger_combo.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        self.passenger_combo.bind("<<ComboboxSelected>>", self.on_passenger_select)
 
         tk.Label(self.details_frame, text="Flight:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
         self.flight_label = tk.Label(self.details_frame, text="-", width=25, anchor="w") # Display only
@@ -733,23 +1767,30 @@ class EditTicketPage(tk.Frame):
         ttk.Button(self, text="Back to Dashboard", command=lambda: controller.show_frame("UserDashboardPage")).pack(pady=20, side="bottom")
 
     def on_show(self, data=None):
-        if not CURRENT_USER:
+        if not self.controller.session:
             self.controller.show_frame("LoginPage")
             return
-        self.food_options_map = self.controller.get_food_options()
-        self.food_combo['values'] = ["No Preference"] + list(self.food_options_map.keys())
+        self.food_combo['values'] = ["No Preference"]
         self.food_var.set("No Preference")
         self.reset_form()
+        self.controller.load_food_options(self)
+
+    def set_food_options(self, food_options_map):
+        self.food_options_map = food_options_map
+        self.food_combo['values'] = ["No Preference"] + list(self.food_options_map.keys())
 
     def reset_form(self):
         self.booking_id_entry.delete(0, tk.END)
-        self.name_label.config(text="-")
+        self.passenger_var.set("-")
+        self.passenger_combo.config(state="disabled", values=[])
+        self.booking_passengers = []
         self.flight_label.config(text="-")
         self.food_var.set("No Preference")
         self.food_combo.config(state="disabled")
         self.update_button.config(state="disabled")
         self.cancel_button.config(state="disabled")
         self.current_booking_id_to_edit = None
+        self.current_passenger_id_to_edit = None
         self.details_frame.pack_forget() # Hide frames
         self.action_button_frame.pack_forget()
 
@@ -764,46 +1805,30 @@ class EditTicketPage(tk.Frame):
         self.reset_form()  # Safe to reset now after getting the input
 
         booking_id = int(booking_id_str)
-        user_id = self.controller.get_current_user_id()
-
-        query = """
-        SELECT
-            p.passenger_id, p.passenger_name, p.food_preference_id,
-            f.flight_number, f.origin, f.destination,
-            b.status
-        FROM passengers p
-        JOIN bookings b ON p.booking_id = b.booking_id
-        JOIN flights f ON b.flight_id = f.flight_id
-        WHERE p.booking_id = %s AND b.user_id = %s;
-        """
-        passenger_details = fetch_one(query, (booking_id, user_id))
+        self.controller.run_async(self, self.controller.service.booking_details, self.controller.session, booking_id,
+                                  on_done=lambda details: self.show_booking_details(booking_id, details),
+                                  on_error=self.on_fetch_error, key="fetch", loading="Fetching booking...")
+
+    def on_fetch_error(self, err):
+        messagebox.showerror("Not Found" if isinstance(err, ServiceError) else "Error", describe_error(err))
+        self.reset_form()
+
+    def show_booking_details(self, booking_id, details):
+        if details:
+            self.booking_passengers = details['passengers']
+            self.passenger_combo['values'] = [self.passenger_label(p) for p in self.booking_passengers]
+            self.flight_label.config(text=f"{details['flight_number']} ({details['origin']}-{details['destination']})")
+            self.select_passenger(0)
+            self.details_frame.pack(padx=10, pady=10, fill="x")
 
-        if passenger_details:
-            if passenger_details['status'] == 'Cancelled':
+            if details['status'] == 'Cancelled':
                 messagebox.showinfo("Info", f"Booking ID {booking_id} is already cancelled.")
-                self.name_label.config(text=passenger_details['passenger_name'])
-                self.flight_label.config(text=f"{passenger_details['flight_number']} ({passenger_details['origin']}-{passenger_details['destination']})")
-                self.details_frame.pack(padx=10, pady=10, fill="x")
                 return
 
             self.current_booking_id_to_edit = booking_id
-            self.current_passenger_id_to_edit = passenger_details['passenger_id']
-
-            self.details_frame.pack(padx=10, pady=10, fill="x")
             self.action_button_frame.pack(pady=10)
 
-            self.name_label.config(text=passenger_details['passenger_name'])
-            self.flight_label.config(text=f"{passenger_details['flight_number']} ({passenger_details['origin']}-{passenger_details['destination']})")
-
-            current_food_id = passenger_details['food_preference_id']
-            current_food_name = "No Preference"
-            if current_food_id:
-                for name, id_val in self.food_options_map.items():
-                    if id_val == current_food_id:
-                        current_food_name = name
-                        break
-            self.food_var.set(current_food_name)
-
+            self.passenger_combo.config(state="readonly")
             self.food_combo.config(state="readonly")
             self.update_button.config(state="normal")
             self.cancel_button.config(state="normal")
@@ -811,6 +1836,21 @@ class EditTicketPage(tk.Frame):
             messagebox.showerror("Not Found", "Booking ID not found or does not belong to you.")
             self.reset_form()
 
+    def passenger_label(self, passenger):
+        seat = f", Seat {passenger['seat_number']}" if passenger.get('seat_number') else ""
+        return f"{passenger['passenger_name']} ({passenger['seat_class']}{seat})"
+
+    def select_passenger(self, index):
+        passenger = self.booking_passengers[index]
+        self.current_passenger_id_to_edit = passenger['passenger_id']
+        self.passenger_combo.current(index)
+        self.food_var.set(passenger['food_label'])
+
+    def on_passenger_select(self, event):
+        index = self.passenger_combo.current()
+        if index >= 0:
+            self.select_passenger(index)
+
     def update_food_preference(self):
         if not self.current_passenger_id_to_edit: return
 
@@ -819,81 +1859,78 @@ class EditTicketPage(tk.Frame):
         if new_food_display != "No Preference":
             new_food_id = self.food_options_map.get(new_food_display)
 
-        success, _ = execute_query(
-            "UPDATE passengers SET food_preference_id = %s WHERE passenger_id = %s",
-            (new_food_id, self.current_passenger_id_to_edit)
+        self.update_button.config(state="disabled")
+        self.controller.run_async(
+            self, self.controller.service.update_meal, self.controller.session, self.current_passenger_id_to_edit, new_food_id,
+            on_done=self.on_food_updated, on_error=self.on_food_update_error,
+            key="update", loading="Updating food preference...", keep=True
         )
-        if success:
-            messagebox.showinfo("Success", "Food preference updated successfully!")
-            self.reset_form()
-        else:
-            messagebox.showerror("Error", "Failed to update food preference.")
+
+    def on_food_updated(self, result):
+        messagebox.showinfo("Success", "Food preference updated successfully!")
+        self.reset_form()
+
+    def on_food_update_error(self, err):
+        self.update_button.config(state="normal")
+        messagebox.showerror("Error", f"Failed to update food preference. {describe_error(err)}")
 
     def cancel_ticket(self):
         if not self.current_booking_id_to_edit: return
 
-        if not messagebox.askyesno("Confirm Cancellation", "Are you sure you want to cancel this ticket? This action cannot be undone."):
+        count = len(self.booking_passengers)
+        scope = f"all {count} passengers on this booking" if count > 1 else "this ticket"
+        if not messagebox.askyesno("Confirm Cancellation", f"Are you sure you want to cancel {scope}? This action cannot be undone."):
             return
 
-        # Start a "transaction" manually (not true DB transaction here, but logical steps)
-        conn = get_db_connection()
-        if not conn: return
-        cursor = conn.cursor()
+        # Status update and seat release run in one DB transaction on the worker
+        self.cancel_button.config(state="disabled")
+        self.controller.run_async(
+            self, self.controller.service.cancel, self.controller.session, self.current_booking_id_to_edit,
+            on_done=self.on_ticket_cancelled, on_error=self.on_cancel_error,
+            key="cancel", loading="Cancelling ticket...", keep=True
+        )
 
-        try:
-            # 1. Get flight_id and seat_class for the booking to decrement seat count
-            cursor.execute("""
-                SELECT b.flight_id, p.seat_class
-                FROM bookings b
-                JOIN passengers p ON b.booking_id = p.booking_id
-                WHERE b.booking_id = %s LIMIT 1;
-            """, (self.current_booking_id_to_edit,)) # Assuming one passenger for simplicity
-            flight_info = cursor.fetchone()
-
-            if not flight_info:
-                raise Exception("Could not retrieve flight info for seat decrement.")
-
-            flight_id_to_update, seat_class_to_decrement = flight_info
-
-            # 2. Update booking status
-            cursor.execute("UPDATE bookings SET status = 'Cancelled' WHERE booking_id = %s", (self.current_booking_id_to_edit,))
-
-            # 3. Decrement booked seat count on the flight
-            # Note: This simple decrement assumes one passenger per booking ID for this operation.
-            # A more complex system would count passengers for the booking_id.
-            seat_column_to_decrement = "economy_seats_booked" if seat_class_to_decrement == "Economy" else "business_seats_booked"
-            cursor.execute(
-                f"UPDATE flights SET {seat_column_to_decrement} = GREATEST(0, {seat_column_to_decrement} - 1) WHERE flight_id = %s",
-                (flight_id_to_update,)
-            )
-
-            conn.commit()
-            messagebox.showinfo("Success", "Ticket cancelled successfully. Seat count updated.")
-            self.reset_form()
+    def on_ticket_cancelled(self, result):
+        messagebox.showinfo("Success", "Ticket cancelled successfully. Seat count updated.")
+        self.reset_form()
 
-        except mysql.connector.Error as err:
-            conn.rollback()
+    def on_cancel_error(self, err):
+        self.cancel_button.config(state="normal")
+        if isinstance(err, (BookingError, ServiceError) + DB_ERRORS):
             messagebox.showerror("Cancellation Error", f"Failed to cancel ticket: {err}")
-        except Exception as e:
-            conn.rollback()
-            messagebox.showerror("Cancellation Error", f"An unexpected error occurred: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+        else:
+            messagebox.showerror("Cancellation Error", describe_error(err))
+
+
+PAGES = {F.__name__: F for F in (LoginPage, SignupPage, UserDashboardPage, AdminDashboardPage, AnalyticsPage,
+                                 CancelFlightsPage, BookFlightPage, ViewAvailableFlightsPage, ViewMyTicketsPage, EditTicketPage)} # Add more frames here
 
 
 # --- App entry ---––--
 if __name__ == "__main__":
-    # Test DB Connection on startup
-    conn_test = get_db_connection()
-    if conn_test:
-        conn_test.close()
-        app = AirportApp()
-        app.mainloop()
-    else:
-        print("Failed to connect to the database. Application will not start.")
-        # Optionally, show a Tkinter root window with an error if GUI is partially initialized
-        root_err = tk.Tk()
-        root_err.withdraw() # Hide the main window
-        messagebox.showerror("Fatal Error", "Cannot connect to the database. Please check configuration and MySQL server.")
-        root_err.destroy()
+    parser = argparse.ArgumentParser(description="Airport Management System")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="print time to login screen and to database ready (JSON), then exit")
+    args = parser.parse_args()
+
+    app = AirportApp()
+
+    def on_backend_failure(err):
+        target = f"the API server at {API_URL}" if API_URL else "the database"
+        print(f"Cannot connect to {target}: {err}")
+        if args.startup_time:
+            return # Still reported, then closed, by report_when_done
+        messagebox.showerror("Fatal Error", "Cannot connect to the database. Please check configuration and the database server.")
+        app.on_close()
+
+    if args.startup_time:
+        def report_when_done():
+            if app.backend_ready is None or "first_paint" not in dict(app.startup_marks):
+                app.after(10, report_when_done)
+                return
+            print(json.dumps({name: round(seconds * 1000, 1) for name, seconds in app.startup_marks} | {'unit': "ms"}))
+            app.on_close()
+        app.wait_for_first_paint(report_when_done)
+
+    app.check_backend(on_backend_failure) # Login screen paints while this runs
+    app.mainloop()
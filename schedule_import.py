@@ -0,0 +1,319 @@
+# Flight schedule import: streams a CSV or JSON file of flights, validates each row
+# as it is read and upserts the good ones into flights on flight_number, one batched
+# transaction per IMPORT_BATCH_SIZE rows (INSERT ... ON DUPLICATE KEY UPDATE), so a
+# season's schedule of tens of thousands of rows loads in seconds and the file is
+# never held in memory. Rejected rows are counted, reported and optionally written
+# to a rejects file; the rest still load. A flight_number that already exists is
+# updated in place (its bookings, seat counters and status are kept) and one that
+# would not change is left alone, so re-running an import after fixing rejected rows
+# is safe and cheap.
+#
+#   python schedule_import.py schedule.csv
+#   python schedule_import.py schedule.json --engine sqlite --sqlite-path airport.db --rejects rejects.csv
+#
+# Columns (CSV header) or keys (JSON): flight_number, origin, destination,
+# departure_time, arrival_time, economy_price, business_price, and optionally
+# aircraft_name, economy_seats_total (default 100), business_seats_total (default 20;
+# at most database.MAX_CABIN_SEATS each).
+# Times as YYYY-MM-DD HH:MM[:SS]. A JSON file holds one array of objects or one
+# object per line (JSON Lines).
+#
+# In the GUI: Admin Panel -> "Import Schedule...".
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import database
+from database import get_pool, refresh_ticket_summaries, FLIGHT_CACHE, SEAT_COLUMNS, MAX_CABIN_SEATS, SeatMap
+
+IMPORT_BATCH_SIZE = 2000        # Rows per upsert transaction
+MAX_REPORTED_REJECTS = 100      # Rejected rows listed in the result (the rejects file gets all of them)
+JSON_READ_SIZE = 64 * 1024      # Characters read from a JSON file at a time
+MAX_JSON_RECORD = 1024 * 1024   # Longest JSON object accepted before the file is called malformed
+
+REQUIRED_FIELDS = ["flight_number", "origin", "destination", "departure_time", "arrival_time",
+                   "economy_price", "business_price"]
+OPTIONAL_FIELDS = {'aircraft_name': None, 'economy_seats_total': 100, 'business_seats_total': 20}
+SCHEDULE_COLUMNS = REQUIRED_FIELDS + list(OPTIONAL_FIELDS) # Order of the values parse_schedule_row returns
+# Flight fields shown on tickets: changing one re-derives the flight's ticket summaries
+SUMMARY_FIELDS = ["origin", "destination", "departure_time"]
+
+UPSERT_SQL = (f"INSERT INTO flights ({', '.join(SCHEDULE_COLUMNS)}) VALUES ({', '.join(['%s'] * len(SCHEDULE_COLUMNS))})"
+              " ON DUPLICATE KEY UPDATE " + ", ".join(f"{column} = VALUES({column})" for column in SCHEDULE_COLUMNS[1:]))
+
+
+def schedule_format(path):
+    return "csv" if os.path.splitext(path)[1].lower() == ".csv" else "json"
+
+def read_records(path, fmt=None):
+    # Yields (position, record): CSV line number or JSON record number, and the raw
+    # row dict. Raises ValueError if the file as a whole cannot be read.
+    with open(path, newline="", encoding="utf-8-sig") as source:
+        if (fmt or schedule_format(path)) == "csv":
+            reader = csv.DictReader(source)
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+            missing = [field for field in REQUIRED_FIELDS if field not in reader.fieldnames]
+            if missing:
+                raise ValueError(f"The CSV header lacks: {', '.join(missing)}")
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            yield from enumerate(iter_json_objects(source), start=1)
+
+def iter_json_objects(source, read_size=JSON_READ_SIZE):
+    # Values of a top-level JSON array, or of JSON Lines, decoded as the text streams in
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[]": # Separators between the objects
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                return
+            buffer, pos = source.read(read_size), 0
+            eof = not buffer
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as err:
+            if eof or len(buffer) - pos > MAX_JSON_RECORD:
+                raise ValueError(f"Malformed JSON: {err.msg}") from None
+            chunk = source.read(read_size) # Object continues past the buffer
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        yield value
+        pos = end
+
+
+def _text(record, field, max_length):
+    value = str(record.get(field) or "").strip()
+    if len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+def _datetime(record, field):
+    value = record[field]
+    try:
+        parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field} is not a date and time (YYYY-MM-DD HH:MM): {value!r}") from None
+    if parsed.tzinfo is not None: # Schedules are in local airport time, like the rest of the database
+        raise ValueError(f"{field} has a time zone: {value!r}")
+    return parsed
+
+def _money(record, field):
+    try:
+        value = Decimal(str(record[field]).strip())
+    except InvalidOperation:
+        raise ValueError(f"{field} is not a number: {record[field]!r}") from None
+    if not value.is_finite() or value < 0:
+        raise ValueError(f"{field} must be zero or more")
+    return value.quantize(Decimal("0.01"))
+
+def _count(record, field):
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        return OPTIONAL_FIELDS[field]
+    try:
+        count = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field} is not a whole number: {value!r}") from None
+    if count < 0:
+        raise ValueError(f"{field} must be zero or more")
+    if count > MAX_CABIN_SEATS:
+        raise ValueError(f"{field} is more than the {MAX_CABIN_SEATS} seats a cabin can have")
+    return count
+
+def parse_schedule_row(record):
+    # Column values in SCHEDULE_COLUMNS order from one CSV row or JSON object.
+    # ValueError says what is wrong with it.
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    if None in record: # csv.DictReader puts extra fields under None
+        raise ValueError("more fields than the header has columns")
+    for field in REQUIRED_FIELDS:
+        if record.get(field) is None or str(record[field]).strip() == "":
+            raise ValueError(f"{field} is required")
+    flight_number = _text(record, "flight_number", 20).upper()
+    origin = _text(record, "origin", 100)
+    destination = _text(record, "destination", 100)
+    if origin.lower() == destination.lower():
+        raise ValueError("origin and destination are the same")
+    departure = _datetime(record, "departure_time")
+    arrival = _datetime(record, "arrival_time")
+    if arrival <= departure:
+        raise ValueError("arrival_time is not after departure_time")
+    return (flight_number, origin, destination, departure, arrival,
+            _money(record, "economy_price"), _money(record, "business_price"),
+            _text(record, "aircraft_name", 100) or None,
+            _count(record, "economy_seats_total"), _count(record, "business_seats_total"))
+
+
+def seat_map_conflict(new, seat_maps):
+    # Why new capacities would strand seats already assigned on this flight's seat maps
+    # (seat_class -> SeatMap), or None. Seat numbers are stored on passengers and tickets,
+    # so a taken seat must stay inside its cabin and economy rows must not be renumbered.
+    for seat_class, seat_map in seat_maps.items():
+        last = seat_map.bits.bit_length() - 1
+        if last >= new[SEAT_COLUMNS[seat_class][1]]:
+            return f"{seat_class} seat {seat_map.label(last)} is taken; keep at least {last + 1} {seat_class} seats"
+    economy = seat_maps.get('Economy')
+    if economy is not None and economy.bits and SeatMap.for_flight(new, 'Economy').first_row != economy.first_row:
+        return "business cabin size change would renumber economy seats already assigned"
+    return None
+
+def upsert_batch(rows, reject):
+    # rows: flight_number -> (position, values). One transaction: lock the flights among
+    # them that already exist, reject those whose new capacity is below the seats already
+    # booked or would strand assigned seats (seat_map_conflict), skip those that would not
+    # change, upsert the rest with one batched statement and re-derive the ticket
+    # summaries of flights whose route or departure moved. Returns (inserted, updated, unchanged).
+    conn = get_pool().acquire()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        conn.start_transaction()
+        booked = ", ".join(booked_col for booked_col, _, _ in SEAT_COLUMNS.values())
+        cursor.execute(f"""SELECT flight_id, {', '.join(SCHEDULE_COLUMNS)}, {booked}
+            FROM flights WHERE flight_number IN ({', '.join(['%s'] * len(rows))}) FOR UPDATE""", tuple(rows))
+        existing = {row['flight_number'].upper(): row for row in cursor.fetchall()}
+        seat_maps = {} # flight_id -> {seat_class: SeatMap}; the flight row locks keep them still
+        if existing:
+            by_id = {row['flight_id']: row for row in existing.values()}
+            cursor.execute(f"""SELECT flight_id, seat_class, taken FROM seat_maps
+                WHERE flight_id IN ({', '.join(['%s'] * len(by_id))})""", tuple(by_id))
+            for row in cursor.fetchall():
+                seat_maps.setdefault(row['flight_id'], {})[row['seat_class']] = SeatMap.for_flight(
+                    by_id[row['flight_id']], row['seat_class'], bytes(row['taken']))
+        moved, unchanged = [], 0
+        for flight_number, current in existing.items():
+            position, values = rows[flight_number]
+            new = dict(zip(SCHEDULE_COLUMNS, values))
+            short = [(seat_class, current[booked_col]) for seat_class, (booked_col, total_col, _) in SEAT_COLUMNS.items()
+                     if new[total_col] < current[booked_col]]
+            conflict = seat_map_conflict(new, seat_maps.get(current['flight_id'], {}))
+            if short:
+                del rows[flight_number]
+                seat_class, count = short[0]
+                reject(position, f"{seat_class} seats below the {count} already booked", new)
+            elif conflict:
+                del rows[flight_number]
+                reject(position, conflict, new)
+            elif all(new[column] == current[column] for column in SCHEDULE_COLUMNS[1:]):
+                del rows[flight_number] # Same as stored: no write, no version bump
+                unchanged += 1
+            elif any(new[field] != current[field] for field in SUMMARY_FIELDS):
+                moved.append(current['flight_id'])
+        if rows:
+            cursor.executemany(UPSERT_SQL, [values for _, values in rows.values()]) # Sent as one multi-row statement
+        refresh_ticket_summaries(cursor, "flight_id", moved)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    updated = sum(1 for flight_number in existing if flight_number in rows)
+    return len(rows) - updated, updated, unchanged
+
+def import_schedule(path, fmt=None, batch_size=IMPORT_BATCH_SIZE, progress=None, cancel_event=None, rejects_path=None):
+    # Imports a schedule file ("csv" or "json"; by default from the extension). Batches
+    # already committed stay if it is cancelled or fails part way.
+    # progress(rows_read, rows_per_sec, rejected) is called after every batch (on the calling thread).
+    # rejects_path: CSV of every rejected row (position, error, record), created on the first one.
+    # Returns {'rows', 'inserted', 'updated', 'unchanged', 'rejected', 'rejects', 'seconds', 'rows_per_sec',
+    # 'cancelled', 'rejects_path'}; rejects lists the first MAX_REPORTED_REJECTS as (position, error).
+    started = time.perf_counter()
+    result = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0, 'rejects': [],
+              'cancelled': False, 'rejects_path': None}
+    rejects_file = rejects_writer = None
+
+    def reject(position, error, record):
+        nonlocal rejects_file, rejects_writer
+        result['rejected'] += 1
+        if len(result['rejects']) < MAX_REPORTED_REJECTS:
+            result['rejects'].append((position, error))
+        if rejects_path:
+            if rejects_writer is None:
+                rejects_file = open(rejects_path, "w", newline="", encoding="utf-8")
+                rejects_writer = csv.writer(rejects_file)
+                rejects_writer.writerow(["position", "error", "record"])
+                result['rejects_path'] = rejects_path
+            rejects_writer.writerow([position, error, json.dumps(record, default=str)])
+
+    def flush(batch):
+        inserted, updated, unchanged = upsert_batch(batch, reject)
+        result['inserted'] += inserted
+        result['updated'] += updated
+        result['unchanged'] += unchanged
+        elapsed = time.perf_counter() - started
+        if progress:
+            progress(result['rows'], result['rows'] / elapsed if elapsed else 0.0, result['rejected'])
+
+    batch = {} # flight_number -> (position, values); a later row for the same flight replaces the earlier one
+    try:
+        for position, record in read_records(path, fmt):
+            result['rows'] += 1
+            try:
+                values = parse_schedule_row(record)
+            except ValueError as err:
+                reject(position, str(err), record)
+                continue
+            batch.pop(values[0], None)
+            batch[values[0]] = (position, values)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = {}
+                if cancel_event is not None and cancel_event.is_set():
+                    result['cancelled'] = True
+                    break
+        if batch and not result['cancelled']:
+            flush(batch)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+        if result['updated']: # Cached flights may show the old schedule; re-read them on next use
+            FLIGHT_CACHE.invalidate()
+
+    result['seconds'] = time.perf_counter() - started
+    result['rows_per_sec'] = result['rows'] / result['seconds'] if result['seconds'] else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a flight schedule (CSV or JSON) into the flights table.")
+    parser.add_argument("path", help="schedule file")
+    parser.add_argument("--format", choices=["csv", "json"], help="file format (default: from the extension)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--rejects", help="write rejected rows to this CSV file")
+    parser.add_argument("--engine", choices=["mysql", "sqlite"], help="storage engine (default: database.DB_ENGINE)")
+    parser.add_argument("--sqlite-path", help="SQLite database file")
+    args = parser.parse_args()
+
+    if args.engine:
+        database.DB_ENGINE = args.engine
+    if args.sqlite_path:
+        database.SQLITE_PATH = args.sqlite_path
+
+    def show_progress(rows, rate, rejected):
+        print(f"\r{rows:,} rows read, {rejected:,} rejected ({rate:,.0f} rows/sec)", end="", file=sys.stderr)
+
+    try:
+        result = import_schedule(args.path, args.format, args.batch_size, show_progress, rejects_path=args.rejects)
+    except (OSError, ValueError) + database.DB_ERRORS as err:
+        print(f"\nImport failed: {err}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\n{result['rows']:,} rows in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/sec): "
+          f"{result['inserted']:,} added, {result['updated']:,} updated, {result['unchanged']:,} unchanged, "
+          f"{result['rejected']:,} rejected")
+    for position, error in result['rejects'][:20]:
+        print(f"  {position}: {error}")
+    if result['rejected'] > 20:
+        print(f"  ... {result['rejected'] - 20:,} more" + (f" in {args.rejects}" if args.rejects else ""))
+    sys.exit(1 if result['rejected'] else 0)
@@ -0,0 +1,408 @@
+# Headless booking service: what a terminal can do (log in, search, book, cancel,
+# change a meal, ...) with input validation and ownership checks, independent of
+# any UI. Login state is a Session passed into each call rather than a global, so
+# one process can serve many terminals at once (see api.py for the HTTP front end).
+# Errors are raised, never shown: ServiceError subclasses for bad input or access,
+# BookingError/SoldOutError from the booking engine, DB_ERRORS from the database.
+
+import secrets
+import threading
+import time
+from decimal import Decimal
+
+from credentials import PASSWORD_HASHER
+from itineraries import (ROUTE_GRAPH, ITINERARY_ORDERS, DEFAULT_ITINERARIES, MAX_ITINERARIES, MAX_LEGS,
+                         MIN_CONNECTION_MINUTES)
+from database import (query_all, query_one, execute_write, fetch_db_time, book_group, cancel_booking,
+                      cancel_flights, set_food_preference, build_flight_search_query, build_upcoming_flights_query,
+                      build_my_tickets_query, build_revenue_query, build_load_factor_query, build_seat_totals_query,
+                      build_meal_demand_query, get_pool_stats, get_query_stats, get_reference_cache_stats, fetch_seat_maps,
+                      StaleFlightError, FOOD_CACHE, FLIGHT_CACHE, SEAT_COLUMNS, SEAT_NUMBER_RE, PAGE_SIZE, MAX_GROUP_SIZE,
+                      ANALYTICS_GROUPS)
+
+
+MAX_PAGE_SIZE = 500        # Largest page a client may ask for
+SESSION_TTL = 8 * 60 * 60  # Seconds a session stays valid without being used
+GENDERS = ["Male", "Female", "Other"]
+MONEY_FIELDS = ["revenue", "refunded", "net_revenue"] # Amounts in the analytics revenue rows
+CENT = Decimal("0.01")
+STALE_RETRIES = 3          # Automatic re-tries of a booking when only seat counters moved
+# What a customer agrees to when booking: a version conflict that changed none of
+# these (only seat counters moved) is retried without asking them again
+BOOKING_TERMS = ["flight_number", "origin", "destination", "departure_time", "arrival_time"] + [
+    price_col for _, _, price_col in SEAT_COLUMNS.values()]
+
+class ServiceError(Exception):
+    status = 400 # HTTP status api.py answers with
+
+class ValidationError(ServiceError):
+    status = 400
+
+class AuthError(ServiceError):
+    status = 401
+
+class PermissionDenied(ServiceError):
+    status = 403
+
+class NotFound(ServiceError):
+    status = 404
+
+
+class Session:
+    # One logged-in terminal. The token identifies it to the API.
+    def __init__(self, user_id, username, role, token=None):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.token = token or secrets.token_urlsafe(24)
+        self.last_seen = time.monotonic()
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def to_dict(self):
+        return {'token': self.token, 'user_id': self.user_id, 'username': self.username, 'role': self.role}
+
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {} # token -> Session
+
+    def create(self, user):
+        session = Session(user['user_id'], user['username'], user['role'])
+        with self._lock:
+            self._purge()
+            self._sessions[session.token] = session
+        return session
+
+    def get(self, token):
+        if not token:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if now - session.last_seen > self.ttl:
+                del self._sessions[token]
+                return None
+            session.last_seen = now
+            return session
+
+    def drop(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _purge(self):
+        # Caller holds self._lock
+        now = time.monotonic()
+        for token in [t for t, s in self._sessions.items() if now - s.last_seen > self.ttl]:
+            del self._sessions[token]
+
+
+class AirportService:
+    def __init__(self, sessions=None, hasher=None):
+        self.sessions = sessions or SessionStore()
+        self.hasher = hasher or PASSWORD_HASHER
+        self.food_cache = FOOD_CACHE
+        self.flight_cache = FLIGHT_CACHE
+        self.route_graph = ROUTE_GRAPH
+
+    # Accounts
+    def login(self, phone, password):
+        if not phone or not password:
+            raise ValidationError("Phone number and password are required.")
+        user = query_one("SELECT user_id, username, password, role FROM users WHERE phone_number = %s", (phone,),
+                         prepared=True)
+        # Verified even for an unknown phone number, so the answer takes as long either way
+        matches, needs_rehash = self.hasher.verify(password, user['password'] if user else None)
+        if not matches:
+            raise AuthError("Invalid phone number or password.")
+        if needs_rehash:
+            self._rehash(user, password)
+        return self.sessions.create(user)
+
+    def logout(self, session):
+        self.sessions.drop(session.token)
+
+    def register(self, username, password, phone):
+        if not all([username, password, phone]):
+            raise ValidationError("All fields are required.")
+        if not phone.isdigit() or len(phone) < 10: # Basic phone validation
+            raise ValidationError("Invalid phone number format (at least 10 digits).")
+        if query_one("SELECT user_id FROM users WHERE phone_number = %s", (phone,)):
+            raise ValidationError("Phone number already registered.")
+        _, user_id = execute_write("INSERT INTO users (username, password, phone_number) VALUES (%s, %s, %s)",
+                                   (username, self.hasher.hash(password), phone))
+        return user_id
+
+    def _rehash(self, user, password):
+        # Legacy plaintext row or an older cost setting: store a hash with the current
+        # parameters. Only replaces the value just verified, so a password changed in
+        # the meantime is left alone.
+        rows, _ = execute_write("UPDATE users SET password = %s WHERE user_id = %s AND password = %s",
+                                (self.hasher.hash(password), user['user_id'], user['password']))
+        if rows:
+            self.hasher.note_rehash()
+
+    # Reference data and flights (no login needed)
+    def food_options(self):
+        return self.food_cache.options()
+
+    def food_menu(self):
+        return self.food_cache.rows()
+
+    def db_time(self):
+        return fetch_db_time()
+
+    def search_flights(self, origin="", destination="", date_from=None, date_to=None, after=None, backward=False,
+                       limit=PAGE_SIZE, changed_since=None):
+        if date_from and date_to and date_from > date_to:
+            raise ValidationError("'Date From' must not be after 'Date To'.")
+        return query_all(*build_flight_search_query(origin, destination, date_from, date_to, after, backward,
+                                                    self._limit(limit), changed_since))
+
+    def upcoming_flights(self, after=None, backward=False, limit=PAGE_SIZE, changed_since=None):
+        return query_all(*build_upcoming_flights_query(after, backward, self._limit(limit), changed_since))
+
+    def flight(self, flight_id):
+        # Served from the seat availability cache; 'version' identifies the snapshot
+        flight = self.flight_cache.get(flight_id)
+        if not flight:
+            raise NotFound("Flight not found.")
+        return flight
+
+    def search_itineraries(self, origin, destination, date_from=None, date_to=None, seats=1, seat_class="Economy",
+                           k=DEFAULT_ITINERARIES, max_legs=MAX_LEGS, min_connection=MIN_CONNECTION_MINUTES,
+                           order_by="duration"):
+        # The k best ways (direct or connecting) to get from origin to destination, first
+        # flight departing between date_from and date_to, with seats free seats in seat_class
+        # on every leg and at least min_connection minutes to change planes. Each leg is
+        # booked separately. See itineraries.RouteGraph.search for the result rows.
+        if not (origin or "").strip() or not (destination or "").strip():
+            raise ValidationError("Origin and destination are required.")
+        if date_from and date_to and date_from > date_to:
+            raise ValidationError("'Date From' must not be after 'Date To'.")
+        if seat_class not in SEAT_COLUMNS:
+            raise ValidationError(f"Unknown seat class: {seat_class}")
+        if order_by not in ITINERARY_ORDERS:
+            raise ValidationError(f"Unknown order: {order_by}. Use {', '.join(ITINERARY_ORDERS)}.")
+        try:
+            seats, k, max_legs, min_connection = int(seats), int(k), int(max_legs), int(min_connection)
+        except (TypeError, ValueError):
+            raise ValidationError("Seats, itineraries, legs and connection time must be numbers.")
+        if not 1 <= seats <= MAX_GROUP_SIZE:
+            raise ValidationError(f"Seats must be between 1 and {MAX_GROUP_SIZE}.")
+        if not 1 <= max_legs <= MAX_LEGS:
+            raise ValidationError(f"At most {MAX_LEGS} flights per itinerary.")
+        if min_connection < 0:
+            raise ValidationError("Connection time must not be negative.")
+        self.route_graph.refresh()
+        return self.route_graph.search(origin, destination, date_from, date_to, seats, seat_class,
+                                       max(1, min(k, MAX_ITINERARIES)), max_legs, min_connection, order_by=order_by)
+
+    def seat_map(self, flight_id):
+        # Both cabins' seat maps (see database.SeatMap.to_dict) from one small read
+        seat_maps = fetch_seat_maps(flight_id)
+        if seat_maps is None:
+            raise NotFound("Flight not found.")
+        return {'flight_id': flight_id, 'seat_maps': {seat_class: seat_map.to_dict()
+                                                      for seat_class, seat_map in seat_maps.items()}}
+
+    # Bookings (logged in)
+    def my_tickets(self, session, after=None, backward=False, limit=PAGE_SIZE, changed_since=None):
+        self._require(session)
+        return query_all(*build_my_tickets_query(session.user_id, after, backward, self._limit(limit), changed_since))
+
+    def booking_details(self, session, booking_id):
+        # The booking with all of its passengers ('passengers', in booking order)
+        self._require(session)
+        rows = query_all("""
+            SELECT
+                p.passenger_id, p.passenger_name, p.age, p.gender, p.seat_class, p.seat_number, p.food_preference_id,
+                f.flight_number, f.origin, f.destination,
+                b.status, b.total_amount
+            FROM passengers p
+            JOIN bookings b ON p.booking_id = b.booking_id
+            JOIN flights f ON b.flight_id = f.flight_id
+            WHERE p.booking_id = %s AND b.user_id = %s
+            ORDER BY p.passenger_id
+        """, (booking_id, session.user_id))
+        if not rows:
+            raise NotFound("Booking ID not found or does not belong to you.")
+        details = {key: rows[0][key] for key in ('flight_number', 'origin', 'destination', 'status', 'total_amount')}
+        details['booking_id'] = booking_id
+        details['passengers'] = []
+        for row in rows:
+            food_id = row['food_preference_id']
+            details['passengers'].append({
+                'passenger_id': row['passenger_id'], 'passenger_name': row['passenger_name'], 'age': row['age'],
+                'gender': row['gender'], 'seat_class': row['seat_class'], 'seat_number': row['seat_number'],
+                'food_preference_id': food_id,
+                'food_label': self.food_cache.label_for(food_id, "No Preference") if food_id else "No Preference"
+            })
+        return details
+
+    def book(self, session, flight_id, passengers, expected_version=None):
+        # passengers: list of dicts with passenger_name, age, gender, seat_class and optional
+        # food_id and seat (a seat number from seat_map(); the others are seated together).
+        # expected_version: the 'version' of the flight snapshot the customer saw (see flight()).
+        # If the flight changed since then but its booking terms did not, the booking is
+        # retried on the new version; otherwise StaleFlightError carries the current row.
+        self._require(session)
+        if not passengers:
+            raise ValidationError("Add at least one passenger.")
+        if len(passengers) > MAX_GROUP_SIZE:
+            raise ValidationError(f"At most {MAX_GROUP_SIZE} passengers per booking.")
+        passengers = [self._check_passenger(p) for p in passengers]
+        picked = [p['seat'] for p in passengers if p['seat']]
+        if len(set(picked)) != len(picked):
+            raise ValidationError("Each passenger needs a different seat.")
+        seen = self.flight_cache.peek(flight_id) if expected_version is not None else None
+        if seen is not None and seen['version'] != expected_version:
+            seen = None # Cache moved on: terms the customer saw are unknown, any change is a conflict
+        for attempt in range(STALE_RETRIES + 1):
+            try:
+                booking = book_group(session.user_id, flight_id, passengers, expected_version)
+                break
+            except StaleFlightError as err:
+                if err.flight:
+                    self.flight_cache.install([err.flight])
+                if (attempt == STALE_RETRIES or seen is None or not err.flight
+                        or any(err.flight[key] != seen[key] for key in BOOKING_TERMS)):
+                    raise
+                expected_version = err.flight['version'] # Only seat counters moved
+        self.flight_cache.invalidate(flight_id)
+        self.route_graph.mark_stale()
+        return booking
+
+    def cancel(self, session, booking_id):
+        self._require(session)
+        flight_id = cancel_booking(booking_id, session.user_id)
+        self.flight_cache.invalidate(flight_id)
+        self.route_graph.mark_stale()
+
+    def update_meal(self, session, passenger_id, food_id=None):
+        self._require(session)
+        self._check_food(food_id)
+        owned = query_one("""
+            SELECT p.passenger_id FROM passengers p JOIN bookings b ON p.booking_id = b.booking_id
+            WHERE p.passenger_id = %s AND b.user_id = %s AND b.status <> 'Cancelled'
+        """, (passenger_id, session.user_id))
+        if not owned:
+            raise NotFound("Passenger not found on an active booking of yours.")
+        set_food_preference(passenger_id, food_id)
+
+    # Admin
+    def stats(self, session):
+        self._require(session)
+        if not session.is_admin:
+            raise PermissionDenied("Admins only.")
+        return {'pool': get_pool_stats(), 'reference_caches': get_reference_cache_stats(),
+                'flight_cache': self.flight_cache.stats(), 'route_graph': self.route_graph.stats(),
+                'password_hashing': self.hasher.stats(),
+                'sessions': len(self.sessions)}
+
+    def query_stats(self, session, top=20, order_by="total_ms"):
+        # Slowest statements by order_by (see instrumentation.py)
+        self._require(session)
+        if not session.is_admin:
+            raise PermissionDenied("Admins only.")
+        stats = get_query_stats(max(1, min(int(top), MAX_PAGE_SIZE)), order_by)
+        if stats is None:
+            raise NotFound("Query instrumentation is turned off (AIRPORT_QUERY_STATS=0).")
+        return stats
+
+    def cancel_flights(self, session, flight_ids, reason=None):
+        # Cancels every booking on these flights in one go (see database.cancel_flights);
+        # the affected bookings are queued in cancellation_notices
+        self._require(session)
+        if not session.is_admin:
+            raise PermissionDenied("Admins only.")
+        try:
+            flight_ids = [int(flight_id) for flight_id in flight_ids]
+        except (TypeError, ValueError):
+            raise ValidationError("Flight ids must be numbers.")
+        if not flight_ids:
+            raise ValidationError("Select at least one flight.")
+        reason = (reason or "").strip()[:255] or None
+        result = cancel_flights(flight_ids, reason)
+        for flight_id in flight_ids:
+            self.flight_cache.invalidate(flight_id)
+        self.route_graph.mark_stale()
+        result['refunded'] = Decimal(str(result['refunded'])).quantize(CENT)
+        return result
+
+    def analytics(self, session, date_from=None, date_to=None, group_by=("route",), top=20):
+        # Admin reports from the rollup tables. Revenue and cancellations are by day of
+        # sale; load factor and meal demand by departure date. group_by: ANALYTICS_GROUPS keys.
+        self._require(session)
+        if not session.is_admin:
+            raise PermissionDenied("Admins only.")
+        if date_from and date_to and date_from > date_to:
+            raise ValidationError("'Date From' must not be after 'Date To'.")
+        unknown = [group for group in group_by if group not in ANALYTICS_GROUPS]
+        if unknown:
+            raise ValidationError(f"Unknown grouping: {', '.join(unknown)}. Use {', '.join(ANALYTICS_GROUPS)}.")
+        top = max(1, min(int(top), MAX_PAGE_SIZE))
+
+        sales = query_all(*build_revenue_query(date_from, date_to, tuple(group_by)))
+        totals = query_one(*build_revenue_query(date_from, date_to, ()))
+        for row in sales + [totals]:
+            for key in MONEY_FIELDS: # SQLite sums come back as numbers, MySQL's as Decimal
+                row[key] = Decimal(str(row[key] or 0)).quantize(CENT)
+            row['cancellation_rate'] = (row['cancelled_passengers'] or 0) / row['passengers'] if row['passengers'] else 0.0
+        seats = query_one(*build_seat_totals_query(date_from, date_to))
+        seats['load_factor'] = (seats['seats_booked'] or 0) / seats['seats_total'] if seats['seats_total'] else 0.0
+        lowest = query_all(*build_load_factor_query(date_from, date_to, True, top))
+        highest = query_all(*build_load_factor_query(date_from, date_to, False, top))
+        for row in lowest + highest:
+            row['load_factor'] = row['seats_booked'] / row['seats_total']
+        return {
+            'sales': sales,
+            'totals': totals,
+            'seats': seats,
+            'lowest_load': lowest,
+            'highest_load': highest,
+            'meal_demand': query_all(*build_meal_demand_query(date_from, date_to))
+        }
+
+    def _require(self, session):
+        if session is None:
+            raise AuthError("Please log in.")
+
+    def _check_passenger(self, passenger):
+        name = (passenger.get('passenger_name') or "").strip()
+        if not name:
+            raise ValidationError("Passenger name is required.")
+        try:
+            age = int(passenger.get('age'))
+        except (TypeError, ValueError):
+            raise ValidationError(f"Invalid age for {name}.")
+        if age <= 0:
+            raise ValidationError(f"Invalid age for {name}.")
+        if passenger.get('gender') not in GENDERS:
+            raise ValidationError(f"Unknown gender: {passenger.get('gender')}")
+        if passenger.get('seat_class') not in SEAT_COLUMNS:
+            raise ValidationError(f"Unknown seat class: {passenger.get('seat_class')}")
+        food_id = passenger.get('food_id')
+        self._check_food(food_id)
+        seat = (passenger.get('seat') or "").strip().upper() or None
+        if seat is not None and not SEAT_NUMBER_RE.fullmatch(seat):
+            raise ValidationError(f"Invalid seat number for {name}: {seat}")
+        return {'passenger_name': name, 'age': age, 'gender': passenger['gender'],
+                'seat_class': passenger['seat_class'], 'food_id': food_id, 'seat': seat}
+
+    def _check_food(self, food_id):
+        if food_id is not None and self.food_cache.label_for(food_id) is None:
+            raise ValidationError(f"Unknown food item: {food_id}")
+
+    def _limit(self, limit):
+        return max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
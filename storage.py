@@ -0,0 +1,512 @@
+# Storage backends behind the query helpers in database.py.
+# A backend opens raw connections for the ConnectionPool. Every connection it
+# returns behaves like a mysql.connector connection: cursor(dictionary=, buffered=),
+# start_transaction(), commit(), rollback(), in_transaction, ping() and close().
+# backend.prepare(conn, query) returns a cursor that executes one fixed statement
+# repeatedly without re-parsing it (rows come back as tuples), and
+# backend.classify_error(err) tells the retry logic whether an error is worth retrying.
+#
+#   MySQLBackend   - the server configured in DB_CONFIG (schema from "airport db.py")
+#   SQLiteBackend  - embedded engine in a file or in memory. Creates its own schema
+#                    and sample data on first use and translates the MySQL flavoured
+#                    SQL used by the app (%s, NOW(), GREATEST, FOR UPDATE, ...).
+
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+try:
+    import mysql.connector
+except ImportError: # SQLite-only installs (kiosks, CI)
+    mysql = None
+
+
+class PoolError(Exception):
+    # No free connection within the pool's acquire timeout
+    pass
+
+class CircuitOpenError(PoolError):
+    # The database failed repeatedly and is not being tried again until the breaker's reset timeout
+    pass
+
+class CommitUnknownError(PoolError):
+    # The connection was lost while a write was committing, so it may or may not have been
+    # applied. Never retried automatically.
+    pass
+
+# Exceptions the query helpers treat as database errors, whichever backend is in use
+DB_ERRORS = (PoolError, sqlite3.Error) + ((mysql.connector.Error,) if mysql else ())
+
+# Error kinds a backend's classify_error() reports (None for anything else: bad SQL,
+# constraint violations, ... which would fail the same way again):
+#   UNAVAILABLE - the server could not be reached or the connection dropped. Counts
+#                 towards the circuit breaker. An open transaction was rolled back.
+#   TRANSIENT   - deadlock, lock wait timeout, database busy. The statement (and with a
+#                 deadlock the transaction) was rolled back; trying again may succeed.
+UNAVAILABLE = "unavailable"
+TRANSIENT = "transient"
+
+
+class MySQLBackend:
+    name = "mysql"
+    max_connections = None # No limit beyond the pool size
+
+    # Client/server error numbers: can't connect (2002, 2003), unknown host (2005), server
+    # gone away / lost connection (2006, 2013, 2055), server shutting down (1053)
+    UNAVAILABLE_ERRNOS = {1053, 2002, 2003, 2005, 2006, 2013, 2055}
+    # Too many connections (1040), lock wait timeout (1205), deadlock (1213)
+    TRANSIENT_ERRNOS = {1040, 1205, 1213}
+
+    def __init__(self, config):
+        if mysql is None:
+            raise RuntimeError("mysql-connector-python is not installed. Install it or use the sqlite engine.")
+        self.config = config
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def prepare(self, conn, query):
+        # Server-side prepared statement: parsed once (COM_STMT_PREPARE) on the first
+        # execute, then only parameters travel, in the binary protocol. Closing the
+        # cursor deallocates it on the server.
+        return conn.cursor(prepared=True)
+
+    def classify_error(self, err):
+        errno = getattr(err, 'errno', None)
+        if errno in self.UNAVAILABLE_ERRNOS:
+            return UNAVAILABLE
+        if errno in self.TRANSIENT_ERRNOS:
+            return TRANSIENT
+        return None
+
+
+# - SQLite dialect -
+# Local time with millisecond precision, the same text format the datetime adapter writes
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+_DIALECT_RULES = [
+    # Prefix searches escape wildcards with a backslash, MySQL's default LIKE escape
+    (re.compile(r"\bLIKE\s+%s", re.I), r"LIKE ? ESCAPE '\\'"),
+    (re.compile(r"%s"), "?"),
+    # Aliased NOW() gets a column type so it comes back as a datetime, like on MySQL
+    (re.compile(r"\bNOW\(\d*\)\s+AS\s+(\w+)", re.I), SQLITE_NOW + r' AS "\1 [timestamp]"'),
+    (re.compile(r"\bNOW\(\d*\)", re.I), SQLITE_NOW),
+    (re.compile(r"\bCURDATE\(\)", re.I), "date('now', 'localtime')"),
+    (re.compile(r"\bGREATEST\(", re.I), "MAX("),
+    (re.compile(r"\bLEAST\(", re.I), "MIN("),
+    (re.compile(r"\bRAND\(\)", re.I), "RANDOM()"),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    # Upserts (SQLite 3.35+): VALUES(col) in the update list is the row that was not inserted
+    (re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)", re.I), r"excluded.\1"),
+    # Writers already hold the database write lock (BEGIN IMMEDIATE), so row locks are implicit
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.I), "")
+]
+
+@lru_cache(maxsize=512)
+def translate_sql(query):
+    for pattern, replacement in _DIALECT_RULES:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+def _adapt_datetime(value):
+    return value.isoformat(" ", timespec="milliseconds" if value.microsecond else "seconds")
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+def _convert_decimal(value):
+    return Decimal(value.decode()).quantize(Decimal("0.01"))
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(Decimal, str)
+for _type in ("DATETIME", "TIMESTAMP"):
+    sqlite3.register_converter(_type, _convert_datetime)
+sqlite3.register_converter("DECIMAL", _convert_decimal)
+
+
+# Same tables, keys and indexes as "airport db.py"; keep the two in step.
+# ENUMs become CHECK constraints, ON UPDATE CURRENT_TIMESTAMP becomes a trigger
+# (as does the flights.version bump),
+# and city columns use NOCASE so prefix LIKE searches can use the route index.
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    phone_number VARCHAR(15) NOT NULL UNIQUE,
+    role VARCHAR(10) DEFAULT 'user'
+);
+
+CREATE TABLE IF NOT EXISTS food_items (
+    food_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_name VARCHAR(100) NOT NULL,
+    type VARCHAR(10) NOT NULL CHECK (type IN ('Veg', 'Non-Veg', 'Beverage')),
+    price DECIMAL(10, 2) DEFAULT 0.00
+);
+
+CREATE TABLE IF NOT EXISTS flights (
+    flight_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    flight_number VARCHAR(20) NOT NULL UNIQUE,
+    origin VARCHAR(100) NOT NULL COLLATE NOCASE,
+    destination VARCHAR(100) NOT NULL COLLATE NOCASE,
+    departure_time DATETIME NOT NULL,
+    arrival_time DATETIME NOT NULL,
+    aircraft_name VARCHAR(100),
+    economy_seats_total INT DEFAULT 100,
+    economy_seats_booked INT DEFAULT 0,
+    economy_price DECIMAL(10, 2) NOT NULL,
+    business_seats_total INT DEFAULT 20,
+    business_seats_booked INT DEFAULT 0,
+    business_price DECIMAL(10, 2) NOT NULL,
+    updated_at TIMESTAMP(6) NOT NULL DEFAULT ({SQLITE_NOW}),
+    version INT NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'Scheduled'
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(user_id),
+    flight_id INT NOT NULL REFERENCES flights(flight_id),
+    booking_date TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+    total_amount DECIMAL(10, 2) NOT NULL,
+    status VARCHAR(20) DEFAULT 'Confirmed',
+    updated_at TIMESTAMP(6) NOT NULL DEFAULT ({SQLITE_NOW})
+);
+
+CREATE TABLE IF NOT EXISTS passengers (
+    passenger_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking_id INT NOT NULL REFERENCES bookings(booking_id) ON DELETE CASCADE,
+    passenger_name VARCHAR(100) NOT NULL,
+    age INT NOT NULL,
+    gender VARCHAR(10) NOT NULL CHECK (gender IN ('Male', 'Female', 'Other')),
+    seat_class VARCHAR(10) NOT NULL CHECK (seat_class IN ('Economy', 'Business')),
+    food_preference_id INT REFERENCES food_items(food_id),
+    updated_at TIMESTAMP(6) NOT NULL DEFAULT ({SQLITE_NOW}),
+    price DECIMAL(10, 2),
+    seat_index INT,
+    seat_number VARCHAR(5)
+);
+
+CREATE TABLE IF NOT EXISTS ticket_summaries (
+    passenger_id INTEGER PRIMARY KEY REFERENCES passengers(passenger_id) ON DELETE CASCADE,
+    booking_id INT NOT NULL,
+    user_id INT NOT NULL,
+    flight_id INT NOT NULL,
+    flight_number VARCHAR(20) NOT NULL,
+    origin VARCHAR(100) NOT NULL,
+    destination VARCHAR(100) NOT NULL,
+    departure_time DATETIME NOT NULL,
+    passenger_name VARCHAR(100) NOT NULL,
+    age INT NOT NULL,
+    seat_class VARCHAR(10) NOT NULL,
+    food_preference VARCHAR(100) NOT NULL,
+    status VARCHAR(20),
+    total_amount DECIMAL(10, 2) NOT NULL,
+    updated_at TIMESTAMP(6) NOT NULL DEFAULT ({SQLITE_NOW}),
+    seat_number VARCHAR(5)
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    sale_date DATE NOT NULL,
+    origin VARCHAR(100) NOT NULL COLLATE NOCASE,
+    destination VARCHAR(100) NOT NULL COLLATE NOCASE,
+    seat_class VARCHAR(10) NOT NULL,
+    passengers INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    cancelled_passengers INT NOT NULL DEFAULT 0,
+    refunded DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, origin, destination, seat_class)
+);
+
+CREATE TABLE IF NOT EXISTS meal_demand (
+    flight_id INT NOT NULL REFERENCES flights(flight_id) ON DELETE CASCADE,
+    food_id INT NOT NULL REFERENCES food_items(food_id),
+    passengers INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (flight_id, food_id)
+);
+
+CREATE TABLE IF NOT EXISTS seat_maps (
+    flight_id INT NOT NULL REFERENCES flights(flight_id) ON DELETE CASCADE,
+    seat_class VARCHAR(10) NOT NULL,
+    taken BLOB NOT NULL,
+    PRIMARY KEY (flight_id, seat_class)
+);
+
+CREATE TABLE IF NOT EXISTS cancellation_notices (
+    notice_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking_id INT NOT NULL REFERENCES bookings(booking_id) ON DELETE CASCADE,
+    user_id INT NOT NULL,
+    flight_id INT NOT NULL,
+    reason VARCHAR(255),
+    created_at TIMESTAMP(6) NOT NULL DEFAULT ({SQLITE_NOW}),
+    notified_at TIMESTAMP(6)
+);
+
+CREATE INDEX IF NOT EXISTS idx_flights_route_departure ON flights (origin, destination, departure_time);
+CREATE INDEX IF NOT EXISTS idx_flights_departure ON flights (departure_time);
+CREATE INDEX IF NOT EXISTS idx_flights_updated ON flights (updated_at);
+CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings (booking_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (user_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_flight ON bookings (flight_id);
+CREATE INDEX IF NOT EXISTS idx_passengers_booking ON passengers (booking_id);
+CREATE INDEX IF NOT EXISTS idx_ticket_summaries_user ON ticket_summaries (user_id, departure_time DESC, booking_id, passenger_id);
+CREATE INDEX IF NOT EXISTS idx_ticket_summaries_user_updated ON ticket_summaries (user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_ticket_summaries_booking ON ticket_summaries (booking_id);
+CREATE INDEX IF NOT EXISTS idx_ticket_summaries_flight ON ticket_summaries (flight_id);
+CREATE INDEX IF NOT EXISTS idx_cancellation_notices_pending ON cancellation_notices (notified_at, notice_id);
+CREATE INDEX IF NOT EXISTS idx_cancellation_notices_booking ON cancellation_notices (booking_id);
+"""
+
+# ticket_summaries rows (the My Tickets list, one per passenger) derived from the base
+# tables. Append a WHERE on b./p./f. columns to limit it; both engines accept it as is.
+TICKET_SUMMARY_FILL = """INSERT INTO ticket_summaries (passenger_id, booking_id, user_id, flight_id, flight_number,
+    origin, destination, departure_time, passenger_name, age, seat_class, seat_number, food_preference, status, total_amount)
+SELECT p.passenger_id, b.booking_id, b.user_id, b.flight_id, f.flight_number,
+    f.origin, f.destination, f.departure_time, p.passenger_name, p.age, p.seat_class, p.seat_number,
+    COALESCE(fi.item_name, 'None'), b.status, b.total_amount
+FROM bookings b
+JOIN flights f ON b.flight_id = f.flight_id
+JOIN passengers p ON b.booking_id = p.booking_id
+LEFT JOIN food_items fi ON p.food_preference_id = fi.food_id"""
+
+# Analytics rollups (see database.py) recomputed from the base tables, for an empty
+# rollup table. Passengers booked before fares were stored count at the flight's price
+# (FARE_SQL, over passengers p joined to flights f).
+FARE_SQL = "COALESCE(p.price, CASE p.seat_class WHEN 'Business' THEN f.business_price ELSE f.economy_price END)"
+ROLLUP_FILLS = {
+    'sales_daily': f"""INSERT INTO sales_daily (sale_date, origin, destination, seat_class, passengers, revenue,
+    cancelled_passengers, refunded)
+SELECT DATE(b.booking_date), f.origin, f.destination, p.seat_class, COUNT(*), SUM({FARE_SQL}),
+    SUM(CASE WHEN b.status = 'Cancelled' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN b.status = 'Cancelled' THEN {FARE_SQL} ELSE 0 END)
+FROM bookings b
+JOIN flights f ON b.flight_id = f.flight_id
+JOIN passengers p ON b.booking_id = p.booking_id
+GROUP BY DATE(b.booking_date), f.origin, f.destination, p.seat_class""",
+    'meal_demand': """INSERT INTO meal_demand (flight_id, food_id, passengers)
+SELECT b.flight_id, p.food_preference_id, COUNT(*)
+FROM bookings b
+JOIN passengers p ON b.booking_id = p.booking_id
+WHERE b.status <> 'Cancelled' AND p.food_preference_id IS NOT NULL
+GROUP BY b.flight_id, p.food_preference_id"""
+}
+
+# Columns added after the first release: (table, column, definition), applied to
+# existing database files before the triggers that use them are created
+SQLITE_MIGRATIONS = [
+    ("flights", "version", "INT NOT NULL DEFAULT 0"),
+    ("passengers", "price", "DECIMAL(10, 2)"),
+    ("flights", "status", "VARCHAR(20) NOT NULL DEFAULT 'Scheduled'"),
+    ("passengers", "seat_index", "INT"),
+    ("passengers", "seat_number", "VARCHAR(5)"),
+    ("ticket_summaries", "seat_number", "VARCHAR(5)")
+]
+
+SQLITE_TRIGGERS = "".join(f"""
+CREATE TRIGGER IF NOT EXISTS trg_{table}_updated AFTER UPDATE ON {table}
+FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE {table} SET updated_at = {SQLITE_NOW} WHERE {key} = NEW.{key};
+END;
+""" for table, key in (("bookings", "booking_id"), ("passengers", "passenger_id"),
+                      ("ticket_summaries", "passenger_id"))) + f"""
+DROP TRIGGER IF EXISTS trg_flights_updated;
+-- Every write to a flight bumps its row version (and updated_at unless the write set it)
+CREATE TRIGGER IF NOT EXISTS trg_flights_version AFTER UPDATE ON flights
+FOR EACH ROW WHEN NEW.version = OLD.version
+BEGIN
+    UPDATE flights SET version = OLD.version + 1,
+        updated_at = CASE WHEN NEW.updated_at = OLD.updated_at THEN {SQLITE_NOW} ELSE NEW.updated_at END
+    WHERE flight_id = NEW.flight_id;
+END;
+"""
+
+SQLITE_SAMPLE_DATA = """
+INSERT INTO users (username, password, phone_number, role)
+VALUES ('admin', 'admin123', '0000000000', 'admin');
+
+INSERT INTO food_items (item_name, type, price) VALUES
+    ('Vegetable Biryani', 'Veg', 5.00),
+    ('Paneer Tikka Masala', 'Veg', 6.00),
+    ('Dal Makhani with Rice', 'Veg', 5.50),
+    ('Chicken Curry with Rice', 'Non-Veg', 7.00),
+    ('Grilled Fish', 'Non-Veg', 8.00),
+    ('Mutton Korma', 'Non-Veg', 7.50),
+    ('Orange Juice', 'Beverage', 2.00),
+    ('Coffee/Tea', 'Beverage', 1.50);
+
+INSERT INTO flights (flight_number, origin, destination, departure_time, arrival_time, aircraft_name, economy_seats_total, economy_price, business_seats_total, business_price) VALUES
+    ('AI201', 'Delhi', 'Mumbai', '2024-09-01 10:00:00', '2024-09-01 12:00:00', 'Boeing 737 (Eco Alpha)', 120, 5000.00, 20, 15000.00),
+    ('SJ405', 'Mumbai', 'Bangalore', '2024-09-01 14:00:00', '2024-09-01 15:30:00', 'Airbus A320 (Eco Bravo)', 100, 4500.00, 15, 12000.00),
+    ('UK880', 'Delhi', 'Bangalore', '2024-09-02 08:00:00', '2024-09-02 10:30:00', 'Boeing 777 (Biz Charlie)', 80, 7000.00, 30, 20000.00),
+    ('6E555', 'Kolkata', 'Chennai', '2024-09-02 18:00:00', '2024-09-02 20:15:00', 'Airbus A321 (Eco Delta)', 150, 5500.00, 10, 16000.00),
+    ('BA001', 'London', 'New York', '2024-09-03 11:00:00', '2024-09-03 14:00:00', 'Boeing 747 (Biz Eagle)', 50, 30000.00, 40, 75000.00),
+    ('EK203', 'Dubai', 'London', '2024-09-03 15:00:00', '2024-09-03 19:30:00', 'Airbus A380 (Biz Foxtrot)', 70, 25000.00, 50, 60000.00),
+    ('QF002', 'Sydney', 'Singapore', '2024-09-04 09:00:00', '2024-09-04 15:00:00', 'Boeing 787 (Eco Golf)', 110, 18000.00, 25, 40000.00),
+    ('LH760', 'Frankfurt', 'Delhi', '2024-09-04 13:00:00', '2024-09-04 23:50:00', 'Airbus A350 (Eco Hotel)', 130, 22000.00, 20, 50000.00);
+"""
+
+
+class SQLiteCursor:
+    # mysql.connector style cursor over sqlite3: translates the SQL and returns
+    # dict rows when dictionary=True. sqlite3 cursors step lazily, so buffered
+    # and unbuffered behave the same.
+    def __init__(self, raw_cursor, dictionary=False):
+        self._cursor = raw_cursor
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(translate_sql(query), tuple(params or ()))
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(translate_sql(query), seq_params)
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    def close(self):
+        self._cursor.close()
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+
+class SQLiteConnection:
+    def __init__(self, raw_conn):
+        self._raw = raw_conn
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._raw.cursor(), dictionary)
+
+    def start_transaction(self):
+        # Take the write lock up front: the booking engine's check-then-write
+        # steps rely on nobody else writing until commit, like MySQL row locks
+        self._raw.execute("BEGIN IMMEDIATE")
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, reconnect=False):
+        self._raw.execute("SELECT 1")
+
+    def close(self):
+        self._raw.close()
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, path=":memory:", busy_timeout=10):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._keeper = None
+        if path == ":memory:":
+            # One named shared-cache database per backend. The keeper connection keeps it
+            # alive while the pool recycles connections; a single pooled connection avoids
+            # shared-cache table lock errors.
+            self._uri = f"file:airport_{id(self)}?mode=memory&cache=shared"
+            self.max_connections = 1
+            self._keeper = self._open()
+        else:
+            self._uri = None
+            self.max_connections = None
+        self._schema_lock = threading.Lock()
+        self.create_schema()
+
+    def _open(self):
+        raw = sqlite3.connect(
+            self._uri or self.path, uri=self._uri is not None, timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            isolation_level=None, # Autocommit unless start_transaction() was called, as with MySQL
+            check_same_thread=False # The pool hands connections to worker threads
+        )
+        raw.execute("PRAGMA foreign_keys = ON")
+        if self._uri is None:
+            raw.execute("PRAGMA journal_mode = WAL") # Readers do not block the writer
+            raw.execute("PRAGMA synchronous = NORMAL")
+        return raw
+
+    def connect(self):
+        return SQLiteConnection(self._open())
+
+    def prepare(self, conn, query):
+        # sqlite3 keeps compiled statements per connection keyed by SQL text, and
+        # translate_sql is cached, so reusing a cursor for one query skips both steps
+        return conn.cursor()
+
+    def classify_error(self, err):
+        if not isinstance(err, sqlite3.OperationalError):
+            return None
+        message = str(err).lower()
+        if "locked" in message or "busy" in message:
+            return TRANSIENT
+        if "unable to open" in message or "disk i/o" in message:
+            return UNAVAILABLE
+        return None
+
+    def create_schema(self, sample_data=True):
+        with self._schema_lock:
+            raw = self._keeper or self._open()
+            try:
+                had_tables = {row[0] for row in raw.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                raw.executescript(SQLITE_SCHEMA)
+                for table, column, definition in SQLITE_MIGRATIONS:
+                    if column not in [row[1] for row in raw.execute(f"PRAGMA table_info({table})")]:
+                        raw.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                raw.executescript(SQLITE_TRIGGERS)
+                if "ticket_summaries" not in had_tables: # Database file from before the summary table: fill it once
+                    raw.execute(TICKET_SUMMARY_FILL)
+                for table, fill in ROLLUP_FILLS.items(): # Likewise the analytics rollups
+                    if table not in had_tables:
+                        raw.execute(fill)
+                empty = raw.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+                if sample_data and empty:
+                    raw.executescript(SQLITE_SAMPLE_DATA)
+            finally:
+                if raw is not self._keeper:
+                    raw.close()
+
+
+def create_backend(engine, mysql_config=None, sqlite_path=":memory:"):
+    if engine == "mysql":
+        return MySQLBackend(mysql_config)
+    if engine == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"Unknown storage engine: {engine}")